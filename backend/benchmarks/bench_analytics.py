@@ -0,0 +1,148 @@
+"""
+Benchmark — /analytics computed in Python over six collections vs one aggregation
+over the materialized timeline, for patients with long histories.
+
+Copies seed patients into a scratch database (<DB_NAME>_bench on the MongoDB from
+backend/.env, dropped afterwards) with each history repeated --years times, one
+copy per earlier year, so every patient has hundreds of records.
+
+Usage (from backend/):
+    python benchmarks/bench_analytics.py
+    python benchmarks/bench_analytics.py --patients 50 --years 40 --rounds 5
+"""
+
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+import bson
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from server import (client, db, DEPARTMENT_DATE_FIELDS, DEPARTMENT_LABELS, DEPARTMENT_TEST_FIELDS,
+                    ANALYTICS_STAGES, timeline_rebuild_pipeline)
+from data.seed import build_seed_data
+
+def shift_year(date, years):
+    return f"{int(date[:4]) - years}{date[4:]}"
+
+def long_histories(seed_data, patient_count, years):
+    patient_ids = [p["patient_id"] for p in seed_data["profiles"][:patient_count]]
+    wanted = set(patient_ids)
+    records = {coll: [] for coll in DEPARTMENT_DATE_FIELDS}
+    for coll, date_field in DEPARTMENT_DATE_FIELDS.items():
+        for record in seed_data[coll]:
+            if record["patient_id"] not in wanted:
+                continue
+            for offset in range(years):
+                copy = {k: v for k, v in record.items() if k != "_id"}
+                copy[date_field] = shift_year(record[date_field], offset)
+                records[coll].append(copy)
+    return patient_ids, records
+
+async def analytics_in_python(bench_db, patient_id):
+    """The pre-aggregation endpoint: every record crosses the wire, loops in Python"""
+    query = {"patient_id": patient_id}
+    fetched = await asyncio.gather(*(bench_db[coll].find(query, {"_id": 0}).to_list(None)
+                                     for coll in DEPARTMENT_DATE_FIELDS))
+    records = dict(zip(DEPARTMENT_DATE_FIELDS, fetched))
+    received = sum(len(bson.encode(r)) for rs in fetched for r in rs)
+
+    departments_visited = {DEPARTMENT_LABELS[coll]: len(rs) for coll, rs in records.items()}
+    visits = sorted(
+        ({"date": r[DEPARTMENT_DATE_FIELDS[coll]], "type": DEPARTMENT_LABELS[coll], "test": r[DEPARTMENT_TEST_FIELDS[coll]]}
+         for coll, rs in records.items() for r in rs),
+        key=lambda v: v["date"]
+    )
+    treatments = [r.get("result", "") for r in records["treatment_records"]]
+    tests = [r.get("result", "").lower() for coll, rs in records.items() if coll != "treatment_records" for r in rs]
+    normal = sum(1 for r in tests if "normal" in r or "clear" in r or "within range" in r)
+    abnormal = len(tests) - normal
+    if normal > abnormal * 2:
+        health_trend = "Excellent"
+    elif normal > abnormal:
+        health_trend = "Good"
+    elif normal == abnormal:
+        health_trend = "Stable"
+    else:
+        health_trend = "Needs Attention"
+    analytics = {
+        "total_visits": len(visits),
+        "total_tests": len(tests),
+        "departments_visited": departments_visited,
+        "visit_timeline": visits,
+        "treatment_summary": {
+            "total": len(treatments),
+            "completed": sum(1 for r in treatments if "Completed" in r or "Successful" in r),
+            "in_progress": sum(1 for r in treatments if "Progress" in r),
+            "scheduled": sum(1 for r in treatments if "Scheduled" in r)
+        },
+        "health_trend": health_trend,
+        "recent_results": visits[-5:]
+    }
+    return analytics, received
+
+async def analytics_in_mongo(bench_db, patient_id):
+    docs = await bench_db.patient_timelines.aggregate(
+        [{"$match": {"patient_id": patient_id}}, *ANALYTICS_STAGES]
+    ).to_list(1)
+    return docs[0], len(bson.encode(docs[0]))
+
+async def time_variant(compute, bench_db, patient_ids, rounds):
+    timings, received = [], []
+    for _ in range(rounds):
+        for pid in patient_ids:
+            start = time.perf_counter()
+            _, size = await compute(bench_db, pid)
+            timings.append((time.perf_counter() - start) * 1000)
+            received.append(size)
+    return timings, received
+
+def summarize(label, timings, received):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<12} mean {statistics.mean(timings):7.2f} ms   p95 {p95:7.2f} ms   "
+          f"received {statistics.mean(received) / 1024:8.1f} KB/request")
+
+async def main(patient_count, years, rounds):
+    random.seed(42)
+    patient_ids, records = long_histories(build_seed_data(extra_count=488), patient_count, years)
+    bench_db = client[db.name + "_bench"]
+    await client.drop_database(bench_db.name)
+    try:
+        for coll, rs in records.items():
+            if rs:
+                await bench_db[coll].insert_many(rs)
+            await bench_db[coll].create_index([("patient_id", 1), (DEPARTMENT_DATE_FIELDS[coll], 1)])
+        await bench_db[next(iter(DEPARTMENT_DATE_FIELDS))].aggregate(
+            timeline_rebuild_pipeline(), allowDiskUse=True
+        ).to_list(None)
+        await bench_db.patient_timelines.create_index("patient_id", unique=True)
+
+        for pid in patient_ids:
+            expected, _ = await analytics_in_python(bench_db, pid)
+            got, _ = await analytics_in_mongo(bench_db, pid)
+            got.pop("rev")
+            got.pop("patient_id")
+            if got != expected:
+                sys.exit(f"Aggregation disagrees with the Python implementation for {pid}")
+
+        history = sum(len(rs) for rs in records.values()) / len(patient_ids)
+        print(f"{len(patient_ids)} patients, {history:.0f} records each, x {rounds} rounds\n")
+        summarize("python", *await time_variant(analytics_in_python, bench_db, patient_ids, rounds))
+        summarize("aggregation", *await time_variant(analytics_in_mongo, bench_db, patient_ids, rounds))
+    finally:
+        await client.drop_database(bench_db.name)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Python and aggregation analytics on long histories")
+    parser.add_argument("--patients", type=int, default=20, help="Seed patients copied into the bench database")
+    parser.add_argument("--years", type=int, default=30, help="Copies of each history, one per earlier year")
+    parser.add_argument("--rounds", type=int, default=3, help="Passes over the patient list")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.patients, args.years, args.rounds))
@@ -0,0 +1,78 @@
+"""
+Benchmark — cohort analytics over a large synthetic hospital.
+
+Generates patients with data/seed.py, shapes them the way /api/cohort/analytics
+loads them (profiles plus per-patient timeline features) and times building the
+frames once and the grouped summaries computed from them. No database needed.
+
+Usage (from backend/):
+    python benchmarks/bench_cohort.py
+    python benchmarks/bench_cohort.py --extra 20000 --iterations 10
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cohort import build_frames, cohort_summary
+from data.seed import build_seed_data
+from server import DEPARTMENT_DATE_FIELDS, DEPARTMENT_LABELS
+
+GROUPINGS = [
+    ("scenario", "age_band", "blood_group"),
+    ("scenario",),
+    ("age_band", "gender"),
+]
+
+def timeline_features(seed_data):
+    """What COHORT_TIMELINE_STAGES returns per patient"""
+    events = {}
+    for coll, date_field in DEPARTMENT_DATE_FIELDS.items():
+        label = DEPARTMENT_LABELS[coll]
+        for record in seed_data[coll]:
+            event = (record[date_field], label, record.get("result_category"))
+            events.setdefault(record["patient_id"], []).append(event)
+    timelines = []
+    for patient_id, patient_events in events.items():
+        patient_events.sort(key=lambda e: e[0])
+        tests = [category for _, label, category in patient_events if label != "Treatment"]
+        timelines.append({
+            "patient_id": patient_id,
+            "visits": len(patient_events),
+            "tests": len(tests),
+            "normal": tests.count("normal"),
+            "types": [label for _, label, _ in patient_events],
+            "months": [date[:7] for date, _, _ in patient_events]
+        })
+    return timelines
+
+def main(extra, iterations):
+    start = time.perf_counter()
+    seed_data = build_seed_data(extra_count=extra)
+    profiles = [{k: p[k] for k in ("patient_id", "age", "gender", "blood_group", "scenario")}
+                for p in seed_data["profiles"]]
+    timelines = timeline_features(seed_data)
+    events = sum(t["visits"] for t in timelines)
+    print(f"{len(profiles):,} patients, {events:,} events generated in {time.perf_counter() - start:.1f} s\n")
+
+    start = time.perf_counter()
+    patients, event_frame = build_frames(profiles, timelines)
+    print(f"build frames (once per data version)   {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    for group_by in GROUPINGS:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            summary = cohort_summary(patients, event_frame, group_by)
+        ms = (time.perf_counter() - start) * 1000 / iterations
+        print(f"summary by {', '.join(group_by):<32} {ms:8.1f} ms   {len(summary['groups'])} groups")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time cohort frame building and grouped summaries")
+    parser.add_argument("--extra", type=int, default=100_000, help="Extra generated patients beyond the curated 12")
+    parser.add_argument("--iterations", type=int, default=5, help="Summaries timed per grouping")
+    args = parser.parse_args()
+
+    main(args.extra, args.iterations)
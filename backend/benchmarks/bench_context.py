@@ -0,0 +1,76 @@
+"""
+Benchmark — DocAssist prompt size with records inlined as indented JSON vs the compact
+table encoder in context.py, with and without a token budget.
+
+Builds an overview prompt (every department) for each curated seed patient, which
+between them cover every scenario, with each history optionally repeated --years times to mimic patients
+with long histories. Token counts are the four-characters-per-token estimate unless
+--gemini is given, which asks the Gemini API to count (needs GEMINI_API_KEY).
+
+Usage (from backend/):
+    python benchmarks/bench_context.py
+    python benchmarks/bench_context.py --years 10 --budget 4000 --gemini
+"""
+
+import sys
+import json
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from context import PROFILE_FIELDS, encode_patient_context, estimate_tokens
+from data.seed import build_seed_data
+from server import DEPARTMENT_DATE_FIELDS, DEPARTMENT_LABELS, GEMINI_MODEL, gemini_client
+
+QUESTION = "Give me an overview of this patient's history"
+
+def json_context(profile, records):
+    """The pre-encoder prompt: profile lines, then each department as indented JSON"""
+    context = "\nPATIENT PROFILE:\n" + "".join(f"- {label}: {profile.get(field)}\n" for field, label in PROFILE_FIELDS)
+    for coll, label in DEPARTMENT_LABELS.items():
+        context += f"\n{label.upper()} RECORDS ({len(records[coll])} records):\n{json.dumps(records[coll], indent=2)}\n"
+    return context
+
+def patient_records(seed_data, patient_id, years):
+    records = {}
+    for coll, date_field in DEPARTMENT_DATE_FIELDS.items():
+        rows = [r for r in seed_data[coll] if r["patient_id"] == patient_id]
+        records[coll] = sorted(
+            ({**r, date_field: f"{int(r[date_field][:4]) - offset}{r[date_field][4:]}"}
+             for r in rows for offset in range(years)),
+            key=lambda r: r[date_field]
+        )
+    return records
+
+def main(years, budget, use_gemini):
+    if use_gemini and not gemini_client:
+        sys.exit("--gemini needs GEMINI_API_KEY in backend/.env")
+    count = (lambda text: gemini_client.models.count_tokens(model=GEMINI_MODEL, contents=text).total_tokens) \
+        if use_gemini else estimate_tokens
+
+    seed_data = build_seed_data()
+    print(f"{'patient':<32}{'records':>8}{'json':>10}{'compact':>10}{f'budget {budget}':>14}{'saved':>8}")
+    totals = [0, 0, 0]
+    for profile in seed_data["profiles"]:
+        records = patient_records(seed_data, profile["patient_id"], years)
+        departments = [(label, DEPARTMENT_DATE_FIELDS[coll], records[coll], len(records[coll]))
+                       for coll, label in DEPARTMENT_LABELS.items()]
+        sizes = [count(f"{QUESTION}\n{text}") for text in (
+            json_context(profile, records),
+            encode_patient_context(profile, departments, QUESTION),
+            encode_patient_context(profile, departments, QUESTION, budget),
+        )]
+        totals = [t + s for t, s in zip(totals, sizes)]
+        print(f"{profile['patient_id'] + ' ' + profile['scenario']:<32}{sum(map(len, records.values())):>8}"
+              f"{sizes[0]:>10,}{sizes[1]:>10,}{sizes[2]:>14,}{1 - sizes[2] / sizes[0]:>8.0%}")
+    print(f"{'total':<40}{totals[0]:>10,}{totals[1]:>10,}{totals[2]:>14,}{1 - totals[2] / totals[0]:>8.0%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare DocAssist prompt sizes across seed scenarios")
+    parser.add_argument("--years", type=int, default=1, help="Copies of each history, one per earlier year")
+    parser.add_argument("--budget", type=int, default=8000, help="Token budget for the budgeted encoding")
+    parser.add_argument("--gemini", action="store_true", help="Count tokens with the Gemini API instead of estimating")
+    args = parser.parse_args()
+
+    main(args.years, args.budget, args.gemini)
@@ -0,0 +1,90 @@
+"""
+Benchmark — how many DocAssist questions the intent matcher in intents.py answers
+straight from the records, and how long those answers take vs the LLM path.
+
+Runs a fixed question set, mixing plain lookups with questions that need the model,
+against every curated seed patient. Reports the fraction answered locally and the time
+to answer locally vs to build the LLM prompt; with --gemini it also sends the prompts
+of the locally answered questions to Gemini and reports that latency (needs
+GEMINI_API_KEY).
+
+Usage (from backend/):
+    python benchmarks/bench_intents.py
+    python benchmarks/bench_intents.py --gemini
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bench_context import patient_records
+from bench_retrieval import answer_ms
+from data.seed import build_seed_data
+from intents import answer_intent, match_intent
+from server import (DEPARTMENT_DATE_FIELDS, DEPARTMENT_LABELS, DEPARTMENT_TEST_FIELDS, PatientRecords,
+                    build_deep_query, gemini_client, index_records)
+
+QUESTIONS = [
+    "When was the last MRI?",
+    "Latest CBC result?",
+    "What medications is he on?",
+    "What did the latest chest CT show?",
+    "When was his last chemo cycle?",
+    "How many CT scans has she had?",
+    "Latest tumor markers",
+    "When did the patient last have an ECG?",
+    "What was the last chest X-ray?",
+    "Latest LFT results",
+    "Summarize this patient's history",
+    "How has the tumor marker trended?",
+    "Any neutropenia during chemotherapy?",
+    "Any cardiac concerns?",
+    "Is the disease responding to treatment?",
+    "What should we watch for at the next visit?",
+]
+
+async def main(use_gemini):
+    if use_gemini and not gemini_client:
+        sys.exit("--gemini needs GEMINI_API_KEY in backend/.env")
+    seed_data = build_seed_data()
+    local_ms, prompt_ms, llm_ms = [], [], []
+    local_questions = [q for q in QUESTIONS if match_intent(q)]
+    for profile in seed_data["profiles"]:
+        records = patient_records(seed_data, profile["patient_id"], 1)
+        documents, index = index_records(PatientRecords(profile=profile, **records))
+        for question in local_questions:
+            start = time.perf_counter()
+            intent = match_intent(question)
+            coll = intent.collection
+            answer_intent(intent, records[coll], DEPARTMENT_DATE_FIELDS[coll], DEPARTMENT_TEST_FIELDS[coll],
+                          DEPARTMENT_LABELS[coll])
+            local_ms.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            prompt = build_deep_query(profile, documents, index, question)[0]
+            build_ms = (time.perf_counter() - start) * 1000
+            prompt_ms.append(build_ms)
+            if use_gemini:
+                llm_ms.append(build_ms + await answer_ms(prompt))
+
+    print(f"{len(local_questions)} of {len(QUESTIONS)} questions answered locally "
+          f"({len(local_questions) / len(QUESTIONS):.0%}), {len(seed_data['profiles'])} patients\n")
+    for question in QUESTIONS:
+        print(f"  {'local' if question in local_questions else 'llm  '}  {question}")
+    print(f"\nlocal answer       mean {statistics.mean(local_ms):8.3f} ms")
+    print(f"LLM prompt build   mean {statistics.mean(prompt_ms):8.3f} ms")
+    if llm_ms:
+        print(f"LLM end-to-end     mean {statistics.mean(llm_ms):8.0f} ms   "
+              f"({statistics.mean(llm_ms) / statistics.mean(local_ms):,.0f}x the local answer)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the DocAssist no-LLM fast path")
+    parser.add_argument("--gemini", action="store_true", help="Also time the same questions through Gemini")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.gemini))
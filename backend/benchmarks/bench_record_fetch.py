@@ -0,0 +1,68 @@
+"""
+Benchmark — sequential vs concurrent department fetches for one patient lookup.
+
+Runs against the MongoDB configured in backend/.env, which must already be seeded
+(POST /api/init-data).
+
+Usage (from backend/):
+    python benchmarks/bench_record_fetch.py
+    python benchmarks/bench_record_fetch.py --patients 200 --rounds 5
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from server import db, DEPARTMENT_DATE_FIELDS, fetch_patient_records
+
+async def fetch_sequential(query):
+    """The pre-fetcher behaviour: one awaited round trip per department"""
+    profile = await db.profiles.find_one(query, {"_id": 0})
+    records = {}
+    for coll in DEPARTMENT_DATE_FIELDS:
+        records[coll] = await db[coll].find(query, {"_id": 0}).to_list(1000)
+    return profile, records
+
+async def fetch_concurrent(query):
+    return await fetch_patient_records(query, with_profile=True)
+
+async def time_lookups(fetch, patient_ids, rounds):
+    timings = []
+    for _ in range(rounds):
+        for pid in patient_ids:
+            start = time.perf_counter()
+            await fetch({"patient_id": pid})
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def summarize(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<12} mean {statistics.mean(timings):7.2f} ms   "
+          f"p50 {statistics.median(timings):7.2f} ms   p95 {p95:7.2f} ms")
+
+async def main(patient_count, rounds):
+    profiles = await db.profiles.find({}, {"_id": 0, "patient_id": 1}).to_list(patient_count)
+    patient_ids = [p["patient_id"] for p in profiles]
+    if not patient_ids:
+        sys.exit("No profiles found — seed the database first (POST /api/init-data)")
+
+    # Warm the connection pool and working set so neither variant pays for it
+    await time_lookups(fetch_concurrent, patient_ids[:10], 1)
+
+    print(f"{len(patient_ids)} patients x {rounds} rounds\n")
+    summarize("sequential", await time_lookups(fetch_sequential, patient_ids, rounds))
+    summarize("concurrent", await time_lookups(fetch_concurrent, patient_ids, rounds))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare sequential and concurrent record fetching")
+    parser.add_argument("--patients", type=int, default=100, help="Number of patients to look up per round")
+    parser.add_argument("--rounds", type=int, default=3, help="Passes over the patient list")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.patients, args.rounds))
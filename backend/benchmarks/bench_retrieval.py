@@ -0,0 +1,100 @@
+"""
+Benchmark — DocAssist context chosen by the department keyword router alone (every
+record of each routed department) vs BM25 record retrieval (top-k plus the latest of
+each department), both rendered by the compact encoder.
+
+Runs a fixed question set against every curated seed patient, with each history
+optionally repeated --years times. Reports prompt tokens and the time to build the
+prompt, including building the patient's BM25 index once. With --gemini it also sends
+both prompts to Gemini and reports end-to-end latency (needs GEMINI_API_KEY).
+
+Usage (from backend/):
+    python benchmarks/bench_retrieval.py
+    python benchmarks/bench_retrieval.py --years 20 --gemini
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bench_context import patient_records
+from context import encode_patient_context, estimate_tokens
+from data.seed import build_seed_data
+from server import (DEPARTMENT_DATE_FIELDS, DEPARTMENT_LABELS, CONTEXT_TOKEN_BUDGET, DOCASSIST_SYSTEM_MESSAGE,
+                    GEMINI_MODEL, PatientRecords, build_deep_query, gemini_client, genai_types,
+                    index_records, route_question)
+
+QUESTIONS = [
+    "Summarize this patient's history",
+    "How has the tumor marker trended?",
+    "Any neutropenia during chemotherapy?",
+    "What did the latest chest CT show?",
+    "List current medications",
+    "Any cardiac concerns?",
+]
+
+def router_prompt(profile, records, question):
+    """The pre-retrieval context: all records of every routed department"""
+    keyword_matched, is_overview = route_question(question)
+    tables = [(label, DEPARTMENT_DATE_FIELDS[coll], records[coll], len(records[coll]))
+              for coll, label in DEPARTMENT_LABELS.items() if is_overview or label in keyword_matched]
+    context = encode_patient_context(profile, tables, question, CONTEXT_TOKEN_BUDGET)
+    return f"Based on the following patient records, please answer this question: {question}\n\n{context}"
+
+def retrieval_prompt(profile, documents, index, question):
+    return build_deep_query(profile, documents, index, question)[0]
+
+async def answer_ms(prompt):
+    start = time.perf_counter()
+    await gemini_client.aio.models.generate_content(
+        model=GEMINI_MODEL, contents=prompt,
+        config=genai_types.GenerateContentConfig(system_instruction=DOCASSIST_SYSTEM_MESSAGE),
+    )
+    return (time.perf_counter() - start) * 1000
+
+async def main(years, use_gemini):
+    if use_gemini and not gemini_client:
+        sys.exit("--gemini needs GEMINI_API_KEY in backend/.env")
+    seed_data = build_seed_data()
+    results = {"router": {"tokens": [], "build": [], "answer": []},
+               "retrieval": {"tokens": [], "build": [], "answer": []}}
+    index_ms = []
+    for profile in seed_data["profiles"]:
+        records = patient_records(seed_data, profile["patient_id"], years)
+        start = time.perf_counter()
+        documents, index = index_records(PatientRecords(profile=profile, **records))
+        index_ms.append((time.perf_counter() - start) * 1000)
+
+        for question in QUESTIONS:
+            for variant, build in (("router", lambda: router_prompt(profile, records, question)),
+                                   ("retrieval", lambda: retrieval_prompt(profile, documents, index, question))):
+                start = time.perf_counter()
+                prompt = build()
+                build_ms = (time.perf_counter() - start) * 1000
+                results[variant]["build"].append(build_ms)
+                results[variant]["tokens"].append(estimate_tokens(prompt))
+                if use_gemini:
+                    results[variant]["answer"].append(build_ms + await answer_ms(prompt))
+
+    history = sum(len(seed_data[coll]) for coll in DEPARTMENT_DATE_FIELDS) * years / len(seed_data["profiles"])
+    print(f"{len(seed_data['profiles'])} patients, ~{history:.0f} records each, {len(QUESTIONS)} questions\n")
+    print(f"BM25 index build   mean {statistics.mean(index_ms):7.2f} ms per patient (once per timeline rev)")
+    for variant, r in results.items():
+        line = (f"{variant:<10} prompt mean {statistics.mean(r['tokens']):8,.0f} tokens   "
+                f"max {max(r['tokens']):8,}   build {statistics.mean(r['build']):6.2f} ms")
+        if r["answer"]:
+            line += f"   end-to-end {statistics.mean(r['answer']):8.0f} ms"
+        print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare router and BM25 context selection for DocAssist")
+    parser.add_argument("--years", type=int, default=1, help="Copies of each history, one per earlier year")
+    parser.add_argument("--gemini", action="store_true", help="Also time answers from the Gemini API")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.years, args.gemini))
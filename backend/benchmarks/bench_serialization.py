@@ -0,0 +1,92 @@
+"""
+Benchmark — bytes on the wire and server CPU per response for each encoding path.
+
+Compares FastAPI's default path (jsonable_encoder + stdlib json) with orjson and
+MessagePack, each uncompressed, gzip and brotli, on department-listing and search
+payloads built from the seed data (no database needed).
+
+Usage (from backend/):
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --extra 2000 --iterations 50
+"""
+
+import sys
+import json
+import gzip
+import time
+import random
+import argparse
+from pathlib import Path
+
+import brotli
+import msgpack
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from data.seed import build_seed_data
+
+def stdlib_json(body):
+    # What JSONResponse does after FastAPI runs jsonable_encoder over a returned dict
+    return json.dumps(jsonable_encoder(body), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+SERIALIZERS = {
+    "stdlib json": stdlib_json,
+    "orjson": orjson.dumps,
+    "msgpack": msgpack.packb,
+}
+
+COMPRESSORS = {
+    "identity": lambda content: content,
+    "gzip": lambda content: gzip.compress(content, 6),
+    "br": lambda content: brotli.compress(content, quality=4),
+}
+
+def build_payloads(seed_data):
+    treatment = sorted(seed_data["treatment_records"], key=lambda r: r["treatment_date"])
+    patient_id = seed_data["profiles"][0]["patient_id"]
+    search = {"profile": seed_data["profiles"][0]}
+    for coll, records in seed_data.items():
+        if coll != "profiles":
+            search[coll] = [r for r in records if r["patient_id"] == patient_id]
+    return {
+        f"department/treatment (all {len(treatment)})": {
+            "department": "treatment", "records": treatment, "total": len(treatment), "next_cursor": None
+        },
+        "department/treatment (page of 200)": {
+            "department": "treatment", "records": treatment[:200], "total": len(treatment), "next_cursor": "x"
+        },
+        f"search ({patient_id})": search,
+    }
+
+def cpu_ms(fn, iterations):
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) * 1000 / iterations
+
+def main(extra, iterations):
+    random.seed(42)
+    seed_data = build_seed_data(extra_count=extra)
+    for records in seed_data.values():
+        for record in records:
+            record.pop("_id", None)
+
+    for label, body in build_payloads(seed_data).items():
+        print(f"\n{label}")
+        print(f"  {'serializer':<12} {'encoding':<9} {'bytes':>10} {'cpu ms/req':>11}")
+        for ser_name, serialize in SERIALIZERS.items():
+            for enc_name, compress in COMPRESSORS.items():
+                size = len(compress(serialize(body)))
+                ms = cpu_ms(lambda: compress(serialize(body)), iterations)
+                print(f"  {ser_name:<12} {enc_name:<9} {size:>10,} {ms:>11.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare response encodings by size and CPU")
+    parser.add_argument("--extra", type=int, default=488, help="Extra generated patients (488 matches /api/init-data)")
+    parser.add_argument("--iterations", type=int, default=20, help="Encodings timed per combination")
+    args = parser.parse_args()
+
+    main(args.extra, args.iterations)
@@ -0,0 +1,88 @@
+"""
+Benchmark — time to first audio for DocAssist answers read aloud: /tts synthesizing
+the whole answer as one MP3 vs /tts/stream synthesizing it sentence by sentence.
+
+Each answer is spoken both ways through a fresh, empty SpeechCache. By default the
+synthesizer is a stand-in with gTTS's cost model — one request of --rtt seconds per
+100 characters, made one after another — so the numbers don't depend on the network;
+--gtts uses real gTTS instead (needs internet access).
+
+Usage (from backend/):
+    python benchmarks/bench_tts.py
+    python benchmarks/bench_tts.py --workers 2 --gtts
+"""
+
+import sys
+import time
+import math
+import asyncio
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from server import gtts_mp3
+from tts import SpeechCache, split_sentences
+
+ANSWERS = [
+    "Latest: ⚠ Complete Blood Count — 2025-03-12: Neutropenia — WBC 2.1 (Dr. Sullivan)\n"
+    "Previous: Complete Blood Count — 2025-01-15: Normal (Dr. Whitfield)",
+    "⚠ Neutropenia after cycle 2 of cisplatin/pemetrexed: WBC 2.1 on 2025-03-12, down from a normal "
+    "baseline in January. Cycle 3 went ahead on schedule. Counts recovered by the April CBC. "
+    "No febrile episodes recorded. Tumor markers fell over the same period, CEA from 12.5 to 5.2 ng/mL. "
+    "Next step: repeat CBC before the next immunotherapy dose.",
+    "Partial response on imaging. The chest CT on 2025-06-04 shows the mass reduced to 1.8 cm. "
+    "The chest X-ray in October is stable with no new lesions. The brain MRI in January showed no "
+    "intracranial metastases. ECGs have all been normal sinus rhythm. Current treatment is pembrolizumab "
+    "200 mg IV q3w maintenance. Liver and kidney function are within range. Consider restaging CT in "
+    "three months, and f/u with Dr. Kapoor on the maintenance plan.",
+]
+
+def stand_in(rtt):
+    def synthesize(text):
+        time.sleep(rtt * math.ceil(len(text) / 100))
+        return b"\xff\xfb" * len(text)
+    return synthesize
+
+async def whole(speech, text):
+    start = time.perf_counter()
+    await speech.speak(text)
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+async def streamed(speech, text):
+    start = time.perf_counter()
+    first = None
+    async for _ in speech.speak_sentences(split_sentences(text)):
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+async def main(synthesize, workers):
+    results = {"whole": ([], []), "streamed": ([], [])}
+    print(f"{'answer':<8}{'chars':>7}{'sentences':>11}{'whole first':>14}{'stream first':>14}"
+          f"{'whole total':>13}{'stream total':>14}")
+    for n, text in enumerate(ANSWERS, 1):
+        row = {}
+        for variant, speak in (("whole", whole), ("streamed", streamed)):
+            with tempfile.TemporaryDirectory() as directory:
+                first, total = await speak(SpeechCache(synthesize, directory, max_workers=workers), text)
+            results[variant][0].append(first)
+            results[variant][1].append(total)
+            row[variant] = (first, total)
+        print(f"{n:<8}{len(text):>7}{len(split_sentences(text)):>11}{row['whole'][0] * 1000:>12.0f}ms"
+              f"{row['streamed'][0] * 1000:>12.0f}ms{row['whole'][1] * 1000:>11.0f}ms{row['streamed'][1] * 1000:>12.0f}ms")
+    whole_first, stream_first = (statistics.mean(results[v][0]) for v in ("whole", "streamed"))
+    print(f"\nmean time to first audio: whole {whole_first * 1000:.0f} ms, streamed {stream_first * 1000:.0f} ms "
+          f"({whole_first / stream_first:.1f}x sooner)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare time to first audio of whole vs streamed TTS")
+    parser.add_argument("--workers", type=int, default=4, help="Synthesis threads (TTS_CONCURRENCY)")
+    parser.add_argument("--rtt", type=float, default=0.3, help="Stand-in seconds per 100-character request")
+    parser.add_argument("--gtts", action="store_true", help="Synthesize with real gTTS instead of the stand-in")
+    args = parser.parse_args()
+
+    asyncio.run(main(gtts_mp3 if args.gtts else stand_in(args.rtt), args.workers))
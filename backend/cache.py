@@ -0,0 +1,68 @@
+"""
+In-process LRU cache with a per-entry TTL, for read-through caching of API responses.
+"""
+
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class TTLCache:
+    """Keeps at most `maxsize` entries, evicting the least recently used first;
+    entries older than `ttl` seconds are treated as absent. `on_evict(key, value)`,
+    if given, is called for each entry dropped by eviction or expiry."""
+
+    def __init__(self, maxsize, ttl, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING or entry[0] < time.monotonic():
+            if entry is not _MISSING:
+                del self._entries[key]
+                self._evicted(key, entry[1])
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            evicted, (_, value) = self._entries.popitem(last=False)
+            self._evicted(evicted, value)
+
+    def _evicted(self, key, value):
+        if self.on_evict:
+            self.on_evict(key, value)
+
+    def pop(self, key, default=None):
+        """Remove and return a live entry without counting a hit or miss"""
+        entry = self._entries.pop(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        if entry[0] < time.monotonic():
+            self._evicted(key, entry[1])
+            return default
+        return entry[1]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
@@ -0,0 +1,91 @@
+"""
+Hospital-wide cohort analytics — every patient's features and timeline events loaded
+once into pandas frames, grouped statistics computed with vectorized operations.
+"""
+
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+GROUP_FIELDS = ("scenario", "age_band", "blood_group", "gender")
+AGE_BANDS = ["<30", "30-39", "40-49", "50-59", "60-69", "70+"]
+AGE_BINS = [0, 30, 40, 50, 60, 70, np.inf]
+HEALTH_TRENDS = ["Excellent", "Good", "Stable", "Needs Attention"]
+
+def build_frames(profiles, timelines):
+    """(patients, events) frames.
+
+    profiles — dicts with patient_id, age, gender, blood_group and scenario
+    timelines — one dict per patient with patient_id, visits, tests, normal (counts)
+    and types/months, parallel lists with one entry per timeline event
+    """
+    patients = pd.DataFrame.from_records(
+        profiles, columns=["patient_id", "age", "gender", "blood_group", "scenario"]
+    ).set_index("patient_id")
+    # Profiles seeded before scenarios were stored have none
+    patients["scenario"] = patients["scenario"].fillna("unknown")
+    patients["age_band"] = pd.cut(patients["age"], AGE_BINS, right=False, labels=AGE_BANDS)
+    for field in ("scenario", "blood_group", "gender"):
+        patients[field] = patients[field].astype("category")
+
+    counts = pd.DataFrame.from_records(
+        timelines, columns=["patient_id", "visits", "tests", "normal"]
+    ).set_index("patient_id")
+    patients = patients.join(counts)
+    patients[["visits", "tests", "normal"]] = patients[["visits", "tests", "normal"]].fillna(0).astype(np.int64)
+
+    # Same thresholds as the per-patient /analytics health_trend
+    normal = patients["normal"].to_numpy()
+    abnormal = patients["tests"].to_numpy() - normal
+    patients["health_trend"] = pd.Categorical(
+        np.select([normal > abnormal * 2, normal > abnormal, normal == abnormal], HEALTH_TRENDS[:3], HEALTH_TRENDS[3]),
+        categories=HEALTH_TRENDS
+    )
+
+    events = pd.DataFrame({
+        "type": pd.Categorical(list(chain.from_iterable(t["types"] for t in timelines))),
+        "month": pd.Categorical(list(chain.from_iterable(t["months"] for t in timelines)))
+    })
+    return patients, events
+
+def trend_counts(series):
+    return {trend: int(n) for trend, n in series.value_counts().reindex(HEALTH_TRENDS, fill_value=0).items()}
+
+def cohort_summary(patients, events, group_by):
+    """Patient counts, visit statistics and health-trend breakdown per group, plus
+    tests per department per month across the whole hospital"""
+    group_by = list(group_by)
+    stats = patients.groupby(group_by, observed=True).agg(
+        patients=("visits", "size"),
+        visits=("visits", "sum"),
+        mean_visits=("visits", "mean"),
+        tests=("tests", "sum")
+    )
+    trends = (patients.groupby([*group_by, "health_trend"], observed=True).size()
+              .unstack(fill_value=0).reindex(columns=HEALTH_TRENDS, fill_value=0))
+    table = stats.join(trends).sort_values("patients", ascending=False).reset_index()
+
+    groups = [
+        {
+            **{field: row[field] for field in group_by},
+            "patients": row["patients"],
+            "visits": row["visits"],
+            "mean_visits": round(row["mean_visits"], 2),
+            "tests": row["tests"],
+            "health_trend": {trend: row[trend] for trend in HEALTH_TRENDS}
+        }
+        for row in table.to_dict("records")
+    ]
+
+    tests = events[events["type"] != "Treatment"]
+    monthly = tests.groupby(["month", "type"], observed=True).size().unstack(fill_value=0).sort_index()
+    return {
+        "patients": len(patients),
+        "group_by": group_by,
+        "health_trend": trend_counts(patients["health_trend"]),
+        "groups": groups,
+        "tests_per_department_per_month": {
+            month: {dept: int(n) for dept, n in row.items()} for month, row in monthly.iterrows()
+        }
+    }
@@ -0,0 +1,73 @@
+"""
+Compact patient context for DocAssist prompts — each department rendered as a
+pipe-separated table with only the fields the model reads, trimmed to a token budget.
+"""
+
+from retrieval import tokenize
+
+# Never useful to the model: ids and the patient's name repeat on every row, image
+# URLs must not reach the LLM at all, and categories are derived from `result`
+OMITTED_FIELDS = {"_id", "patient_id", "name", "report_image", "result_category", "treatment_status"}
+PROFILE_FIELDS = [("name", "Name"), ("patient_id", "Patient ID"), ("age", "Age"), ("gender", "Gender"),
+                  ("blood_group", "Blood Group"), ("address", "Address"), ("phone", "Phone"),
+                  ("registration_date", "Registration Date")]
+
+def estimate_tokens(text):
+    """Gemini averages about four characters per token on English text"""
+    return (len(text) + 3) // 4
+
+def columns_for(records, date_field):
+    columns = [date_field]
+    for record in records:
+        columns.extend(k for k in record if k not in OMITTED_FIELDS and k not in columns)
+    return columns
+
+def render_row(record, columns):
+    return " | ".join(str(record.get(c, "")).replace("|", "/").replace("\n", " ") for c in columns)
+
+def table_heading(label, columns, shown, total):
+    if not total:
+        return f"\n{label.upper()} RECORDS: none\n"
+    count = f"all {total}" if shown == total else f"{shown} of {total}, the rest not shown"
+    return f"\n{label.upper()} RECORDS ({count}):\n{' | '.join(columns)}\n"
+
+def encode_patient_context(profile, departments, question="", budget=None):
+    """Prompt text for one patient.
+
+    departments — (label, date_field, records, total) per department to include, where
+    total is how many records the patient has there (records may be a selection)
+    budget — maximum estimated tokens; when the tables don't fit, rows mentioning a
+    question term are kept first, then the most recent. Kept rows keep their order.
+    """
+    header = "PATIENT PROFILE:\n" + "\n".join(
+        f"- {label}: {profile.get(field)}" for field, label in PROFILE_FIELDS
+    ) + "\n"
+
+    tables, candidates = [], []
+    for label, date_field, records, total in departments:
+        columns = columns_for(records, date_field)
+        rows = [render_row(r, columns) for r in records]
+        tables.append((label, columns, rows, total))
+        candidates.extend((len(tables) - 1, i, r[date_field]) for i, r in enumerate(records))
+
+    fixed = header + "".join(table_heading(label, columns, 0, total) for label, columns, _, total in tables)
+    kept = {(t, i) for t, i, _ in candidates}
+    if budget is not None:
+        terms = set(tokenize(question))
+        def priority(candidate):
+            t, i, date = candidate
+            return (bool(terms & set(tokenize(tables[t][2][i]))), date)
+        remaining = budget - estimate_tokens(fixed)
+        kept = set()
+        for t, i, _ in sorted(candidates, key=priority, reverse=True):
+            cost = estimate_tokens(tables[t][2][i] + "\n")
+            if cost > remaining:
+                break
+            remaining -= cost
+            kept.add((t, i))
+
+    context = header
+    for t, (label, columns, rows, total) in enumerate(tables):
+        shown = [row for i, row in enumerate(rows) if (t, i) in kept]
+        context += table_heading(label, columns, len(shown), total) + "".join(f"{row}\n" for row in shown)
+    return context
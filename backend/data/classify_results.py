@@ -0,0 +1,41 @@
+"""
+Backfill — store result_category / treatment_status on department records ingested
+before results were classified, then rebuild patient_timelines so every event carries
+its category. The server runs the same backfill at startup; this applies it to the
+database in backend/.env without a restart.
+
+Usage (from backend/):
+    python data/classify_results.py
+    python data/classify_results.py --reclassify    # also redo already-classified records
+"""
+
+import sys
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from server import (db, client, DEPARTMENT_CATEGORY_FIELDS, ensure_indexes,
+                    backfill_result_classification, rebuild_timelines)
+
+async def main(reclassify):
+    await ensure_indexes()
+    if reclassify:
+        for coll, field in DEPARTMENT_CATEGORY_FIELDS.items():
+            await db[coll].update_many({}, {"$unset": {field: ""}})
+    updated = await backfill_result_classification()
+    await rebuild_timelines()
+    print(f"Classified {updated} records")
+    for coll, field in DEPARTMENT_CATEGORY_FIELDS.items():
+        counts = await db[coll].aggregate([{"$group": {"_id": f"${field}", "n": {"$sum": 1}}}]).to_list(None)
+        print(f"  {coll}: " + ", ".join(f"{c['_id']} {c['n']}" for c in sorted(counts, key=lambda c: c["_id"])))
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify stored department results")
+    parser.add_argument("--reclassify", action="store_true",
+                        help="Clear and recompute classifications on every record, e.g. after changing the rules")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.reclassify))
@@ -6,9 +6,11 @@ Usage:
     python data/seed.py --extra 50       # Add 50 extra generated patients on top
 """
 
+import re
 import json
 import random
 import argparse
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime, timedelta
 
@@ -21,6 +23,7 @@ def load_json(path):
 def load_patients():
     return load_json(DATA_DIR / "patients.json")
 
+@lru_cache(maxsize=None)
 def load_scenario(name):
     return load_json(DATA_DIR / "scenarios" / f"{name}.json")
 
@@ -43,6 +46,26 @@ def get_image(department, test_name):
     all_dept = [img for imgs in dept_images.values() for img in imgs]
     return random.choice(all_dept) if all_dept else None
 
+# Results are classified once, when a record is created, and stored on it — analytics
+# count these fields instead of re-scanning free text on every request
+NORMAL_RESULT = re.compile(r"normal|clear|within range", re.IGNORECASE)
+TREATMENT_STATUS_MARKERS = [
+    ("completed", ("Completed", "Successful")),
+    ("in_progress", ("Progress",)),
+    ("scheduled", ("Scheduled",)),
+]
+
+def result_category(result):
+    """Category stored on test records: normal or abnormal"""
+    return "normal" if NORMAL_RESULT.search(result or "") else "abnormal"
+
+def treatment_status(result):
+    """Status stored on treatment records: completed, in_progress, scheduled or other"""
+    for status, markers in TREATMENT_STATUS_MARKERS:
+        if any(marker in (result or "") for marker in markers):
+            return status
+    return "other"
+
 def week_to_date(registration_date, week_offset):
     base = datetime.strptime(registration_date, "%Y-%m-%d")
     return (base + timedelta(weeks=week_offset)).strftime("%Y-%m-%d")
@@ -88,6 +111,7 @@ def build_records_for_patient(patient):
                     "treatment_name": rec["treatment_name"],
                     "treatment_date": date,
                     "result": rec["result"],
+                    "treatment_status": treatment_status(rec["result"]),
                     "doctor": doctor,
                     "medicines": rec["medicines"]
                 }
@@ -98,6 +122,7 @@ def build_records_for_patient(patient):
                     "test_name": rec["test_name"],
                     "test_date": date,
                     "result": rec["result"],
+                    "result_category": result_category(rec["result"]),
                     "doctor": doctor,
                 }
                 img = get_image(dept, rec["test_name"])
@@ -211,8 +236,7 @@ def build_seed_data(extra_count=0):
     }
 
     for patient in patients:
-        profile = {k: v for k, v in patient.items() if k != "scenario"}
-        all_records["profiles"].append(profile)
+        all_records["profiles"].append(dict(patient))
 
         patient_records = build_records_for_patient(patient)
         for coll, recs in patient_records.items():
@@ -0,0 +1,120 @@
+"""
+Deterministic answers to plain DocAssist lookups — "when was the last MRI?", "latest
+CBC result?", "what medications is he on?" — straight from a patient's records.
+
+Questions are matched whole against a few templates, and the thing asked about must
+be a known test or department, so anything with more to it ("how has the CEA
+trended?", "any neutropenia during chemo?") falls through to the LLM.
+"""
+
+import re
+import dataclasses
+
+PRONOUN = r"(?:he|she|they|the patient|this patient)"
+POSSESSIVE = r"(?:the|his|her|their|(?:the|this) patient's)"
+LAST = r"(?:last|latest|most recent|newest)"
+
+# (kind, template) — a question must fullmatch one, after normalize()
+TEMPLATES = [(kind, re.compile(template)) for kind, template in [
+    ("date", rf"when (?:was|were) {POSSESSIVE} {LAST} (?P<subject>.+?)(?: done| taken| performed| given)?"),
+    ("date", rf"when did {PRONOUN} (?:last )?(?:have|get|receive|undergo) (?:an? |the |{POSSESSIVE} )?"
+             rf"(?:{LAST} )?(?P<subject>.+?)(?: last)?"),
+    ("date", rf"(?:what was )?(?:the )?date of {POSSESSIVE} {LAST} (?P<subject>.+)"),
+    ("latest", rf"(?:what (?:was|is|were|are) )?(?:{POSSESSIVE} )?{LAST} (?P<subject>.+?)"),
+    ("latest", rf"what did {POSSESSIVE} {LAST} (?P<subject>.+?) (?:show|say|find|reveal)"),
+    ("latest", rf"(?:show|give) (?:me )?{POSSESSIVE} {LAST} (?P<subject>.+)"),
+    ("count", rf"how many (?P<subject>.+?) (?:has|have|did) {PRONOUN} (?:had|have|done|gotten|got|received|undergone)"),
+    ("medications", rf"(?:what|which) (?:medications?|medicines?|meds|drugs) (?:is|are) {PRONOUN} "
+                    rf"(?:currently )?(?:on|taking|receiving|prescribed)(?: now| currently)?"),
+    ("medications", rf"(?:what are |list )?(?:{POSSESSIVE} )?(?:current|latest|present) (?:medications?|medicines?|meds)"),
+    ("medications", rf"what is {PRONOUN} (?:currently )?(?:taking|on)"),
+]]
+
+# (collection, pattern, site) — what a question can be about. site narrows the
+# collection to records whose test or treatment name contains it; None takes it from
+# the pattern's `site` group, if that matched.
+SUBJECTS = [(collection, re.compile(pattern), site) for collection, pattern, site in [
+    ("blood_profile_records", r"cbcs?|complete blood counts?|full blood counts?|blood counts?", "complete blood count"),
+    ("blood_profile_records", r"tumou?r markers?|cea|ca[- ]?125|ca 15-3", "tumor marker"),
+    ("blood_profile_records", r"lfts?|liver function|liver panel", "liver function"),
+    ("blood_profile_records", r"kfts?|kidney function|renal function|renal panel", "kidney function"),
+    ("blood_profile_records", r"thyroid|tsh", "thyroid"),
+    ("blood_profile_records", r"lipids?|lipid profile|cholesterol", "lipid"),
+    ("blood_profile_records", r"blood ?work|blood tests?|bloods|labs?|blood profile", ""),
+    ("mri_records", r"(?:(?P<site>brain|breast|pelvic|spine) )?mri(?: scan)?s?", None),
+    ("ct_scan_records", r"(?:(?P<site>chest|abdominal|head) )?(?:ct|cat)(?: scan)?s?", None),
+    ("xray_records", r"(?:(?P<site>chest) )?x-?rays?", None),
+    ("ecg_records", r"ecgs?|ekgs?|electrocardiograms?", ""),
+    ("treatment_records", r"chemo(?:therapy)?(?: cycles?| sessions?| infusions?)?", "chemo"),
+    ("treatment_records", r"surgery|surgeries|operations?", "surgery"),
+    ("treatment_records", r"immunotherapy", "immunotherapy"),
+    ("treatment_records", r"treatments?", ""),
+]]
+ARTICLE = re.compile(r"^(?:an?|the|any) ")
+SUFFIX = re.compile(r"(?: (?:tests?|results?|findings|reports?|panel|values|levels|done))+$")
+
+@dataclasses.dataclass(frozen=True)
+class Intent:
+    kind: str
+    collection: str
+    site: str = ""
+
+def normalize(question):
+    text = " ".join(question.casefold().split()).strip("?!. ")
+    text = text.replace("’", "'")
+    return re.sub(r"^(?:(?:please|ok|okay|so|and),? )?(?:(?:can|could) you (?:tell|show|give) me )?", "", text)
+
+def match_subject(subject):
+    """(collection, site) named by a template's subject, or None"""
+    subject = SUFFIX.sub("", ARTICLE.sub("", subject))
+    for collection, pattern, site in SUBJECTS:
+        match = pattern.fullmatch(subject)
+        if match:
+            return collection, site if site is not None else (match.group("site") or "")
+    return None
+
+def match_intent(question):
+    """The Intent of a plain lookup question, or None to ask the LLM"""
+    text = normalize(question)
+    for kind, template in TEMPLATES:
+        match = template.fullmatch(text)
+        if not match:
+            continue
+        if kind == "medications":
+            return Intent(kind, "treatment_records")
+        subject = match_subject(match.group("subject"))
+        if subject:
+            return Intent(kind, *subject)
+    return None
+
+def describe(record, date_field, name_field):
+    flag = "⚠ " if record.get("result_category") == "abnormal" else ""
+    return f"{flag}{record[name_field]} — {record[date_field]}: {record.get('result', '')} ({record.get('doctor', '')})"
+
+def answer_intent(intent, records, date_field, name_field, label):
+    """(answer, evidence records) for an Intent, given the patient's records of its
+    collection"""
+    matching = sorted((r for r in records if intent.site in r.get(name_field, "").lower()),
+                      key=lambda r: r[date_field], reverse=True)
+    if intent.kind == "medications":
+        latest = next((r for r in matching if r.get("medicines")), None)
+        if latest is None:
+            return "No medications on record.", []
+        medicines = "".join(f"\n- {m.strip()}" for m in latest["medicines"].split(",") if m.strip())
+        return (f"Medications per the latest treatment record ({latest[name_field]}, "
+                f"{latest[date_field]}):{medicines}"), [latest]
+    if not matching:
+        return f"No {label} records{f' matching {intent.site!r}' if intent.site else ''}.", []
+
+    latest = matching[0]
+    if intent.kind == "date":
+        return f"Last {latest[name_field]}: {latest[date_field]}\n- {describe(latest, date_field, name_field)}", [latest]
+    if intent.kind == "count":
+        lines = "".join(f"\n- {describe(r, date_field, name_field)}" for r in matching)
+        return f"{len(matching)} {label} record{'s' if len(matching) != 1 else ''} on file:{lines}", matching[:6]
+    # latest, with the one before it of the same test for comparison
+    previous = next((r for r in matching[1:] if r[name_field] == latest[name_field]), None)
+    answer = f"Latest: {describe(latest, date_field, name_field)}"
+    if previous:
+        answer += f"\nPrevious: {describe(previous, date_field, name_field)}"
+    return answer, [latest] + ([previous] if previous else [])
@@ -0,0 +1,267 @@
+"""
+LLM call plumbing: coalescing of identical in-flight requests and streams, and an
+adaptive client layer (concurrency cap, backoff with jitter, circuit breaker, stats)
+under it.
+"""
+
+import time
+import random
+import asyncio
+from collections import Counter, deque
+
+from google.genai import errors as genai_errors
+
+class SingleFlight:
+    """Concurrent do() calls with the same key share one task. Every waiter gets its
+    result or its exception. A waiter that is cancelled leaves the others unaffected;
+    the shared call is only cancelled once nobody is waiting for it. Finished calls
+    are forgotten, so a later identical request runs again."""
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = {}
+
+    async def do(self, key, call):
+        """await call() — or the in-flight call already running under key"""
+        flight = self._in_flight.get(key)
+        if flight is None:
+            flight = {"task": asyncio.ensure_future(call()), "waiters": 0}
+            self._in_flight[key] = flight
+            flight["task"].add_done_callback(lambda _: self._forget(key, flight))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        flight["waiters"] += 1
+        try:
+            return await asyncio.shield(flight["task"])
+        finally:
+            flight["waiters"] -= 1
+            if not flight["waiters"] and not flight["task"].done():
+                self._forget(key, flight)
+                flight["task"].cancel()
+
+    def _forget(self, key, flight):
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+
+    def stats(self):
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._in_flight)}
+
+class StreamFlight:
+    """SingleFlight for streams: concurrent stream() calls with the same key read one
+    upstream stream. A reader that joins late gets the chunks so far replayed, then
+    the rest as they arrive, and every reader gets the stream's exception. The
+    upstream is closed once nobody is reading it; finished streams are forgotten."""
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = {}
+
+    async def stream(self, key, open_stream):
+        """Chunks of open_stream() — or of the stream already running under key"""
+        flight = self._in_flight.get(key)
+        if flight is None:
+            flight = {"chunks": [], "done": False, "error": None, "readers": 0,
+                      "changed": asyncio.Condition()}
+            flight["task"] = asyncio.ensure_future(self._pump(flight, open_stream()))
+            self._in_flight[key] = flight
+            flight["task"].add_done_callback(lambda _: self._forget(key, flight))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        flight["readers"] += 1
+        try:
+            position = 0
+            while True:
+                async with flight["changed"]:
+                    await flight["changed"].wait_for(lambda: position < len(flight["chunks"]) or flight["done"])
+                    chunks, done = flight["chunks"][position:], flight["done"]
+                for chunk in chunks:
+                    yield chunk
+                position += len(chunks)
+                if done:
+                    break
+            if flight["error"] is not None:
+                raise flight["error"]
+        finally:
+            flight["readers"] -= 1
+            if not flight["readers"] and not flight["task"].done():
+                self._forget(key, flight)
+                flight["task"].cancel()
+
+    async def _pump(self, flight, upstream):
+        try:
+            async for chunk in upstream:
+                async with flight["changed"]:
+                    flight["chunks"].append(chunk)
+                    flight["changed"].notify_all()
+        except Exception as e:
+            flight["error"] = e
+        finally:
+            await upstream.aclose()
+        async with flight["changed"]:
+            flight["done"] = True
+            flight["changed"].notify_all()
+
+    def _forget(self, key, flight):
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+
+    def stats(self):
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._in_flight)}
+
+class CircuitOpenError(Exception):
+    """Raised without calling the LLM while the circuit breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"LLM circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+def is_retryable(error):
+    """Overload and rate-limit responses — worth retrying, and what trips the breaker"""
+    return isinstance(error, genai_errors.ServerError) or (
+        isinstance(error, genai_errors.ClientError) and error.code == 429
+    )
+
+def retry_hint(error):
+    """Seconds the API asked us to wait — a RetryInfo detail or a Retry-After header"""
+    body = error.details.get("error", {}) if isinstance(error.details, dict) else {}
+    for detail in body.get("details", []) if isinstance(body, dict) else []:
+        if isinstance(detail, dict) and "retryDelay" in detail:
+            try:
+                return float(str(detail["retryDelay"]).rstrip("s"))
+            except ValueError:
+                pass
+    headers = getattr(error.response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class AdaptiveLLM:
+    """Runs LLM calls with at most `max_concurrency` in flight, retrying overload errors
+    with exponential backoff and full jitter (or as long as the API asks, if that's no
+    more than max_delay — a longer ask is raised at once), behind a circuit breaker:
+    after `failure_threshold` overload errors in a row, calls fail fast with
+    CircuitOpenError for `cooldown` seconds, then a single probe call decides whether
+    to close it again."""
+
+    def __init__(self, max_concurrency=4, max_attempts=4, base_delay=0.5, max_delay=16.0,
+                 failure_threshold=5, cooldown=30.0):
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.retries = 0
+        self.outcomes = Counter()
+        self.latencies = deque(maxlen=500)
+
+    def state(self):
+        if self.consecutive_failures < self.failure_threshold:
+            return "closed"
+        return "open" if self.probing or time.monotonic() < self.open_until else "half_open"
+
+    def backoff(self, attempt, hint):
+        if hint is not None:
+            return min(hint, self.max_delay) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _record_failure(self, error):
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self.open_until = time.monotonic() + max(self.cooldown, retry_hint(error) or 0)
+
+    async def _attempts(self, run, hold=False):
+        """await run() until it succeeds, fails with a non-retryable error, attempts run
+        out, the breaker opens or the API asks for a longer wait than max_delay — the
+        last three re-raise the overload error. Each attempt takes a concurrency slot
+        and gives it back before any backoff sleep; with hold, the slot of the attempt
+        that succeeded is kept and the caller must release it."""
+        state = self.state()
+        if state == "open":
+            self.outcomes["rejected"] += 1
+            raise CircuitOpenError(max(self.open_until - time.monotonic(), 1.0))
+        start = time.monotonic()
+        probe = self.probing = state == "half_open"
+        try:
+            for attempt in range(self.max_attempts):
+                await self.slots.acquire()
+                try:
+                    result = await run()
+                except BaseException as e:
+                    self.slots.release()
+                    if not isinstance(e, Exception) or not is_retryable(e):
+                        raise
+                    self._record_failure(e)
+                    hint = retry_hint(e)
+                    if (probe or attempt + 1 == self.max_attempts or self.state() != "closed"
+                            or (hint or 0) > self.max_delay):
+                        raise
+                    self.retries += 1
+                    await asyncio.sleep(self.backoff(attempt, hint))
+                else:
+                    if not hold:
+                        self.slots.release()
+                    self.consecutive_failures = 0
+                    self.outcomes["ok"] += 1
+                    return result
+        except Exception as e:
+            self.outcomes["overloaded" if is_retryable(e) else "error"] += 1
+            raise
+        finally:
+            if probe:
+                self.probing = False
+            self.latencies.append(time.monotonic() - start)
+
+    async def call(self, make_call):
+        """await make_call() under the limits above"""
+        self.in_flight += 1
+        try:
+            return await self._attempts(make_call)
+        finally:
+            self.in_flight -= 1
+
+    async def stream(self, open_stream):
+        """Chunks of the async iterator `await open_stream()` returns. Only opening the
+        stream and reading the first chunk are retried — text already yielded can't be
+        taken back. From the first chunk on, the stream holds its concurrency slot
+        until it ends."""
+        async def first_chunk():
+            iterator = (await open_stream()).__aiter__()
+            try:
+                return iterator, await iterator.__anext__()
+            except StopAsyncIteration:
+                return iterator, None
+
+        self.in_flight += 1
+        try:
+            iterator, chunk = await self._attempts(first_chunk, hold=True)
+            try:
+                if chunk is None:
+                    return
+                yield chunk
+                async for chunk in iterator:
+                    yield chunk
+            finally:
+                self.slots.release()
+        finally:
+            self.in_flight -= 1
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        def percentile(p):
+            return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 1) if latencies else 0.0
+        return {"state": self.state(), "max_concurrency": self.max_concurrency, "in_flight": self.in_flight,
+                "retries": self.retries, "outcomes": dict(self.outcomes),
+                "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95)}}
@@ -0,0 +1,39 @@
+"""
+Okapi BM25 over one patient's records — ranks individual records against a DocAssist
+question so the prompt carries the rows it's about rather than whole departments.
+"""
+
+import math
+import re
+from collections import Counter
+
+TOKEN = re.compile(r"[a-z0-9]{2,}")
+STOPWORDS = {"the", "and", "for", "with", "was", "are", "what", "how", "any", "has", "have", "this", "that",
+             "is", "of", "in", "on", "to", "an", "or", "it", "be", "do", "me", "my", "we", "his", "her",
+             "patient", "their", "show", "tell", "about", "does", "did", "from", "last", "latest"}
+
+def tokenize(text):
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+class BM25Index:
+    """Built once per token-list corpus; scores() is one pass over the documents"""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(d) for d in documents]
+        self.lengths = [len(d) for d in documents]
+        self.average_length = sum(self.lengths) / len(documents) if documents else 0
+        document_frequency = Counter(t for counts in self.term_counts for t in counts)
+        n = len(documents)
+        self.idf = {t: math.log((n - df + 0.5) / (df + 0.5) + 1) for t, df in document_frequency.items()}
+
+    def scores(self, query):
+        """One score per document, 0 where no query term occurs"""
+        terms = set(tokenize(query)) & self.idf.keys()
+        scores = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.average_length)
+            scores.append(sum(self.idf[t] * counts[t] * (self.k1 + 1) / (counts[t] + norm)
+                              for t in terms if t in counts))
+        return scores
@@ -1,26 +1,47 @@
-from fastapi import FastAPI, APIRouter, Query, HTTPException, UploadFile, File, Form
-from fastapi.responses import Response
+from fastapi import FastAPI, APIRouter, Query, HTTPException, UploadFile, File, Form, Body, Header, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, UpdateOne
+from pymongo.errors import OperationFailure
 import os
 import logging
 import re
 import io
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
 from typing import List, Optional
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 import random
+import time
 from collections import Counter
 from google import genai
 from google.genai import types as genai_types
-from google.genai import errors as genai_errors
 from gtts import gTTS
 import asyncio
 import json
 import shutil
 import uuid
+import dataclasses
+import unicodedata
+import base64
+import hashlib
+import gzip
+import orjson
+import msgpack
+import brotli
+from bson import ObjectId
+from bson.errors import InvalidId
+from cache import TTLCache
+from data.seed import result_category, treatment_status
+from cohort import AGE_BANDS, AGE_BINS, GROUP_FIELDS, build_frames, cohort_summary
+from context import encode_patient_context, estimate_tokens
+from intents import answer_intent, match_intent
+from retrieval import BM25Index, tokenize
+from tts import SpeechCache, split_sentences
+from llm import AdaptiveLLM, CircuitOpenError, SingleFlight, StreamFlight, is_retryable, retry_hint
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -30,25 +51,593 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Department collections and the date field each one is ordered by
+DEPARTMENT_DATE_FIELDS = {
+    "mri_records": "test_date",
+    "xray_records": "test_date",
+    "ecg_records": "test_date",
+    "blood_profile_records": "test_date",
+    "ct_scan_records": "test_date",
+    "treatment_records": "treatment_date",
+}
+
+DEPARTMENT_TEST_FIELDS = {
+    "mri_records": "test_name",
+    "xray_records": "test_name",
+    "ecg_records": "test_name",
+    "blood_profile_records": "test_name",
+    "ct_scan_records": "test_name",
+    "treatment_records": "treatment_name",
+}
+
+DEPARTMENT_LABELS = {
+    "mri_records": "MRI",
+    "xray_records": "X-Ray",
+    "ecg_records": "ECG",
+    "blood_profile_records": "Blood Profile",
+    "ct_scan_records": "CT Scan",
+    "treatment_records": "Treatment",
+}
+
+# Classification stored on each record at ingest (data/seed.py)
+DEPARTMENT_CATEGORY_FIELDS = {
+    "mri_records": "result_category",
+    "xray_records": "result_category",
+    "ecg_records": "result_category",
+    "blood_profile_records": "result_category",
+    "ct_scan_records": "result_category",
+    "treatment_records": "treatment_status",
+}
+
+def classify_result(coll, result):
+    return treatment_status(result) if coll == "treatment_records" else result_category(result)
+
+def department_indexes(coll):
+    date_field = DEPARTMENT_DATE_FIELDS[coll]
+    test_field = DEPARTMENT_TEST_FIELDS[coll]
+    category_field = DEPARTMENT_CATEGORY_FIELDS[coll]
+    return [
+        IndexModel([("patient_id", ASCENDING), (date_field, ASCENDING)], name=f"patient_id_{date_field}"),
+        # Department listing: keyset pages over (date, _id), optionally narrowed by doctor or test
+        IndexModel([(date_field, ASCENDING), ("_id", ASCENDING)], name=f"{date_field}_id"),
+        # ...or over (patient_id, _id) / (name, _id) when sorted by patient
+        IndexModel([("patient_id", ASCENDING), ("_id", ASCENDING)], name="patient_id_id"),
+        IndexModel([("name", ASCENDING), ("_id", ASCENDING)], name="name_id"),
+        IndexModel([("doctor", ASCENDING), (date_field, ASCENDING), ("_id", ASCENDING)],
+                   name=f"doctor_{date_field}_id"),
+        IndexModel([(test_field, ASCENDING), (date_field, ASCENDING), ("_id", ASCENDING)],
+                   name=f"{test_field}_{date_field}_id"),
+        IndexModel([("result", TEXT)], name="result_text"),
+        IndexModel([(category_field, ASCENDING), ("patient_id", ASCENDING)], name=f"{category_field}_patient_id"),
+    ]
+
+# How long a DocAssist answer is reused (in process and in the answer_cache collection)
+ANSWER_CACHE_TTL = 6 * 3600
+
+# Every index the app relies on. ensure_indexes() creates these at startup, replaces
+# any index of the same name that differs and drops the ones this module used to
+# create (RETIRED_INDEXES). Other indexes — added by an operator, say — are only
+# dropped when DROP_UNDECLARED_INDEXES=1.
+DROP_UNDECLARED_INDEXES = os.environ.get("DROP_UNDECLARED_INDEXES", "0") == "1"
+INDEXES = {
+    "profiles": [
+        IndexModel([("patient_id", ASCENDING)], name="patient_id_unique", unique=True),
+        IndexModel([("name_tokens", ASCENDING)], name="name_tokens"),
+        # Cohort filters: each field, narrowed by age band
+        IndexModel([("scenario", ASCENDING), ("age", ASCENDING)], name="scenario_age"),
+        IndexModel([("gender", ASCENDING), ("age", ASCENDING)], name="gender_age"),
+        IndexModel([("blood_group", ASCENDING), ("age", ASCENDING)], name="blood_group_age"),
+        IndexModel([("age", ASCENDING)], name="age"),
+    ],
+    **{coll: department_indexes(coll) for coll in DEPARTMENT_DATE_FIELDS},
+    "patient_timelines": [
+        IndexModel([("patient_id", ASCENDING)], name="patient_id_unique", unique=True),
+        # Startup check for events from before events carried a category
+        IndexModel([("events.category", ASCENDING)], name="events_category"),
+    ],
+    "answer_cache": [IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=ANSWER_CACHE_TTL)],
+    # Unfinished jobs, and the sweep's claim of those whose lease has lapsed
+    "cohort_jobs": [IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until")],
+    "cohort_job_results": [
+        IndexModel([("job_id", ASCENDING), ("patient_id", ASCENDING)], name="job_id_patient_id", unique=True),
+    ],
+}
+RETIRED_INDEXES = {"cohort_jobs": {"status"}}
+
+def index_matches(spec, info):
+    """Whether an existing index (index_information() entry) is the declared one"""
+    key = list(spec["key"].items())
+    text_fields = {field for field, direction in key if direction == TEXT}
+    if text_fields:
+        # Text indexes are reported as an _fts/_ftsx pair, with the fields in `weights`
+        key = [(f, d) for f, d in key if d != TEXT] + [("_fts", "text"), ("_ftsx", 1)]
+        if set(info.get("weights", {})) != text_fields:
+            return False
+    return (key == list(info["key"]) and spec.get("unique", False) == info.get("unique", False)
+            and spec.get("expireAfterSeconds") == info.get("expireAfterSeconds"))
+
+async def ensure_indexes():
+    """Reconcile each collection's indexes with INDEXES (never touches `_id_`)"""
+    for coll, models in INDEXES.items():
+        declared = {m.document["name"]: m.document for m in models}
+        existing = await db[coll].index_information()
+        for name, info in existing.items():
+            if name == "_id_":
+                continue
+            spec = declared.get(name)
+            if spec is None and not (DROP_UNDECLARED_INDEXES or name in RETIRED_INDEXES.get(coll, ())):
+                continue
+            if spec is None or not index_matches(spec, info):
+                logger.info(f"Dropping stale index {coll}.{name}")
+                await db[coll].drop_index(name)
+        try:
+            await db[coll].create_indexes(models)
+        except OperationFailure as e:
+            # e.g. duplicate patient_ids left over from an old double seed — keep serving
+            logger.error(f"Could not create indexes on {coll}: {e}")
+
+# Representative shape of every query this module issues, so /api/indexes can show
+# which index the planner actually picks for each one
+QUERY_SHAPES = [
+    ("profile by patient_id", "profiles", {"patient_id": "P1001"}, None),
+    ("profile name search", "profiles",
+     {"$and": [{"name_tokens": {"$regex": "^smi"}}, {"name_tokens": {"$regex": "^j"}}]},
+     [("patient_id", ASCENDING)]),
+    ("suggest by patient_id prefix", "profiles", {"patient_id": {"$regex": "^P10"}}, None),
+    ("patient list", "profiles", {}, None),
+    ("timeline by patient_id", "patient_timelines", {"patient_id": "P1001"}, None),
+    ("cohort filter by scenario and age band", "profiles",
+     {"scenario": "lymphoma", "age": {"$gte": 40, "$lt": 60}}, None),
+    ("cohort filter by gender", "profiles", {"gender": "Female"}, None),
+    ("cohort filter by blood group", "profiles", {"blood_group": "O+"}, None),
+    ("cohort filter by age band", "profiles", {"age": {"$gte": 60}}, None),
+    ("profiles missing name_tokens", "profiles", {"name_tokens": {"$exists": False}}, None),
+    ("timelines with uncategorized events", "patient_timelines",
+     {"events": {"$elemMatch": {"category": {"$exists": False}}}}, None),
+    ("unfinished cohort jobs", "cohort_jobs", {"status": {"$in": ["queued", "running"]}}, None),
+    ("claim lapsed cohort jobs", "cohort_jobs",
+     {"_id": {"$nin": []}, "status": {"$in": ["queued", "running"]},
+      "$or": [{"lease_until": None}, {"lease_until": {"$lt": datetime(2000, 1, 1, tzinfo=timezone.utc)}}]}, None),
+    ("renew cohort job lease", "cohort_jobs",
+     {"_id": "0" * 32, "owner": "0" * 32, "status": {"$in": ["queued", "running"]}}, None),
+    ("cohort job results", "cohort_job_results", {"job_id": "0" * 32}, [("patient_id", ASCENDING)]),
+    *[(f"{coll} by patient_id", coll, {"patient_id": "P1001"}, [(date_field, ASCENDING)])
+      for coll, date_field in DEPARTMENT_DATE_FIELDS.items()],
+    *[(f"{coll} missing {field}", coll, {field: {"$exists": False}}, None)
+      for coll, field in DEPARTMENT_CATEGORY_FIELDS.items()],
+    *[(f"{coll} department listing", coll, {}, [(date_field, ASCENDING), ("_id", ASCENDING)])
+      for coll, date_field in DEPARTMENT_DATE_FIELDS.items()],
+    *[(f"{coll} department listing by {field}", coll, {}, [(field, DESCENDING), ("_id", DESCENDING)])
+      for coll in DEPARTMENT_DATE_FIELDS for field in ("patient_id", "name")],
+    *[(f"{coll} department listing by doctor", coll, {"doctor": "Dr. Patel"},
+       [(date_field, DESCENDING), ("_id", DESCENDING)])
+      for coll, date_field in DEPARTMENT_DATE_FIELDS.items()],
+    *[(f"{coll} department listing by test", coll, {DEPARTMENT_TEST_FIELDS[coll]: "Chest CT Scan"},
+       [(date_field, ASCENDING), ("_id", ASCENDING)])
+      for coll, date_field in DEPARTMENT_DATE_FIELDS.items()],
+    *[(f"{coll} department listing by result text", coll, {"$text": {"$search": "neutropenia"}},
+       [(date_field, ASCENDING), ("_id", ASCENDING)])
+      for coll, date_field in DEPARTMENT_DATE_FIELDS.items()],
+]
+
+def plan_indexes(stage):
+    """Index names (or COLLSCAN) used anywhere in an explain() plan tree"""
+    used = []
+    if stage.get("stage") == "COLLSCAN":
+        used.append("COLLSCAN")
+    if "indexName" in stage:
+        used.append(stage["indexName"])
+    for child in [stage.get("inputStage"), *stage.get("inputStages", [])]:
+        if child:
+            used.extend(plan_indexes(child))
+    return used
+
+async def index_usage_report():
+    """Explain every entry in QUERY_SHAPES against the live collections"""
+    report = []
+    for description, coll, query_filter, sort in QUERY_SHAPES:
+        find = {"find": coll, "filter": query_filter}
+        if sort:
+            find["sort"] = dict(sort)
+        explained = await db.command("explain", find, verbosity="queryPlanner")
+        winning = explained["queryPlanner"]["winningPlan"]
+        # SBE plans (MongoDB 7+) nest the classic plan tree under "queryPlan"
+        winning = winning.get("queryPlan", winning)
+        report.append({"query": description, "collection": coll, "indexes": plan_indexes(winning)})
+    return report
+
+# Profiles carry search- and cohort-only fields that API responses shouldn't expose
+PROFILE_PROJECTION = {"_id": 0, "name_tokens": 0, "scenario": 0}
+
+PATIENT_ID_PATTERN = re.compile(r"P\d+", re.IGNORECASE)
+
+def name_tokens(text):
+    """Lowercase, accent-free word tokens — 'José O'Neil' -> ['jose', 'oneil']"""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return re.findall(r"[a-z0-9]+", text.lower().replace("'", ""))
+
+def name_search_filter(term):
+    """Profiles whose name has a token starting with each word of `term`, in any
+    order. Anchored prefix regexes on the multikey name_tokens index are range
+    scans, unlike the old unanchored case-insensitive regex on `name`."""
+    tokens = name_tokens(term)
+    if not tokens:
+        return None
+    return {"$and": [{"name_tokens": {"$regex": f"^{re.escape(tok)}"}} for tok in tokens]}
+
+async def backfill_name_tokens():
+    """Add name_tokens to profiles stored before name search existed"""
+    cursor = db.profiles.find({"name_tokens": {"$exists": False}}, {"name": 1})
+    updates = [UpdateOne({"_id": p["_id"]}, {"$set": {"name_tokens": name_tokens(p["name"])}})
+               async for p in cursor]
+    if updates:
+        await db.profiles.bulk_write(updates)
+        logger.info(f"Backfilled name_tokens on {len(updates)} profiles")
+
+@dataclasses.dataclass
+class PatientRecords:
+    """Result of fetch_patient_records() — one list per department collection,
+    each ascending by its date field, plus the matching profile when requested"""
+    profile: Optional[dict] = None
+    mri_records: List[dict] = dataclasses.field(default_factory=list)
+    xray_records: List[dict] = dataclasses.field(default_factory=list)
+    ecg_records: List[dict] = dataclasses.field(default_factory=list)
+    treatment_records: List[dict] = dataclasses.field(default_factory=list)
+    blood_profile_records: List[dict] = dataclasses.field(default_factory=list)
+    ct_scan_records: List[dict] = dataclasses.field(default_factory=list)
+
+    def to_dict(self):
+        return {f.name: getattr(self, f.name) for f in dataclasses.fields(self)}
+
+async def fetch_patient_records(query, collections=tuple(DEPARTMENT_DATE_FIELDS), with_profile=False):
+    """Run one query against the given department collections (and profiles)
+    concurrently, so a lookup costs the slowest round trip rather than the sum"""
+    async def fetch(coll):
+        cursor = db[coll].find(query, {"_id": 0}).sort(DEPARTMENT_DATE_FIELDS[coll], ASCENDING)
+        return await cursor.to_list(1000)
+
+    async def fetch_profile():
+        return await db.profiles.find_one(query, PROFILE_PROJECTION) if with_profile else None
+
+    profile, *department_records = await asyncio.gather(fetch_profile(), *(fetch(c) for c in collections))
+    return PatientRecords(profile=profile, **dict(zip(collections, department_records)))
+
+# Read-through cache for /search and /analytics. Keys include data_version, which every
+# write path bumps, so nothing cached before a write is served after it. Both live in
+# this process only — fine for the single uvicorn worker this app runs as.
+response_cache = TTLCache(maxsize=1024, ttl=300)
+data_version = 0
+
+def new_rev():
+    return uuid.uuid4().hex[:16]
+
+async def bump_data_version(*collections):
+    """Call after every write. Besides the in-process data_version, stamps a fresh rev
+    on each written collection in `data_versions` — those revs (and each timeline's
+    own rev) are what ETags are built from, so they survive restarts."""
+    global data_version
+    data_version += 1
+    rev = new_rev()
+    await db.data_versions.bulk_write(
+        [UpdateOne({"_id": coll}, {"$set": {"rev": rev}}, upsert=True) for coll in collections]
+    )
+
+async def collection_revs(*collections):
+    docs = await db.data_versions.find({"_id": {"$in": list(collections)}}).to_list(None)
+    revs = {d["_id"]: d["rev"] for d in docs}
+    return [revs.get(coll, "") for coll in collections]
+
+def make_etag(*parts):
+    """Strong ETag over everything a response depends on"""
+    return '"' + hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:24] + '"'
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+def cache_headers(etag):
+    return {
+        "ETag": etag,
+        # Let browsers keep the body but revalidate on every use
+        "Cache-Control": "no-cache",
+        "Vary": "Accept, Accept-Encoding"
+    }
+
+def not_modified(etag):
+    return Response(status_code=304, headers=cache_headers(etag))
+
+# Record endpoints serialize with orjson — or MessagePack for clients that Accept it —
+# and compress bodies at least this big
+COMPRESS_MIN_BYTES = 1024
+
+def negotiate(request):
+    """(format, content-encoding) this client gets — brotli preferred over gzip"""
+    fmt = "msgpack" if "application/msgpack" in request.headers.get("accept", "") else "json"
+    accepted = {e.split(";")[0].strip() for e in request.headers.get("accept-encoding", "").split(",")}
+    encoding = "br" if "br" in accepted else "gzip" if "gzip" in accepted else "identity"
+    return fmt, encoding
+
+def representation_etag(etag, representation):
+    """Strong ETags identify exact bytes, so each format/encoding gets its own"""
+    return f'{etag[:-1]}-{"-".join(representation)}"'
+
+def render(body, representation, etag):
+    """Encode a record endpoint's body directly, bypassing FastAPI's jsonable_encoder"""
+    fmt, encoding = representation
+    if fmt == "msgpack":
+        content, media_type = msgpack.packb(body), "application/msgpack"
+    else:
+        content, media_type = orjson.dumps(body), "application/json"
+    headers = cache_headers(etag)
+    if encoding != "identity" and len(content) >= COMPRESS_MIN_BYTES:
+        content = brotli.compress(content, quality=4) if encoding == "br" else gzip.compress(content, 6)
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type=media_type, headers=headers)
+
+def timeline_event(coll, record):
+    """A department record as one patient_timelines event"""
+    return {
+        "date": record[DEPARTMENT_DATE_FIELDS[coll]],
+        "type": DEPARTMENT_LABELS[coll],
+        "test": record[DEPARTMENT_TEST_FIELDS[coll]],
+        "result": record.get("result", ""),
+        "category": record[DEPARTMENT_CATEGORY_FIELDS[coll]]
+    }
+
+def timeline_rebuild_pipeline():
+    """Aggregation over mri_records that $unionWith's the other departments and
+    writes one patient_timelines document per patient — events merged and sorted
+    by date, plus a record count per department — without leaving Mongo"""
+    def events(coll, order):
+        return [{"$project": {
+            "_id": 0,
+            "patient_id": 1,
+            "order": {"$literal": order},
+            "date": f"${DEPARTMENT_DATE_FIELDS[coll]}",
+            "type": {"$literal": DEPARTMENT_LABELS[coll]},
+            "test": f"${DEPARTMENT_TEST_FIELDS[coll]}",
+            "result": {"$ifNull": ["$result", ""]},
+            "category": f"${DEPARTMENT_CATEGORY_FIELDS[coll]}"
+        }}]
+
+    first, *rest = DEPARTMENT_DATE_FIELDS
+    counts = [
+        {"k": label, "v": {"$size": {"$filter": {
+            "input": "$events", "as": "event", "cond": {"$eq": ["$$event.type", label]}
+        }}}}
+        for label in DEPARTMENT_LABELS.values()
+    ]
+    return [
+        *events(first, 0),
+        *({"$unionWith": {"coll": coll, "pipeline": events(coll, order)}} for order, coll in enumerate(rest, 1)),
+        # Department order breaks same-day ties the way build-by-collection did
+        {"$sort": {"patient_id": 1, "date": 1, "order": 1}},
+        {"$group": {
+            "_id": "$patient_id",
+            "events": {"$push": {
+                "date": "$date", "type": "$type", "test": "$test", "result": "$result", "category": "$category"
+            }}
+        }},
+        {"$project": {
+            "_id": 0,
+            "patient_id": "$_id",
+            "events": 1,
+            "counts": {"$arrayToObject": {"$filter": {"input": counts, "cond": {"$gt": ["$$this.v", 0]}}}},
+            "rev": {"$literal": new_rev()}
+        }},
+        {"$out": "patient_timelines"}
+    ]
+
+async def rebuild_timelines():
+    """Recreate patient_timelines from scratch out of the department collections"""
+    first = next(iter(DEPARTMENT_DATE_FIELDS))
+    await db[first].aggregate(timeline_rebuild_pipeline(), allowDiskUse=True).to_list(None)
+    logger.info(f"Rebuilt {await db.patient_timelines.count_documents({})} patient timelines")
+
+async def rebuild_patient_timeline(patient_id):
+    """Recreate one patient's timeline from all of their department records"""
+    events = []
+    for coll, date_field in DEPARTMENT_DATE_FIELDS.items():
+        # The whole cursor — fetch_patient_records stops at 1000 records per department
+        async for record in db[coll].find({"patient_id": patient_id}, {"_id": 0}).sort(date_field, ASCENDING):
+            events.append(timeline_event(coll, record))
+    # Stable sort: department order breaks same-day ties, as in the full rebuild
+    events.sort(key=lambda event: event["date"])
+    await db.patient_timelines.replace_one(
+        {"patient_id": patient_id},
+        {"patient_id": patient_id, "events": events, "counts": dict(Counter(e["type"] for e in events)),
+         "rev": new_rev()},
+        upsert=True
+    )
+
+async def add_department_record(coll, record):
+    """Classify and store one new department record and fold it into the patient's
+    timeline in place — the timeline is only rebuilt if that update fails. Returns
+    (the new record's id, the record as stored)."""
+    record = {**record, DEPARTMENT_CATEGORY_FIELDS[coll]: classify_result(coll, record.get("result", ""))}
+    inserted = await db[coll].insert_one(dict(record))
+    try:
+        await db.patient_timelines.update_one(
+            {"patient_id": record["patient_id"]},
+            {
+                "$push": {"events": {"$each": [timeline_event(coll, record)], "$sort": {"date": 1}}},
+                "$inc": {f"counts.{DEPARTMENT_LABELS[coll]}": 1},
+                "$set": {"rev": new_rev()}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        logger.error(f"Timeline update for {record['patient_id']} failed, rebuilding it: {e}")
+        await rebuild_patient_timeline(record["patient_id"])
+    finally:
+        await bump_data_version(coll)
+    return str(inserted.inserted_id), record
+
+async def backfill_result_classification():
+    """Store result_category / treatment_status on records ingested before results
+    were classified; returns how many records were updated"""
+    updated = 0
+    for coll, field in DEPARTMENT_CATEGORY_FIELDS.items():
+        batch = []
+        async for record in db[coll].find({field: {"$exists": False}}, {"result": 1}):
+            batch.append(UpdateOne({"_id": record["_id"]}, {"$set": {field: classify_result(coll, record.get("result", ""))}}))
+            if len(batch) == 1000:
+                await db[coll].bulk_write(batch)
+                updated, batch = updated + len(batch), []
+        if batch:
+            await db[coll].bulk_write(batch)
+            updated += len(batch)
+    if updated:
+        logger.info(f"Backfilled result classification on {updated} records")
+        await bump_data_version(*DEPARTMENT_CATEGORY_FIELDS)
+    return updated
+
+def events_in_category(events, category):
+    """$size of the events classified as category at ingest"""
+    return {"$size": {"$filter": {"input": events, "cond": {"$eq": ["$$this.category", category]}}}}
+
+def department_count(label):
+    return {"$ifNull": [{"$getField": {"field": label, "input": "$counts"}}, 0]}
+
+TEST_EVENTS = {"$filter": {"input": "$events", "cond": {"$ne": ["$$this.type", "Treatment"]}}}
+# patient_timelines document -> /analytics response, computed inside Mongo so only the
+# summary crosses the wire. Treatment status and health trend count each event's
+# category, classified once at ingest.
+ANALYTICS_STAGES = [
+    {"$set": {
+        "treatments": {"$filter": {"input": "$events", "cond": {"$eq": ["$$this.type", "Treatment"]}}},
+        "tests": TEST_EVENTS,
+        "visit_timeline": {"$map": {
+            "input": "$events", "in": {"date": "$$this.date", "type": "$$this.type", "test": "$$this.test"}
+        }}
+    }},
+    {"$set": {"normal": events_in_category("$tests", "normal")}},
+    {"$set": {"abnormal": {"$subtract": [{"$size": "$tests"}, "$normal"]}}},
+    {"$project": {
+        "_id": 0,
+        "patient_id": 1,
+        "rev": 1,
+        "total_visits": {"$size": "$visit_timeline"},
+        "total_tests": {"$add": [department_count(label) for label in DEPARTMENT_LABELS.values() if label != "Treatment"]},
+        "departments_visited": {label: department_count(label) for label in DEPARTMENT_LABELS.values()},
+        "visit_timeline": 1,
+        "treatment_summary": {
+            "total": {"$size": "$treatments"},
+            "completed": events_in_category("$treatments", "completed"),
+            "in_progress": events_in_category("$treatments", "in_progress"),
+            "scheduled": events_in_category("$treatments", "scheduled")
+        },
+        "health_trend": {"$switch": {
+            "branches": [
+                {"case": {"$gt": ["$normal", {"$multiply": ["$abnormal", 2]}]}, "then": "Excellent"},
+                {"case": {"$gt": ["$normal", "$abnormal"]}, "then": "Good"},
+                {"case": {"$eq": ["$normal", "$abnormal"]}, "then": "Stable"}
+            ],
+            "default": "Needs Attention"
+        }},
+        "recent_results": {"$slice": ["$visit_timeline", -5]}
+    }}
+]
+
+# patient_timelines document -> one row of the cohort frames: the health trend inputs
+# plus each event's department and month
+COHORT_TIMELINE_STAGES = [
+    {"$project": {
+        "_id": 0,
+        "patient_id": 1,
+        "visits": {"$size": "$events"},
+        "tests": {"$size": TEST_EVENTS},
+        "normal": events_in_category(TEST_EVENTS, "normal"),
+        "types": "$events.type",
+        "months": {"$map": {"input": "$events.date", "in": {"$substrCP": ["$$this", 0, 7]}}}
+    }}
+]
+
+# /analytics for a patient with no records
+EMPTY_ANALYTICS = {
+    "total_visits": 0,
+    "total_tests": 0,
+    "departments_visited": {label: 0 for label in DEPARTMENT_LABELS.values()},
+    "visit_timeline": [],
+    "treatment_summary": {"total": 0, "completed": 0, "in_progress": 0, "scheduled": 0},
+    "health_trend": "Stable",
+    "recent_results": []
+}
+
 # Gemini LLM client (used by /deep-query and /analyze-document)
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 GEMINI_MODEL = "gemini-3-flash-preview"
 gemini_client = genai.Client(api_key=GEMINI_API_KEY) if GEMINI_API_KEY else None
+# Upper bound on the estimated tokens of patient records in a DocAssist prompt
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "8000"))
+
+# Every Gemini call goes through one adaptive layer: a concurrency cap, backoff with
+# jitter on 503/429 (honoring the API's retry delay) and a circuit breaker, so a burst
+# of requests during a free-tier overload neither retries in lockstep nor piles up
+gemini_llm = AdaptiveLLM(max_concurrency=int(os.environ.get("GEMINI_MAX_CONCURRENCY", "4")))
+OVERLOADED_DETAIL = "The AI is temporarily overloaded. Please try again in a moment."
+
+def overloaded(error):
+    """The 503 clients see once retries are exhausted, the breaker is open or the API
+    asked for a longer wait than we retry within — with that wait as Retry-After"""
+    retry_after = error.retry_after if isinstance(error, CircuitOpenError) else retry_hint(error)
+    headers = {"Retry-After": str(max(int(retry_after), 1))} if retry_after else None
+    return HTTPException(status_code=503, detail=OVERLOADED_DETAIL, headers=headers)
 
 async def generate_content_with_retry(**kwargs):
-    """Gemini's free tier occasionally returns 503 'high demand' — one retry
-    resolves it almost every time (observed repeatedly in testing)."""
+    """gemini generate_content through gemini_llm; overloads surface as a 503"""
     try:
-        return await gemini_client.aio.models.generate_content(**kwargs)
-    except genai_errors.ServerError:
-        await asyncio.sleep(1)
-        try:
-            return await gemini_client.aio.models.generate_content(**kwargs)
-        except genai_errors.ServerError:
-            raise HTTPException(
-                status_code=503,
-                detail="The AI is temporarily overloaded. Please try again in a moment."
-            )
+        return await gemini_llm.call(lambda: gemini_client.aio.models.generate_content(**kwargs))
+    except Exception as e:
+        if isinstance(e, CircuitOpenError) or is_retryable(e):
+            raise overloaded(e)
+        raise
+
+# Clinicians looking at the same patient often ask the same question within moments;
+# identical DocAssist requests in flight share one Gemini call
+gemini_flights = SingleFlight()
+
+def llm_request_key(model, system_instruction, prompt):
+    return hashlib.sha256(f"{model}\0{system_instruction}\0{prompt}".encode()).hexdigest()
+
+async def generate_content_coalesced(model, system_instruction, prompt):
+    """generate_content_with_retry for a text prompt, shared with identical requests in flight"""
+    return await gemini_flights.do(
+        llm_request_key(model, system_instruction, prompt),
+        lambda: generate_content_with_retry(
+            model=model,
+            contents=prompt,
+            config=genai_types.GenerateContentConfig(system_instruction=system_instruction),
+        )
+    )
+
+async def stream_content_with_retry(**kwargs):
+    """generate_content_stream through gemini_llm — retried only before the first chunk,
+    since text already sent to the client can't be taken back"""
+    try:
+        async for chunk in gemini_llm.stream(lambda: gemini_client.aio.models.generate_content_stream(**kwargs)):
+            yield chunk
+    except Exception as e:
+        if isinstance(e, CircuitOpenError) or is_retryable(e):
+            raise overloaded(e)
+        raise
+
+# Identical streamed requests in flight share one Gemini stream too; a request that
+# joins late gets the text so far replayed
+gemini_stream_flights = StreamFlight()
+
+def stream_content_coalesced(model, system_instruction, prompt):
+    """stream_content_with_retry for a text prompt, shared with identical streams in flight"""
+    return gemini_stream_flights.stream(
+        llm_request_key(model, system_instruction, prompt),
+        lambda: stream_content_with_retry(
+            model=model,
+            contents=prompt,
+            config=genai_types.GenerateContentConfig(system_instruction=system_instruction),
+        )
+    )
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -159,9 +748,17 @@ class PatientAnalytics(BaseModel):
     health_trend: str
     recent_results: List[dict]
 
+class AnalyticsBatchRequest(BaseModel):
+    patient_ids: List[str] = Field(min_length=1, max_length=200)
+
 class DeepQueryRequest(BaseModel):
     patient_id: str
     question: str
+    # Continue a DocAssist conversation (POST /docassist/sessions) instead of asking cold
+    session_id: Optional[str] = None
+
+class SessionRequest(BaseModel):
+    patient_id: str
 
 class DeepQueryResponse(BaseModel):
     answer: str
@@ -171,17 +768,58 @@ class DeepQueryResponse(BaseModel):
 class TTSRequest(BaseModel):
     text: str
 
-@api_router.post("/tts")
-async def text_to_speech(request: TTSRequest):
-    """Server-side text-to-speech — sidesteps flaky browser SpeechSynthesis engines"""
-    clean_text = re.sub(r'\*\*(.*?)\*\*', r'\1', request.text)
+def gtts_mp3(text):
+    buffer = io.BytesIO()
+    gTTS(text=text, lang='en').write_to_fp(buffer)
+    return buffer.getvalue()
+
+# gTTS blocks for a network round trip per call, so it runs on a few threads of its
+# own; audio is kept by a hash of the cleaned text, so replaying an answer is free.
+# The audio files, which speak patient data, are in backend/tts_cache/ (gitignored);
+# SpeechCache deletes the oldest past its file count and size limits.
+speech = SpeechCache(gtts_mp3, ROOT_DIR / "tts_cache", max_workers=int(os.environ.get("TTS_CONCURRENCY", "4")))
+
+def speech_text(text):
+    """Text with markdown stripped, so symbols like ** and # aren't read aloud"""
+    clean_text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
     clean_text = re.sub(r'[*#_`]', '', clean_text).strip()
     if not clean_text:
         raise HTTPException(status_code=400, detail="No text to speak")
+    return clean_text
 
-    buffer = io.BytesIO()
-    gTTS(text=clean_text, lang='en').write_to_fp(buffer)
-    return Response(content=buffer.getvalue(), media_type="audio/mpeg")
+@api_router.post("/tts")
+async def text_to_speech(request: TTSRequest):
+    """Server-side text-to-speech — sidesteps flaky browser SpeechSynthesis engines"""
+    return Response(content=await speech.speak(speech_text(request.text)), media_type="audio/mpeg")
+
+@api_router.post("/tts/stream")
+async def text_to_speech_stream(request: TTSRequest):
+    """/tts as a chunked MP3 stream: the text is synthesized sentence by sentence, up
+    to TTS_CONCURRENCY at once, and each sentence's audio is sent, in order, as soon as
+    it's ready — so playback starts after the first sentence, not the whole answer"""
+    chunks = speech.speak_sentences(split_sentences(speech_text(request.text)))
+    try:
+        first = await anext(chunks)  # fail with a status code, not a truncated stream
+    except Exception as e:
+        await chunks.aclose()
+        logger.error(f"TTS stream error: {str(e)}")
+        raise HTTPException(status_code=502, detail="Speech synthesis failed")
+
+    async def audio():
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            logger.error(f"TTS stream error: {str(e)}")
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(
+        audio(),
+        media_type="audio/mpeg",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 from data.seed import build_seed_data
 
@@ -199,14 +837,24 @@ async def populate_sample_data():
     await db.treatment_records.delete_many({})
     await db.blood_profile_records.delete_many({})
     await db.ct_scan_records.delete_many({})
+    await db.patient_timelines.delete_many({})
+    await db.answer_cache.delete_many({})
+    answer_cache.clear()
+    cohort_answer_cache.clear()
+    retrieval_indexes.clear()
+    prefetched.clear()
 
     seed_data = build_seed_data(extra_count=488)
+    for profile in seed_data["profiles"]:
+        profile["name_tokens"] = name_tokens(profile["name"])
 
     await db.profiles.insert_many(seed_data["profiles"])
     for coll_name in ["mri_records", "xray_records", "ecg_records",
                        "blood_profile_records", "ct_scan_records", "treatment_records"]:
         if seed_data[coll_name]:
             await db[coll_name].insert_many(seed_data[coll_name])
+    await rebuild_timelines()
+    await bump_data_version("profiles", *DEPARTMENT_DATE_FIELDS)
 
     return {"message": "Sample data populated successfully", "patients_created": len(seed_data["profiles"])}
 
@@ -257,261 +905,487 @@ async def clear_data():
     await db.treatment_records.delete_many({})
     await db.blood_profile_records.delete_many({})
     await db.ct_scan_records.delete_many({})
+    await db.patient_timelines.delete_many({})
+    await db.answer_cache.delete_many({})
+    answer_cache.clear()
+    cohort_answer_cache.clear()
+    retrieval_indexes.clear()
+    prefetched.clear()
+    await bump_data_version("profiles", *DEPARTMENT_DATE_FIELDS)
     return {"message": "All data cleared successfully"}
 
+# Profile fields shown for each search candidate
+CANDIDATE_PROJECTION = {"_id": 0, "patient_id": 1, "name": 1, "age": 1, "gender": 1}
+
+async def resolve_search_candidates(term, page, page_size):
+    """Phase 1 of search: (total matches, one page of candidate profiles) — profiles only"""
+    if PATIENT_ID_PATTERN.fullmatch(term):
+        # Patient IDs skip name search entirely — one lookup on the unique index
+        candidate = await db.profiles.find_one({"patient_id": term.upper()}, CANDIDATE_PROJECTION)
+        if not candidate:
+            return 0, []
+        return 1, [candidate] if page == 1 else []
+
+    name_filter = name_search_filter(term)
+    if not name_filter:
+        return 0, []
+    total, candidates = await asyncio.gather(
+        db.profiles.count_documents(name_filter),
+        db.profiles.find(name_filter, CANDIDATE_PROJECTION)
+            .sort("patient_id", ASCENDING).skip((page - 1) * page_size).limit(page_size).to_list(page_size)
+    )
+    return total, candidates
+
+# Speculative warm-up: a search that resolves to one patient is nearly always followed
+# by DocAssist or analytics for them. Build their retrieval index from the records the
+# search already fetched and precompute analytics in the background, so those calls
+# start warm — whether the search itself was served from the response cache or not.
+# At most PREFETCH_CONCURRENCY run at once; past that, warm-ups are skipped rather
+# than queued. A finished warm-up counts as used when a DocAssist or analytics call
+# for the patient follows within PREFETCH_TTL seconds, even one answered from cache.
+PREFETCH_CONCURRENCY = int(os.environ.get("PREFETCH_CONCURRENCY", "4"))
+PREFETCH_TTL = 300
+# patient_id -> rev, for warm-ups that completed
+prefetched = TTLCache(maxsize=1024, ttl=PREFETCH_TTL)
+prefetch_counts = {"started": 0, "skipped": 0, "used": 0}
+prefetch_tasks = set()
+
+async def warm_patient(records, rev):
+    patient_id = records.profile["patient_id"]
+    try:
+        entry = await asyncio.to_thread(index_records, records)
+        retrieval_indexes.set((patient_id, rev), (records.profile, *entry))
+        await load_patient_analytics([patient_id])
+        prefetched.set(patient_id, rev)
+    except Exception as e:
+        logger.warning(f"Prefetch for {patient_id} failed: {e}")
+
+def schedule_prefetch(records, rev):
+    if len(prefetch_tasks) >= PREFETCH_CONCURRENCY:
+        prefetch_counts["skipped"] += 1
+        return
+    prefetch_counts["started"] += 1
+    task = asyncio.create_task(warm_patient(records, rev))
+    prefetch_tasks.add(task)  # keep a reference until it finishes
+    task.add_done_callback(prefetch_tasks.discard)
+
+def note_prefetch_use(patient_id):
+    if prefetched.pop(patient_id) is not None:
+        prefetch_counts["used"] += 1
+
+def prefetch_stats():
+    started = prefetch_counts["started"]
+    return {**prefetch_counts, "concurrency": PREFETCH_CONCURRENCY, "in_flight": len(prefetch_tasks),
+            "hit_rate": round(prefetch_counts["used"] / started, 3) if started else 0.0}
+
 @api_router.get("/search")
-async def search_patient(term: str = Query(..., description="Patient ID or Name to search")):
+async def search_patient(
+    request: Request,
+    term: str = Query(..., description="Patient ID or Name to search"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    if_none_match: Optional[str] = Header(None)
+):
     """Search patient records across all departments
     
     Args:
-        term: Patient ID (e.g., P1001) or Name (partial match supported)
+        term: Patient ID (e.g., P1001) or Name (word prefixes, e.g. "jam mit")
+        page, page_size: Which page of matching patients to list in `candidates`
     
     Returns:
-        Unified patient data from all departments sorted by date
+        The matching patients, plus the profile and all department records (sorted
+        by date) of the first candidate on the page. Records are only ever fetched
+        for that one patient_id, so an ambiguous name can't fan out to thousands.
+        Conditional: 304 when If-None-Match still matches.
     """
-    
-    # Create search query for patient_id exact match or name partial match (case-insensitive)
-    query = {
-        "$or": [
-            {"patient_id": term},
-            {"name": {"$regex": term, "$options": "i"}}
-        ]
-    }
-    
-    # Search profile
-    profile = await db.profiles.find_one(query, {"_id": 0})
-    
-    # Search all department records
-    mri_records = await db.mri_records.find(query, {"_id": 0}).to_list(1000)
-    xray_records = await db.xray_records.find(query, {"_id": 0}).to_list(1000)
-    ecg_records = await db.ecg_records.find(query, {"_id": 0}).to_list(1000)
-    treatment_records = await db.treatment_records.find(query, {"_id": 0}).to_list(1000)
-    blood_profile_records = await db.blood_profile_records.find(query, {"_id": 0}).to_list(1000)
-    ct_scan_records = await db.ct_scan_records.find(query, {"_id": 0}).to_list(1000)
-    
-    # Sort records by date (ascending)
-    mri_records = sorted(mri_records, key=lambda x: x.get("test_date", ""))
-    xray_records = sorted(xray_records, key=lambda x: x.get("test_date", ""))
-    ecg_records = sorted(ecg_records, key=lambda x: x.get("test_date", ""))
-    treatment_records = sorted(treatment_records, key=lambda x: x.get("treatment_date", ""))
-    blood_profile_records = sorted(blood_profile_records, key=lambda x: x.get("test_date", ""))
-    ct_scan_records = sorted(ct_scan_records, key=lambda x: x.get("test_date", ""))
-    
-    return {
-        "profile": profile,
-        "mri_records": mri_records,
-        "xray_records": xray_records,
-        "ecg_records": ecg_records,
-        "treatment_records": treatment_records,
-        "blood_profile_records": blood_profile_records,
-        "ct_scan_records": ct_scan_records
-    }
+    term = term.strip()
+    normalized = term.upper() if PATIENT_ID_PATTERN.fullmatch(term) else " ".join(name_tokens(term))
+    representation = negotiate(request)
+    cache_key = ("search", normalized, page, page_size, data_version)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        data_etag, body, warm = cached
+        if warm and prefetched.get(warm[0].profile["patient_id"]) != warm[1]:
+            schedule_prefetch(*warm)
+        etag = representation_etag(data_etag, representation)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    else:
+        total, candidates = await resolve_search_candidates(term, page, page_size)
+        patient_id = candidates[0]["patient_id"] if candidates else None
 
-@api_router.get("/analytics/{patient_id}")
-async def get_patient_analytics(patient_id: str):
-    """Get patient analytics and statistics"""
-    
-    query = {"patient_id": patient_id}
-    
-    # Get all records
-    mri_records = await db.mri_records.find(query, {"_id": 0}).to_list(1000)
-    xray_records = await db.xray_records.find(query, {"_id": 0}).to_list(1000)
-    ecg_records = await db.ecg_records.find(query, {"_id": 0}).to_list(1000)
-    treatment_records = await db.treatment_records.find(query, {"_id": 0}).to_list(1000)
-    blood_profile_records = await db.blood_profile_records.find(query, {"_id": 0}).to_list(1000)
-    ct_scan_records = await db.ct_scan_records.find(query, {"_id": 0}).to_list(1000)
-    
-    # Calculate total tests
-    total_tests = len(mri_records) + len(xray_records) + len(ecg_records) + len(blood_profile_records) + len(ct_scan_records)
-    
-    # Department breakdown
-    departments_visited = {
-        "MRI": len(mri_records),
-        "X-Ray": len(xray_records),
-        "ECG": len(ecg_records),
-        "Blood Profile": len(blood_profile_records),
-        "CT Scan": len(ct_scan_records),
-        "Treatment": len(treatment_records)
-    }
-    
-    # Create visit timeline (all tests combined and sorted)
-    all_visits = []
-    for record in mri_records:
-        all_visits.append({"date": record["test_date"], "type": "MRI", "test": record["test_name"]})
-    for record in xray_records:
-        all_visits.append({"date": record["test_date"], "type": "X-Ray", "test": record["test_name"]})
-    for record in ecg_records:
-        all_visits.append({"date": record["test_date"], "type": "ECG", "test": record["test_name"]})
-    for record in blood_profile_records:
-        all_visits.append({"date": record["test_date"], "type": "Blood Profile", "test": record["test_name"]})
-    for record in ct_scan_records:
-        all_visits.append({"date": record["test_date"], "type": "CT Scan", "test": record["test_name"]})
-    for record in treatment_records:
-        all_visits.append({"date": record["treatment_date"], "type": "Treatment", "test": record["treatment_name"]})
-    
-    all_visits = sorted(all_visits, key=lambda x: x["date"])
-    
-    # Treatment summary
-    completed = sum(1 for r in treatment_records if "Completed" in r.get("result", "") or "Successful" in r.get("result", ""))
-    in_progress = sum(1 for r in treatment_records if "Progress" in r.get("result", ""))
-    scheduled = sum(1 for r in treatment_records if "Scheduled" in r.get("result", ""))
-    
-    treatment_summary = {
-        "total": len(treatment_records),
-        "completed": completed,
-        "in_progress": in_progress,
-        "scheduled": scheduled
-    }
-    
-    # Health trend analysis (based on recent test results)
-    normal_count = 0
-    abnormal_count = 0
-    
-    for record in mri_records + xray_records + ecg_records + blood_profile_records + ct_scan_records:
-        result = record.get("result", "").lower()
-        if "normal" in result or "clear" in result or "within range" in result:
-            normal_count += 1
+        # The candidate list depends on profiles, the records on that one patient's timeline
+        (profiles_rev,), timeline = await asyncio.gather(
+            collection_revs("profiles"),
+            db.patient_timelines.find_one({"patient_id": patient_id}, {"_id": 0, "rev": 1})
+        )
+        data_etag = make_etag("search", normalized, page, page_size, profiles_rev, patient_id,
+                              (timeline or {}).get("rev", ""))
+        etag = representation_etag(data_etag, representation)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+        warm = None
+        if patient_id:
+            records = await fetch_patient_records({"patient_id": patient_id}, with_profile=True)
+            if total == 1 and records.profile:
+                warm = (records, (timeline or {}).get("rev", ""))
+                schedule_prefetch(*warm)
         else:
-            abnormal_count += 1
-    
-    if normal_count > abnormal_count * 2:
-        health_trend = "Excellent"
-    elif normal_count > abnormal_count:
-        health_trend = "Good"
-    elif normal_count == abnormal_count:
-        health_trend = "Stable"
+            records = PatientRecords()
+        body = {
+            **records.to_dict(),
+            "candidates": candidates,
+            "total_candidates": total,
+            "page": page,
+            "page_size": page_size
+        }
+        response_cache.set(cache_key, (data_etag, body, warm))
+
+    return render(body, representation, etag)
+
+@api_router.get("/patients/suggest")
+async def suggest_patients(
+    q: str = Query(..., min_length=1, description="Partial patient ID or name"),
+    limit: int = Query(10, ge=1, le=25)
+):
+    """Typeahead — at most `limit` patients whose ID or name starts with `q`"""
+    q = q.strip()
+    # A lone "p" is as likely the start of a name as of an ID, so it's a name prefix
+    if PATIENT_ID_PATTERN.fullmatch(q):
+        query = {"patient_id": {"$regex": f"^{re.escape(q.upper())}"}}
     else:
-        health_trend = "Needs Attention"
-    
-    # Recent results (last 5)
-    recent_results = all_visits[-5:] if len(all_visits) >= 5 else all_visits
-    
-    return {
-        "total_visits": len(all_visits),
-        "total_tests": total_tests,
-        "departments_visited": departments_visited,
-        "visit_timeline": all_visits,
-        "treatment_summary": treatment_summary,
-        "health_trend": health_trend,
-        "recent_results": recent_results
-    }
+        query = name_search_filter(q)
+        if not query:
+            return {"suggestions": []}
+    suggestions = await db.profiles.find(query, {"_id": 0, "patient_id": 1, "name": 1}).limit(limit).to_list(limit)
+    return {"suggestions": suggestions}
+
+async def load_patient_analytics(patient_ids):
+    """(data_etag, analytics) per patient — from the response cache where possible,
+    the rest from one aggregation over their timelines, however many there are"""
+    version = data_version
+    results = {}
+    for pid in patient_ids:
+        cached = response_cache.get(("analytics", pid, version))
+        if cached is not None:
+            results[pid] = cached
+    missing = [pid for pid in patient_ids if pid not in results]
+    if missing:
+        docs = await db.patient_timelines.aggregate(
+            [{"$match": {"patient_id": {"$in": missing}}}, *ANALYTICS_STAGES]
+        ).to_list(None)
+        found = {doc.pop("patient_id"): doc for doc in docs}
+        for pid in missing:
+            analytics = found.get(pid) or dict(EMPTY_ANALYTICS, rev="")
+            results[pid] = (make_etag("analytics", pid, analytics.pop("rev")), analytics)
+            response_cache.set(("analytics", pid, version), results[pid])
+    return results
+
+@api_router.get("/analytics/{patient_id}")
+async def get_patient_analytics(patient_id: str, request: Request, if_none_match: Optional[str] = Header(None)):
+    """Get patient analytics and statistics — one aggregation over the materialized timeline"""
+    representation = negotiate(request)
+    note_prefetch_use(patient_id)
+    # The ETag is the timeline's rev, so a revalidation never runs the aggregation
+    etag = representation_etag(make_etag("analytics", patient_id, await patient_rev(patient_id)), representation)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    data_etag, analytics = (await load_patient_analytics([patient_id]))[patient_id]
+    return render(analytics, representation, representation_etag(data_etag, representation))
+
+@api_router.post("/analytics/batch")
+async def get_batch_analytics(batch: AnalyticsBatchRequest, request: Request):
+    """Analytics for up to 200 patients (ward dashboards) — same per-patient shape as
+    /analytics/{patient_id}, at most one Mongo round trip"""
+    representation = negotiate(request)
+    patient_ids = list(dict.fromkeys(batch.patient_ids))
+    results = await load_patient_analytics(patient_ids)
+    etag = representation_etag(make_etag("analytics-batch", *(results[pid][0] for pid in patient_ids)), representation)
+    return render({"analytics": {pid: results[pid][1] for pid in patient_ids}}, representation, etag)
+
+# Cohort frames for the current data_version — loading every patient is the slow part,
+# grouping the loaded frames is cheap
+cohort_frames = TTLCache(maxsize=1, ttl=3600)
+COHORT_PROFILE_PROJECTION = {"_id": 0, "patient_id": 1, "age": 1, "gender": 1, "blood_group": 1, "scenario": 1}
+
+async def load_cohort_frames():
+    version = data_version
+    frames = cohort_frames.get(version)
+    if frames is None:
+        profiles, timelines = await asyncio.gather(
+            db.profiles.find({}, COHORT_PROFILE_PROJECTION).to_list(None),
+            db.patient_timelines.aggregate(COHORT_TIMELINE_STAGES).to_list(None)
+        )
+        frames = await asyncio.to_thread(build_frames, profiles, timelines)
+        cohort_frames.set(version, frames)
+    return frames
+
+@api_router.get("/cohort/analytics")
+async def get_cohort_analytics(
+    request: Request,
+    group_by: str = "scenario,age_band,blood_group",
+    if_none_match: Optional[str] = Header(None)
+):
+    """Hospital-wide visit, test and health-trend statistics grouped by any of
+    scenario, age_band, blood_group and gender"""
+    fields = tuple(dict.fromkeys(f.strip() for f in group_by.split(",") if f.strip()))
+    if not fields or any(f not in GROUP_FIELDS for f in fields):
+        raise HTTPException(
+            status_code=400,
+            detail=f"group_by must be a comma-separated subset of: {', '.join(GROUP_FIELDS)}"
+        )
+
+    representation = negotiate(request)
+    revs = await collection_revs("profiles", *DEPARTMENT_DATE_FIELDS)
+    etag = representation_etag(make_etag("cohort", *fields, *revs), representation)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    cache_key = ("cohort", fields, data_version)
+    summary = response_cache.get(cache_key)
+    if summary is None:
+        patients, events = await load_cohort_frames()
+        summary = await asyncio.to_thread(cohort_summary, patients, events, fields)
+        response_cache.set(cache_key, summary)
+    return render(summary, representation, etag)
+
+# URL department names -> collection
+DEPARTMENT_ROUTES = {
+    "mri": "mri_records",
+    "xray": "xray_records",
+    "x-ray": "xray_records",
+    "ecg": "ecg_records",
+    "blood_profile": "blood_profile_records",
+    "blood-test": "blood_profile_records",
+    "ct_scan": "ct_scan_records",
+    "ct-scan": "ct_scan_records",
+    "treatment": "treatment_records"
+}
+
+DEPARTMENT_MODELS = {
+    "mri_records": MRIRecord,
+    "xray_records": XRayRecord,
+    "ecg_records": ECGRecord,
+    "blood_profile_records": BloodProfileRecord,
+    "ct_scan_records": CTScanRecord,
+    "treatment_records": TreatmentRecord,
+}
+
+def encode_cursor(value, record_id):
+    return base64.urlsafe_b64encode(json.dumps([value, str(record_id)]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        value, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return value, ObjectId(record_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @api_router.get("/department/{department_name}")
-async def get_department_records(department_name: str):
-    """Get all patient records for a specific department
+async def get_department_records(
+    department_name: str,
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    sort: str = Query("date", pattern="^(date|patient_id|name)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    date_from: Optional[str] = Query(None, description="YYYY-MM-DD, inclusive"),
+    date_to: Optional[str] = Query(None, description="YYYY-MM-DD, inclusive"),
+    doctor: Optional[str] = None,
+    test_name: Optional[str] = Query(None, description="Exact test (or treatment) name"),
+    result: Optional[str] = Query(None, description="Words to look for in the result text"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get one page of patient records for a specific department
     
     Args:
         department_name: Name of department (mri, xray, ecg, blood_profile, ct_scan, treatment)
+        limit, cursor: Page size, and where the previous page left off
+        sort, order: Sort by date, patient_id or name; asc or desc
+        date_from, date_to, doctor, test_name, result: Optional filters
     
     Returns:
-        All records from that department with patient info
+        Up to `limit` records in that order, the total matching the filters, and a
+        next_cursor (null on the last page). Pages are keyset-based on (sort field,
+        _id), so every page is an index range scan no matter how deep it is.
+        Conditional: 304 when If-None-Match still matches.
     """
     
-    department_map = {
-        "mri": "mri_records",
-        "xray": "xray_records",
-        "x-ray": "xray_records",
-        "ecg": "ecg_records",
-        "blood_profile": "blood_profile_records",
-        "blood-test": "blood_profile_records",
-        "ct_scan": "ct_scan_records",
-        "ct-scan": "ct_scan_records",
-        "treatment": "treatment_records"
-    }
-    
-    collection_name = department_map.get(department_name.lower())
+    collection_name = DEPARTMENT_ROUTES.get(department_name.lower())
     if not collection_name:
         raise HTTPException(status_code=404, detail="Department not found")
+
+    representation = negotiate(request)
+    (department_rev,) = await collection_revs(collection_name)
+    etag = representation_etag(make_etag("department", collection_name, department_rev, limit, cursor, sort, order,
+                                         date_from, date_to, doctor, test_name, result), representation)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
     
     collection = db[collection_name]
-    records = await collection.find({}, {"_id": 0}).to_list(None)
-    
-    # Sort by date
-    if collection_name == "treatment_records":
-        records = sorted(records, key=lambda x: x.get("treatment_date", ""))
-    else:
-        records = sorted(records, key=lambda x: x.get("test_date", ""))
+    date_field = DEPARTMENT_DATE_FIELDS[collection_name]
+
+    filters = {}
+    if date_from or date_to:
+        filters[date_field] = {**({"$gte": date_from} if date_from else {}), **({"$lte": date_to} if date_to else {})}
+    if doctor:
+        filters["doctor"] = doctor
+    if test_name:
+        filters[DEPARTMENT_TEST_FIELDS[collection_name]] = test_name
+    if result:
+        filters["$text"] = {"$search": result}
+
+    sort_field = date_field if sort == "date" else sort
+    direction = ASCENDING if order == "asc" else DESCENDING
+    page_filter = filters
+    if cursor:
+        last_value, last_id = decode_cursor(cursor)
+        after = "$gt" if direction == ASCENDING else "$lt"
+        page_filter = {"$and": [filters, {"$or": [
+            {sort_field: {after: last_value}},
+            {sort_field: last_value, "_id": {after: last_id}}
+        ]}]}
+
+    # Fetch one extra record to know whether another page exists
+    records, total = await asyncio.gather(
+        collection.find(page_filter).sort([(sort_field, direction), ("_id", direction)])
+            .limit(limit + 1).to_list(limit + 1),
+        collection.count_documents(filters) if filters else collection.estimated_document_count()
+    )
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        next_cursor = encode_cursor(records[-1][sort_field], records[-1]["_id"])
+    for record in records:
+        del record["_id"]
     
-    return {
+    return render({
         "department": department_name,
         "records": records,
-        "total": len(records)
-    }
+        "total": total,
+        "next_cursor": next_cursor
+    }, representation, etag)
+
+@api_router.post("/department/{department_name}/records")
+async def add_record(department_name: str, record: dict = Body(...)):
+    """Add a record to a department for an existing patient. The name is taken from
+    the profile so it always matches across collections."""
+    collection_name = DEPARTMENT_ROUTES.get(department_name.lower())
+    if not collection_name:
+        raise HTTPException(status_code=404, detail="Department not found")
+
+    profile = await db.profiles.find_one({"patient_id": record.get("patient_id")}, {"_id": 0, "name": 1})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    try:
+        new_record = DEPARTMENT_MODELS[collection_name](**{**record, "name": profile["name"]}).model_dump()
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    date_field = DEPARTMENT_DATE_FIELDS[collection_name]
+    try:
+        # Dates are compared as strings everywhere (timelines, listings, cursors)
+        new_record[date_field] = date.fromisoformat(new_record[date_field]).isoformat()
+    except ValueError:
+        raise RequestValidationError([{"type": "date_parsing", "loc": ("body", date_field),
+                                       "msg": "Input should be a valid date in the format YYYY-MM-DD",
+                                       "input": new_record[date_field]}])
+
+    record_id, new_record = await add_department_record(collection_name, new_record)
+    return {"message": "Record added", "id": record_id, "record": new_record}
+
+@api_router.delete("/department/{department_name}/records/{record_id}")
+async def delete_record(department_name: str, record_id: str):
+    """Remove a record (by the id returned when it was added) — for entries made in
+    error — and rebuild the patient's timeline without it. Deleting straight from Mongo
+    would leave the timeline, data_version and the caches built on them stale."""
+    collection_name = DEPARTMENT_ROUTES.get(department_name.lower())
+    if not collection_name:
+        raise HTTPException(status_code=404, detail="Department not found")
+    try:
+        record = await db[collection_name].find_one_and_delete({"_id": ObjectId(record_id)})
+    except InvalidId:
+        record = None
+    if not record:
+        raise HTTPException(status_code=404, detail="Record not found")
+
+    await rebuild_patient_timeline(record["patient_id"])
+    await bump_data_version(collection_name)
+    return {"message": "Record deleted"}
 
 @api_router.get("/patients")
-async def get_all_patients():
+async def get_all_patients(request: Request, if_none_match: Optional[str] = Header(None)):
     """Get list of all patient IDs and names for reference"""
-    profiles = await db.profiles.find({}, {"_id": 0, "patient_id": 1, "name": 1}).to_list(None)
-    return {"patients": profiles}
+    representation = negotiate(request)
+    (profiles_rev,) = await collection_revs("profiles")
+    etag = representation_etag(make_etag("patients", profiles_rev), representation)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
 
-@api_router.post("/deep-query", response_model=DeepQueryResponse)
-async def deep_query(request: DeepQueryRequest):
-    """AI-powered clinical assistant to analyze patient records and answer questions"""
-    
-    patient_id = request.patient_id
-    question = request.question
-    
-    query = {"patient_id": patient_id}
+    profiles = await db.profiles.find({}, {"_id": 0, "patient_id": 1, "name": 1}).to_list(None)
+    return render({"patients": profiles}, representation, etag)
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters for the search/analytics response cache, DocAssist and cohort answers,
+    the per-patient retrieval indexes, speculative prefetch, Gemini calls, sessions and
+    text-to-speech audio"""
+    return {"responses": response_cache.stats(), "answers": answer_cache.stats(),
+            "cohort_answers": cohort_answer_cache.stats(),
+            "retrieval": retrieval_indexes.stats(), "prefetch": prefetch_stats(),
+            "llm": {"coalescing": gemini_flights.stats(), "stream_coalescing": gemini_stream_flights.stats(),
+                    "client": gemini_llm.stats()},
+            "sessions": docassist_sessions.stats(), "tts": speech.stats(), "data_version": data_version}
+
+@api_router.get("/indexes")
+async def get_index_report():
+    """Declared indexes per collection, and which index each query shape actually uses"""
+    return {
+        "indexes": {coll: [m.document["name"] for m in models] for coll, models in INDEXES.items()},
+        "queries": await index_usage_report()
+    }
 
-    profile = await db.profiles.find_one(query, {"_id": 0})
-    if not profile:
-        raise HTTPException(status_code=404, detail="Patient not found")
+# DocAssist answers keyed by patient, normalized question and the patient's timeline
+# rev. Every new record gets a new rev, so answers about older data are never served.
+# Mirrored to Mongo so they survive restarts, unless ANSWER_CACHE_PERSIST=0. Cohort
+# jobs keep their answers in a cache of their own, so one job over thousands of
+# patients can't evict the answers clinicians are asking for.
+answer_cache = TTLCache(maxsize=512, ttl=ANSWER_CACHE_TTL)
+cohort_answer_cache = TTLCache(maxsize=512, ttl=ANSWER_CACHE_TTL)
+ANSWER_CACHE_PERSIST = os.environ.get("ANSWER_CACHE_PERSIST", "1") != "0"
+
+def normalize_question(question):
+    """'  Any concerns?? ' and 'any concerns' ask the same thing"""
+    text = unicodedata.normalize("NFKC", question).casefold()
+    return " ".join(text.split()).rstrip("?!. ")
+
+def answer_key(patient_id, question, rev):
+    return hashlib.sha1(f"{patient_id}|{normalize_question(question)}|{rev}".encode()).hexdigest()
+
+async def cached_answer(key, cache=answer_cache):
+    """The stored DeepQueryResponse fields, or None"""
+    answer = cache.get(key)
+    if answer is None and ANSWER_CACHE_PERSIST:
+        fresh_since = datetime.now(timezone.utc).timestamp() - ANSWER_CACHE_TTL
+        answer = await db.answer_cache.find_one(
+            {"_id": key, "created_at": {"$gt": datetime.fromtimestamp(fresh_since, timezone.utc)}},
+            {"_id": 0, "answer": 1, "evidence": 1, "matched_departments": 1}
+        )
+        if answer is not None:
+            cache.set(key, answer)
+    return answer
+
+async def store_answer(key, patient_id, answer, cache=answer_cache):
+    cache.set(key, answer)
+    if ANSWER_CACHE_PERSIST:
+        await db.answer_cache.replace_one(
+            {"_id": key},
+            {**answer, "patient_id": patient_id, "created_at": datetime.now(timezone.utc)},
+            upsert=True
+        )
 
-    # Smart context: only fetch/send departments the question actually needs —
-    # cuts tokens and DB queries for narrow questions, and keeps greetings/general
-    # questions from pulling in patient data at all.
-    question_lower = question.lower()
-    dept_keywords = {
-        'MRI': ['mri', 'brain', 'spine', 'magnetic'],
-        'X-Ray': ['xray', 'x-ray', 'chest', 'bone', 'fracture'],
-        'ECG': ['ecg', 'heart', 'cardiac', 'rhythm'],
-        'Blood Profile': ['blood', 'hemoglobin', 'platelet', 'wbc', 'rbc', 'lipid', 'liver', 'kidney', 'thyroid'],
-        'CT Scan': ['ct', 'scan', 'computed tomography'],
-        'Treatment': ['treatment', 'medicine', 'medication', 'prescription', 'therapy'],
-    }
-    overview_keywords = ['summarize', 'summary', 'overview', 'status', 'records',
-                          'details', 'history', 'everything', 'concerns', 'concerning']
-    keyword_matched = [d for d, kws in dept_keywords.items() if any(k in question_lower for k in kws)]
-    is_overview = not keyword_matched and any(w in question_lower for w in overview_keywords)
-    needs_dept = lambda d: d in keyword_matched or is_overview
-
-    async def fetch(coll, name):
-        if not needs_dept(name):
-            return []
-        return await db[coll].find(query, {"_id": 0}).to_list(1000)
-
-    mri_records = await fetch("mri_records", "MRI")
-    xray_records = await fetch("xray_records", "X-Ray")
-    ecg_records = await fetch("ecg_records", "ECG")
-    blood_profile_records = await fetch("blood_profile_records", "Blood Profile")
-    ct_scan_records = await fetch("ct_scan_records", "CT Scan")
-    treatment_records = await fetch("treatment_records", "Treatment")
-
-    patient_context = f"""
-PATIENT PROFILE:
-- Name: {profile.get('name')}
-- Patient ID: {profile.get('patient_id')}
-- Age: {profile.get('age')} years
-- Gender: {profile.get('gender')}
-- Blood Group: {profile.get('blood_group')}
-- Address: {profile.get('address')}
-- Phone: {profile.get('phone')}
-- Registration Date: {profile.get('registration_date')}
-"""
-    if needs_dept('MRI'):
-        patient_context += f"\nMRI RECORDS ({len(mri_records)} records):\n{json.dumps(mri_records, indent=2) if mri_records else 'No MRI records'}\n"
-    if needs_dept('X-Ray'):
-        patient_context += f"\nX-RAY RECORDS ({len(xray_records)} records):\n{json.dumps(xray_records, indent=2) if xray_records else 'No X-Ray records'}\n"
-    if needs_dept('ECG'):
-        patient_context += f"\nECG RECORDS ({len(ecg_records)} records):\n{json.dumps(ecg_records, indent=2) if ecg_records else 'No ECG records'}\n"
-    if needs_dept('Blood Profile'):
-        patient_context += f"\nBLOOD PROFILE RECORDS ({len(blood_profile_records)} records):\n{json.dumps(blood_profile_records, indent=2) if blood_profile_records else 'No blood profile records'}\n"
-    if needs_dept('CT Scan'):
-        patient_context += f"\nCT SCAN RECORDS ({len(ct_scan_records)} records):\n{json.dumps(ct_scan_records, indent=2) if ct_scan_records else 'No CT scan records'}\n"
-    if needs_dept('Treatment'):
-        patient_context += f"\nTREATMENT RECORDS ({len(treatment_records)} records):\n{json.dumps(treatment_records, indent=2) if treatment_records else 'No treatment records'}\n"
-
-    system_message = """You are DocAssist, an AI clinical assistant for XYZ Hospital, a cancer
+DOCASSIST_SYSTEM_MESSAGE = """You are DocAssist, an AI clinical assistant for XYZ Hospital, a cancer
 treatment center. You have access to a patient's complete medical records including MRI scans,
 X-Rays, ECG tests, blood profiles, CT scans, and treatment history.
 
@@ -541,53 +1415,316 @@ Scope — read this carefully, it controls when patient data appears in your ans
 Patient data is available in every turn, but only use it when the question actually
 calls for it. Including it in a reply to "hi" is a failure mode — do not do that."""
 
-    try:
-        if not gemini_client:
-            raise HTTPException(status_code=500, detail="LLM API key not configured")
+# Smart context: the router names departments a question is about (and overview
+# questions); BM25 then ranks that patient's records so only the top few plus the
+# latest of each department go into the prompt. Greetings and general questions
+# carry no patient data at all: departments whose records merely share a term with
+# the question ("what is neutropenia?") only count when the question also names a
+# department or is about the patient.
+DEPARTMENT_KEYWORDS = {
+    'MRI': ['mri', 'brain', 'spine', 'magnetic'],
+    'X-Ray': ['xray', 'x-ray', 'chest', 'bone', 'fracture'],
+    'ECG': ['ecg', 'heart', 'cardiac', 'rhythm'],
+    'Blood Profile': ['blood', 'hemoglobin', 'platelet', 'wbc', 'rbc', 'lipid', 'liver', 'kidney', 'thyroid'],
+    'CT Scan': ['ct', 'scan', 'computed tomography'],
+    'Treatment': ['treatment', 'medicine', 'medication', 'prescription', 'therapy'],
+}
+OVERVIEW_KEYWORDS = ['summarize', 'summary', 'overview', 'status', 'records',
+                     'details', 'history', 'everything', 'concerns', 'concerning']
+# Words that make a question about this patient rather than general knowledge
+PATIENT_WORDS = {'patient', 'he', 'she', 'him', 'his', 'her', 'they', 'them', 'their', 'any', 'was', 'were',
+                 'did', 'has', 'had', 'last', 'latest', 'recent', 'current', 'previous', 'next', 'visit'}
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "12"))
+
+# Per-patient BM25 indexes, keyed by timeline rev like the answer cache, so the first
+# question after a new record rebuilds them. Entries hold the records they index.
+retrieval_indexes = TTLCache(maxsize=256, ttl=3600)
+
+def route_question(question):
+    """(departments named by keyword, whether it asks for an overview)"""
+    question_lower = question.lower()
+    keyword_matched = [d for d, kws in DEPARTMENT_KEYWORDS.items() if any(k in question_lower for k in kws)]
+    is_overview = not keyword_matched and any(w in question_lower for w in OVERVIEW_KEYWORDS)
+    return keyword_matched, is_overview
+
+def record_text(coll, record):
+    """What a record is indexed under"""
+    return " ".join([DEPARTMENT_LABELS[coll], record.get(DEPARTMENT_TEST_FIELDS[coll], ""),
+                     record.get("result", ""), record.get("medicines", "")])
+
+def select_records(documents, scores, departments, top_k, fill_recent):
+    """Indices into documents — (collection, record) pairs, each collection's ascending
+    by date — of what to send: the top_k matching records (newest first among ties)
+    within `departments`, plus the latest record of each. With fill_recent, records
+    that match nothing make up the top_k too, newest first. Ordered best first."""
+    candidates = [i for i, (coll, _) in enumerate(documents) if DEPARTMENT_LABELS[coll] in departments]
+    ranked = sorted(candidates, reverse=True,
+                    key=lambda i: (scores[i], documents[i][1][DEPARTMENT_DATE_FIELDS[documents[i][0]]]))
+    top = [i for i in ranked if fill_recent or scores[i]][:top_k]
+    latest = {documents[i][0]: i for i in candidates}
+    chosen = set(top) | set(latest.values())
+    return [i for i in ranked if i in chosen]
+
+def index_records(records):
+    """(documents, index) over a PatientRecords' departments"""
+    documents = [(coll, r) for coll in DEPARTMENT_LABELS for r in getattr(records, coll)]
+    return documents, BM25Index([tokenize(record_text(*d)) for d in documents])
+
+async def patient_rev(patient_id):
+    timeline = await db.patient_timelines.find_one({"patient_id": patient_id}, {"_id": 0, "rev": 1})
+    return (timeline or {}).get("rev", "")
+
+async def patient_retrieval_index(patient_id, rev):
+    """(profile, documents, index) for one patient, built on first use per rev"""
+    entry = retrieval_indexes.get((patient_id, rev))
+    if entry is None:
+        records = await fetch_patient_records({"patient_id": patient_id}, with_profile=True)
+        entry = (records.profile, *index_records(records))
+        if records.profile:
+            retrieval_indexes.set((patient_id, rev), entry)
+    return entry
+
+async def prepare_deep_query(patient_id, question, rev):
+    """Everything DocAssist knows before calling the LLM: the prompt, plus the
+    evidence cards and matched departments returned alongside the answer"""
+    profile, documents, index = await patient_retrieval_index(patient_id, rev)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return build_deep_query(profile, documents, index, question)
+
+async def local_answer(patient_id, question):
+    """The DeepQueryResponse fields for a plain record lookup ("when was the last
+    MRI?"), answered from the records without calling the LLM — or None"""
+    intent = match_intent(question)
+    if intent is None:
+        return None
+    note_prefetch_use(patient_id)
+    profile, documents, _ = await patient_retrieval_index(patient_id, await patient_rev(patient_id))
+    if not profile:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    coll = intent.collection
+    answer, evidence = answer_intent(intent, [r for c, r in documents if c == coll], DEPARTMENT_DATE_FIELDS[coll],
+                                     DEPARTMENT_TEST_FIELDS[coll], DEPARTMENT_LABELS[coll])
+    return {"answer": answer, "evidence": evidence, "matched_departments": [DEPARTMENT_LABELS[coll]]}
+
+def build_deep_query(profile, documents, index, question):
+    keyword_matched, is_overview = route_question(question)
+    scores = index.scores(question)
+    if is_overview:
+        departments = set(DEPARTMENT_LABELS.values())
+    elif keyword_matched or PATIENT_WORDS & set(re.findall(r"[a-z]+", question.lower())):
+        departments = set(keyword_matched) | {
+            DEPARTMENT_LABELS[coll] for (coll, _), score in zip(documents, scores) if score
+        }
+    else:
+        departments = set()
+    selected = select_records(documents, scores, departments, RETRIEVAL_TOP_K, is_overview)
+
+    chosen = set(selected)
+    tables = []
+    for coll, label in DEPARTMENT_LABELS.items():
+        if label in departments:
+            rows = [(i, r) for i, (c, r) in enumerate(documents) if c == coll]
+            tables.append((label, DEPARTMENT_DATE_FIELDS[coll], [r for i, r in rows if i in chosen], len(rows)))
+    patient_context = encode_patient_context(profile, tables, question, CONTEXT_TOKEN_BUDGET)
 
-        # Create user message with patient context
-        prompt = f"""Based on the following patient records, please answer this question: {question}
+    # Create user message with patient context
+    prompt = f"""Based on the following patient records, please answer this question: {question}
 
 {patient_context}"""
 
-        # Get LLM response
-        result = await generate_content_with_retry(
+    # Evidence: the best-ranked records sent, across the departments they came from
+    matched_departments = [label for label, _, rows, _ in tables if rows]
+    evidence = [documents[i][1] for i in selected]
+    return prompt, evidence[:6], matched_departments  # Limit to 6 evidence cards
+
+# DocAssist conversations. A session uploads the patient's rendered chart with the
+# system prompt as a Gemini explicit context cache, and keeps the recent history here.
+# Routing and retrieval still run per turn: a turn about the patient's records sends
+# only the history and the question against the cache, while greetings and general
+# questions send their routed prompt (no records) with the plain system prompt. Charts
+# too small for Gemini to cache get no session — the client sends its own history
+# instead. Sessions expire SESSION_TTL seconds after their last turn, at most
+# SESSION_MAX are kept (least recently used evicted first) and history is capped.
+SESSION_TTL = 1800
+SESSION_MAX = 200
+SESSION_MAX_TURNS = 10
+# Gemini rejects explicit caches smaller than this, so don't try
+GEMINI_CACHE_MIN_TOKENS = 1024
+
+@dataclasses.dataclass
+class DocAssistSession:
+    session_id: str
+    patient_id: str
+    rev: Optional[str] = None
+    cache_name: Optional[str] = None
+    cache_expires: float = 0.0
+    # genai Content turns, oldest first — at most SESSION_MAX_TURNS questions and answers
+    history: list = dataclasses.field(default_factory=list)
+    # Serializes refresh_session, so concurrent turns don't each replace the cache
+    lock: asyncio.Lock = dataclasses.field(default_factory=asyncio.Lock, repr=False)
+
+# Deletions of the Gemini caches of evicted sessions, referenced until they finish
+session_cleanup_tasks = set()
+
+def session_evicted(session_id, session):
+    """A session dropped by LRU eviction or expiry takes its Gemini cache with it, rather
+    than leaving it to run out its own TTL. Expired sessions nobody asks for again stay
+    in the TTLCache until evicted — their caches, whose TTL is the session's, have
+    lapsed by then."""
+    if session.cache_name:
+        stale, session.cache_name = session.cache_name, None
+        task = asyncio.create_task(delete_context_cache(stale))
+        session_cleanup_tasks.add(task)
+        task.add_done_callback(session_cleanup_tasks.discard)
+
+docassist_sessions = TTLCache(maxsize=SESSION_MAX, ttl=SESSION_TTL, on_evict=session_evicted)
+
+async def create_context_cache(system_instruction):
+    """Name of a Gemini explicit cache holding the system instruction, or None when
+    the context is too small to cache or the API refuses"""
+    if estimate_tokens(system_instruction) < GEMINI_CACHE_MIN_TOKENS:
+        return None
+    try:
+        cache = await gemini_llm.call(lambda: gemini_client.aio.caches.create(
             model=GEMINI_MODEL,
-            contents=prompt,
-            config=genai_types.GenerateContentConfig(system_instruction=system_message),
-        )
-        response = result.text
-
-        # Evidence departments: keyword matches, or (for overview questions) every
-        # department that actually has data — computed earlier alongside fetching
-        matched_departments = list(keyword_matched)
-        if is_overview:
-            for dept, records in [('MRI', mri_records), ('X-Ray', xray_records), ('ECG', ecg_records),
-                                   ('Blood Profile', blood_profile_records), ('CT Scan', ct_scan_records),
-                                   ('Treatment', treatment_records)]:
-                if records:
-                    matched_departments.append(dept)
-
-        # Collect relevant evidence records (most recent from each matched department)
-        evidence = []
-        if 'MRI' in matched_departments and mri_records:
-            evidence.extend(sorted(mri_records, key=lambda x: x.get('test_date', ''), reverse=True)[:2])
-        if 'X-Ray' in matched_departments and xray_records:
-            evidence.extend(sorted(xray_records, key=lambda x: x.get('test_date', ''), reverse=True)[:2])
-        if 'ECG' in matched_departments and ecg_records:
-            evidence.extend(sorted(ecg_records, key=lambda x: x.get('test_date', ''), reverse=True)[:2])
-        if 'Blood Profile' in matched_departments and blood_profile_records:
-            evidence.extend(sorted(blood_profile_records, key=lambda x: x.get('test_date', ''), reverse=True)[:2])
-        if 'CT Scan' in matched_departments and ct_scan_records:
-            evidence.extend(sorted(ct_scan_records, key=lambda x: x.get('test_date', ''), reverse=True)[:2])
-        if 'Treatment' in matched_departments and treatment_records:
-            evidence.extend(sorted(treatment_records, key=lambda x: x.get('treatment_date', ''), reverse=True)[:2])
-        
-        return DeepQueryResponse(
-            answer=response,
-            evidence=evidence[:6],  # Limit to 6 evidence cards
-            matched_departments=matched_departments
-        )
+            config=genai_types.CreateCachedContentConfig(system_instruction=system_instruction,
+                                                         ttl=f"{SESSION_TTL}s"),
+        ))
+        return cache.name
+    except Exception as e:
+        logger.info(f"Context caching unavailable: {e}")
+        return None
+
+async def delete_context_cache(name):
+    try:
+        await gemini_client.aio.caches.delete(name=name)
+    except Exception as e:
+        logger.info(f"Could not delete context cache {name}: {e}")
+
+async def refresh_session(session):
+    """Bring the session's cached chart up to date with the patient's records, and keep
+    it alive for as long as the session can be. A session whose cache is gone carries
+    on with routed prompts, like a stateless turn with history."""
+    async with session.lock:
+        rev = await patient_rev(session.patient_id)
+        if rev != session.rev:
+            profile, documents, _ = await patient_retrieval_index(session.patient_id, rev)
+            if not profile:
+                raise HTTPException(status_code=404, detail="Patient not found")
+            context = encode_patient_context(profile, [
+                (label, DEPARTMENT_DATE_FIELDS[coll], rows, len(rows))
+                for coll, label in DEPARTMENT_LABELS.items()
+                for rows in [[r for c, r in documents if c == coll]]
+            ], budget=CONTEXT_TOKEN_BUDGET)
+            if session.cache_name:
+                # Forget it before deleting it, so the session never names a deleted cache
+                stale, session.cache_name = session.cache_name, None
+                await delete_context_cache(stale)
+            session.rev = rev
+            session.cache_name = await create_context_cache(
+                f"{DOCASSIST_SYSTEM_MESSAGE}\n\nPATIENT RECORDS FOR THIS CONVERSATION:\n{context}"
+            )
+            session.cache_expires = time.monotonic() + SESSION_TTL
+        elif session.cache_name and session.cache_expires - time.monotonic() < SESSION_TTL / 2:
+            try:
+                await gemini_client.aio.caches.update(
+                    name=session.cache_name, config=genai_types.UpdateCachedContentConfig(ttl=f"{SESSION_TTL}s")
+                )
+                session.cache_expires = time.monotonic() + SESSION_TTL
+            except Exception as e:
+                logger.info(f"Could not extend context cache, using routed context: {e}")
+                session.cache_name = None
+
+def get_session(session_id, patient_id):
+    session = docassist_sessions.get(session_id)
+    if session is None or session.patient_id != patient_id:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    docassist_sessions.set(session_id, session)  # each turn restarts the TTL
+    return session
+
+async def prepare_session_turn(session, question):
+    """(contents, config, evidence, matched_departments) for the next turn"""
+    note_prefetch_use(session.patient_id)
+    await refresh_session(session)
+    profile, documents, index = await patient_retrieval_index(session.patient_id, session.rev)
+    prompt, evidence, matched_departments = build_deep_query(profile, documents, index, question)
+    if session.cache_name and matched_departments:
+        text, config = question, genai_types.GenerateContentConfig(cached_content=session.cache_name)
+    else:
+        text, config = prompt, genai_types.GenerateContentConfig(system_instruction=DOCASSIST_SYSTEM_MESSAGE)
+    contents = [*session.history, genai_types.Content(role="user", parts=[genai_types.Part(text=text)])]
+    return contents, config, evidence, matched_departments
+
+def record_session_turn(session, question, answer):
+    session.history += [genai_types.Content(role="user", parts=[genai_types.Part(text=question)]),
+                        genai_types.Content(role="model", parts=[genai_types.Part(text=answer)])]
+    del session.history[:-2 * SESSION_MAX_TURNS]
+
+@api_router.post("/docassist/sessions")
+async def create_session(request: SessionRequest):
+    """Start a DocAssist conversation about one patient — pass the returned session_id
+    with each /deep-query (or /deep-query/stream) turn. session_id is null when the
+    patient's chart is too small to cache; send the history with each question then."""
+    if not gemini_client:
+        raise HTTPException(status_code=500, detail="LLM API key not configured")
+    session = DocAssistSession(session_id=uuid.uuid4().hex, patient_id=request.patient_id)
+    await refresh_session(session)
+    if not session.cache_name:
+        # Below the cache minimum (or caching unavailable) a session saves nothing
+        return {"session_id": None, "patient_id": session.patient_id, "expires_in": 0, "context_cache": None}
+    docassist_sessions.set(session.session_id, session)
+    return {
+        "session_id": session.session_id,
+        "patient_id": session.patient_id,
+        "expires_in": SESSION_TTL,
+        "context_cache": "gemini"
+    }
+
+@api_router.delete("/docassist/sessions/{session_id}")
+async def end_session(session_id: str):
+    session = docassist_sessions.pop(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    if session.cache_name:
+        await delete_context_cache(session.cache_name)
+    return {"message": "Session ended"}
+
+@api_router.post("/deep-query", response_model=DeepQueryResponse)
+async def deep_query(request: DeepQueryRequest):
+    """AI-powered clinical assistant to analyze patient records and answer questions"""
+    if request.session_id:
+        return await deep_query_session_turn(request)
+    return DeepQueryResponse(**await answer_question(request.patient_id, request.question))
+
+async def answer_question(patient_id, question, cache=answer_cache):
+    """The DeepQueryResponse fields for one patient, from the records themselves for a
+    plain lookup, else `cache` (backed by the answer_cache collection) or Gemini"""
+    local = await local_answer(patient_id, question)
+    if local is not None:
+        return local
+    note_prefetch_use(patient_id)
+    rev = await patient_rev(patient_id)
+    cache_key = answer_key(patient_id, question, rev)
+    cached = await cached_answer(cache_key, cache)
+    if cached is not None:
+        return cached
+
+    prompt, evidence, matched_departments = await prepare_deep_query(patient_id, question, rev)
+
+    try:
+        if not gemini_client:
+            raise HTTPException(status_code=500, detail="LLM API key not configured")
+
+        # Get LLM response
+        result = await generate_content_coalesced(GEMINI_MODEL, DOCASSIST_SYSTEM_MESSAGE, prompt)
+        answer = {
+            "answer": result.text,
+            "evidence": evidence,
+            "matched_departments": matched_departments
+        }
+        await store_answer(cache_key, patient_id, answer, cache)
+        return answer
         
     except HTTPException:
         raise
@@ -595,6 +1732,316 @@ calls for it. Including it in a reply to "hi" is a failure mode — do not do th
         logger.error(f"Deep query error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+async def deep_query_session_turn(request):
+    session = get_session(request.session_id, request.patient_id)
+    local = await local_answer(request.patient_id, request.question)
+    if local is not None:
+        record_session_turn(session, request.question, local["answer"])
+        return DeepQueryResponse(**local)
+    contents, config, evidence, matched_departments = await prepare_session_turn(session, request.question)
+    try:
+        result = await generate_content_with_retry(model=GEMINI_MODEL, contents=contents, config=config)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Deep query error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+    record_session_turn(session, request.question, result.text)
+    return DeepQueryResponse(answer=result.text, evidence=evidence, matched_departments=matched_departments)
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+@api_router.post("/deep-query/stream")
+async def deep_query_stream(request: DeepQueryRequest):
+    """/deep-query as server-sent events: `context` (evidence + matched departments),
+    `token` per streamed chunk of the answer, then `done` with the full answer — or
+    `error` ({status, detail}) if generation fails midway. The model stream is opened,
+    up to its first chunk, before the response starts, so an overload at that point
+    is a real 503 rather than an error event."""
+    session = get_session(request.session_id, request.patient_id) if request.session_id else None
+    # Plain lookups are answered from the records and sent like a cached answer
+    cached = await local_answer(request.patient_id, request.question)
+    if cached is not None:
+        if session:
+            record_session_turn(session, request.question, cached["answer"])
+    elif session:
+        contents, config, evidence, matched_departments = await prepare_session_turn(session, request.question)
+        stream = stream_content_with_retry(model=GEMINI_MODEL, contents=contents, config=config)
+    else:
+        note_prefetch_use(request.patient_id)
+        rev = await patient_rev(request.patient_id)
+        cache_key = answer_key(request.patient_id, request.question, rev)
+        cached = await cached_answer(cache_key)
+        if cached is None:
+            prompt, evidence, matched_departments = await prepare_deep_query(request.patient_id, request.question, rev)
+            stream = stream_content_coalesced(GEMINI_MODEL, DOCASSIST_SYSTEM_MESSAGE, prompt)
+    if cached is None:
+        if not gemini_client:
+            raise HTTPException(status_code=500, detail="LLM API key not configured")
+        try:
+            first = await anext(stream, None)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Deep query stream error: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+
+    async def events():
+        if cached is not None:
+            yield sse_event("context", {"evidence": cached["evidence"], "matched_departments": cached["matched_departments"]})
+            yield sse_event("token", {"text": cached["answer"]})
+            yield sse_event("done", {"answer": cached["answer"]})
+            return
+
+        yield sse_event("context", {"evidence": evidence, "matched_departments": matched_departments})
+        chunks = []
+        try:
+            if first is not None and first.text:
+                chunks.append(first.text)
+                yield sse_event("token", {"text": first.text})
+            async for chunk in stream:
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    yield sse_event("token", {"text": chunk.text})
+        except Exception as e:
+            logger.error(f"Deep query stream error: {str(e)}")
+            if isinstance(e, HTTPException):
+                yield sse_event("error", {"status": e.status_code, "detail": e.detail})
+            else:
+                yield sse_event("error", {"status": 500, "detail": f"Error processing query: {str(e)}"})
+            return
+        finally:
+            await stream.aclose()
+
+        answer = "".join(chunks)
+        if session:
+            record_session_turn(session, request.question, answer)
+        else:
+            await store_answer(cache_key, request.patient_id,
+                               {"answer": answer, "evidence": evidence, "matched_departments": matched_departments})
+        yield sse_event("done", {"answer": answer})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Cohort question jobs: one DocAssist question asked of every patient matching a
+# filter ("which lymphoma patients had neutropenia after cycle 2?"). A job runs in the
+# background as gemini_llm.max_concurrency workers sharing one list of patients, so
+# the LLM slots stay busy and nothing waits on the request that started it. Each
+# patient's answer is written to cohort_job_results as it arrives.
+#
+# The process running a job owns it: `owner` is its COHORT_WORKER_ID and `lease_until`
+# is renewed every COHORT_JOB_LEASE / 3 seconds. Every COHORT_JOB_LEASE seconds, each
+# process claims the unfinished jobs whose lease has lapsed — left by a restart or a
+# process that died — one atomic find_one_and_update at a time, so no job runs twice;
+# it resumes with the patients that have no result yet.
+COHORT_JOB_MAX_PATIENTS = int(os.environ.get("COHORT_JOB_MAX_PATIENTS", "5000"))
+# Seconds to wait before retrying a patient while Gemini is overloaded, when the 503
+# carries no Retry-After, and how many times to retry before recording a failure
+COHORT_OVERLOAD_WAIT = 10
+COHORT_OVERLOAD_RETRIES = 5
+COHORT_JOB_LEASE = 60
+COHORT_WORKER_ID = uuid.uuid4().hex
+cohort_job_tasks = {}
+cohort_job_sweep = None
+
+class CohortFilter(BaseModel):
+    scenario: Optional[str] = None
+    age_band: Optional[str] = None
+    gender: Optional[str] = None
+    blood_group: Optional[str] = None
+    patient_ids: Optional[List[str]] = None
+
+class CohortJobRequest(BaseModel):
+    question: str = Field(min_length=1)
+    filter: CohortFilter = CohortFilter()
+
+def cohort_filter_query(cohort_filter):
+    """The profiles query for a CohortFilter"""
+    query = {field: value for field, value in cohort_filter.model_dump(exclude={"age_band", "patient_ids"}).items()
+             if value is not None}
+    if cohort_filter.patient_ids is not None:
+        query["patient_id"] = {"$in": cohort_filter.patient_ids}
+    if cohort_filter.age_band is not None:
+        if cohort_filter.age_band not in AGE_BANDS:
+            raise HTTPException(status_code=400, detail=f"age_band must be one of: {', '.join(AGE_BANDS)}")
+        band = AGE_BANDS.index(cohort_filter.age_band)
+        query["age"] = {"$gte": AGE_BINS[band]}
+        if band + 1 < len(AGE_BANDS):
+            query["age"]["$lt"] = AGE_BINS[band + 1]
+    return query
+
+async def answer_cohort_patient(job_id, question, patient_id):
+    for attempt in range(COHORT_OVERLOAD_RETRIES + 1):
+        try:
+            result = {"ok": True, **await answer_question(patient_id, question, cohort_answer_cache)}
+        except HTTPException as e:
+            result = {"ok": False, "error": e.detail}
+            if e.status_code == 503 and attempt < COHORT_OVERLOAD_RETRIES:
+                # Overloaded: wait it out instead of failing the patient
+                await asyncio.sleep(float((e.headers or {}).get("Retry-After", COHORT_OVERLOAD_WAIT)))
+                continue
+        except Exception as e:
+            logger.error(f"Cohort job {job_id} failed for {patient_id}: {e}")
+            result = {"ok": False, "error": str(e)}
+        break
+    await db.cohort_job_results.replace_one(
+        {"job_id": job_id, "patient_id": patient_id},
+        {"job_id": job_id, "patient_id": patient_id, **result, "completed_at": datetime.now(timezone.utc)},
+        upsert=True
+    )
+
+async def run_cohort_job(job_id):
+    try:
+        job = await db.cohort_jobs.find_one({"_id": job_id})
+        answered = set(await db.cohort_job_results.distinct("patient_id", {"job_id": job_id}))
+        pending = iter([pid for pid in job["patient_ids"] if pid not in answered])
+        await db.cohort_jobs.update_one({"_id": job_id, "owner": COHORT_WORKER_ID, "status": "queued"},
+                                        {"$set": {"status": "running"}})
+
+        async def worker():
+            for patient_id in pending:
+                await answer_cohort_patient(job_id, job["question"], patient_id)
+
+        await asyncio.gather(*(worker() for _ in range(gemini_llm.max_concurrency)))
+        status = "completed"
+    except asyncio.CancelledError:
+        raise  # cancelled through the API (which set the status) or shutting down
+    except Exception as e:
+        logger.error(f"Cohort job {job_id} failed: {e}")
+        status = "failed"
+    # A job cancelled meanwhile stays cancelled
+    await db.cohort_jobs.update_one(
+        {"_id": job_id, "status": "running"},
+        {"$set": {"status": status, "finished_at": datetime.now(timezone.utc)}}
+    )
+
+def cohort_lease_expiry():
+    return datetime.now(timezone.utc) + timedelta(seconds=COHORT_JOB_LEASE)
+
+async def renew_cohort_lease(job_id, task):
+    """Keep this process's claim on a job while `task` runs it; once the claim is gone
+    (the job was cancelled, possibly by another process), stop the task"""
+    while True:
+        await asyncio.sleep(COHORT_JOB_LEASE / 3)
+        result = await db.cohort_jobs.update_one(
+            {"_id": job_id, "owner": COHORT_WORKER_ID, "status": {"$in": ["queued", "running"]}},
+            {"$set": {"lease_until": cohort_lease_expiry()}}
+        )
+        if not result.matched_count:
+            task.cancel()
+            return
+
+def start_cohort_job(job_id):
+    """Run a job this process has claimed"""
+    task = asyncio.create_task(run_cohort_job(job_id))
+    renewal = asyncio.create_task(renew_cohort_lease(job_id, task))
+    cohort_job_tasks[job_id] = task
+
+    def finished(_):
+        cohort_job_tasks.pop(job_id, None)
+        renewal.cancel()
+    task.add_done_callback(finished)
+
+async def claim_cohort_jobs():
+    """Claim and start every unfinished job whose lease has lapsed"""
+    while True:
+        job = await db.cohort_jobs.find_one_and_update(
+            {"_id": {"$nin": list(cohort_job_tasks)}, "status": {"$in": ["queued", "running"]},
+             "$or": [{"lease_until": None}, {"lease_until": {"$lt": datetime.now(timezone.utc)}}]},
+            {"$set": {"owner": COHORT_WORKER_ID, "lease_until": cohort_lease_expiry()}},
+            projection={"_id": 1}
+        )
+        if job is None:
+            return
+        logger.info(f"Resuming cohort job {job['_id']}")
+        start_cohort_job(job["_id"])
+
+async def sweep_cohort_jobs():
+    while True:
+        try:
+            await claim_cohort_jobs()
+        except Exception as e:
+            logger.warning(f"Could not claim cohort jobs: {e}")
+        await asyncio.sleep(COHORT_JOB_LEASE)
+
+@api_router.post("/cohort/jobs", status_code=202)
+async def create_cohort_job(request: CohortJobRequest):
+    """Ask one question of every patient matching the filter, in the background — poll
+    GET /cohort/jobs/{job_id} for progress and answers"""
+    if not gemini_client:
+        raise HTTPException(status_code=500, detail="LLM API key not configured")
+    query = cohort_filter_query(request.filter)
+    patient_ids = await db.profiles.distinct("patient_id", query)
+    if not patient_ids:
+        raise HTTPException(status_code=404, detail="No patients match the filter")
+    if len(patient_ids) > COHORT_JOB_MAX_PATIENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{len(patient_ids)} patients match; narrow the filter to at most {COHORT_JOB_MAX_PATIENTS}"
+        )
+    job_id = uuid.uuid4().hex
+    await db.cohort_jobs.insert_one({
+        "_id": job_id,
+        "question": request.question,
+        "filter": request.filter.model_dump(exclude_none=True),
+        "patient_ids": sorted(patient_ids),
+        "total": len(patient_ids),
+        "status": "queued",
+        "owner": COHORT_WORKER_ID,
+        "lease_until": cohort_lease_expiry(),
+        "created_at": datetime.now(timezone.utc),
+        "finished_at": None,
+    })
+    start_cohort_job(job_id)
+    return {"job_id": job_id, "status": "queued", "total": len(patient_ids)}
+
+@api_router.get("/cohort/jobs/{job_id}")
+async def get_cohort_job(
+    job_id: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=500)
+):
+    """A cohort job's status and progress, with one page of the answers so far"""
+    job = await db.cohort_jobs.find_one({"_id": job_id}, {"patient_ids": 0, "owner": 0, "lease_until": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    answered, failed, results = await asyncio.gather(
+        db.cohort_job_results.count_documents({"job_id": job_id}),
+        db.cohort_job_results.count_documents({"job_id": job_id, "ok": False}),
+        db.cohort_job_results.find({"job_id": job_id}, {"_id": 0, "job_id": 0})
+            .sort("patient_id", ASCENDING).skip((page - 1) * page_size).limit(page_size).to_list(page_size)
+    )
+    return {
+        "job_id": job.pop("_id"),
+        **job,
+        "completed": answered - failed,
+        "failed": failed,
+        "pending": job["total"] - answered,
+        "page": page,
+        "results": results,
+    }
+
+@api_router.post("/cohort/jobs/{job_id}/cancel")
+async def cancel_cohort_job(job_id: str):
+    """Stop a queued or running cohort job; answers already written are kept"""
+    result = await db.cohort_jobs.update_one(
+        {"_id": job_id, "status": {"$in": ["queued", "running"]}},
+        {"$set": {"status": "cancelled", "finished_at": datetime.now(timezone.utc)}}
+    )
+    if not result.matched_count:
+        if not await db.cohort_jobs.find_one({"_id": job_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Job not found")
+        raise HTTPException(status_code=409, detail="Job already finished")
+    task = cohort_job_tasks.get(job_id)
+    if task:
+        task.cancel()
+    return {"job_id": job_id, "status": "cancelled"}
+
 class FileAnalysisResponse(BaseModel):
     analysis: str
     file_type: str
@@ -604,7 +2051,8 @@ class FileAnalysisResponse(BaseModel):
 async def analyze_document(
     file: UploadFile = File(...),
     patient_id: str = Form(...),
-    question: str = Form(default="Analyze this medical document and provide a detailed summary.")
+    question: str = Form(default="Analyze this medical document and provide a detailed summary."),
+    session_id: Optional[str] = Form(default=None)
 ):
     """Analyze uploaded medical documents (images, PDFs) using Gemini AI"""
     
@@ -684,6 +2132,10 @@ Guidelines:
             config=genai_types.GenerateContentConfig(system_instruction=system_message),
         )
         analysis = result.text
+        # Follow-up questions in the conversation can refer to the analysis
+        session = docassist_sessions.get(session_id) if session_id else None
+        if session and session.patient_id == patient_id:
+            record_session_turn(session, f"[Uploaded {file.filename}] {question}", analysis)
         
         # Determine file type for response
         file_type_map = {
@@ -735,6 +2187,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_indexes():
+    await ensure_indexes()
+    await backfill_name_tokens()
+    await backfill_result_classification()
+    # Databases seeded before timelines existed, or with any event from before events
+    # carried a category (analytics would count it as abnormal), get them rebuilt
+    if await db.profiles.find_one() and (
+        not await db.patient_timelines.find_one({}, {"_id": 1})
+        or await db.patient_timelines.find_one({"events": {"$elemMatch": {"category": {"$exists": False}}}}, {"_id": 1})
+    ):
+        await rebuild_timelines()
+
+@app.on_event("startup")
+async def resume_cohort_jobs():
+    global cohort_job_sweep
+    if not gemini_client:
+        return
+    cohort_job_sweep = asyncio.create_task(sweep_cohort_jobs())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
@@ -0,0 +1,130 @@
+"""
+Text-to-speech off the event loop: a blocking synthesizer run in a bounded thread
+pool, behind a content-addressed audio cache — an in-memory LRU over files on disk
+named by the SHA-256 of the text. Long texts can be spoken sentence by sentence.
+
+The audio is spoken patient data. The disk cache is bounded: past max_files files or
+max_bytes bytes, the least recently used are deleted.
+"""
+
+import os
+import re
+import uuid
+import asyncio
+import hashlib
+import threading
+from pathlib import Path
+from itertools import islice
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import TTLCache
+from llm import SingleFlight
+
+# Sentence ends, except after the abbreviations DocAssist answers use ("Dr. Patel")
+SENTENCE_END = re.compile(r"(?<!\bDr\.)(?<!\bMr\.)(?<!\bMs\.)(?<!\bMrs\.)(?<!\bvs\.)(?<=[.!?])\s+|\s*\n\s*")
+
+def split_sentences(text):
+    return [s for s in SENTENCE_END.split(text) if s.strip()]
+
+class SpeechCache:
+    """speak(text) -> audio bytes. `synthesize(text) -> bytes` is blocking and runs on
+    at most `max_workers` threads; the same text is synthesized once, ever — later
+    calls are served from memory or disk, and concurrent ones share the call."""
+
+    def __init__(self, synthesize, directory, max_workers=4, memory_items=64,
+                 max_files=2000, max_bytes=200 * 2 ** 20):
+        self.synthesize = synthesize
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="tts")
+        # Audio for a text never goes stale; the TTL only lets idle entries go, and
+        # they're still on disk
+        self.memory = TTLCache(maxsize=memory_items, ttl=86400)
+        self.flights = SingleFlight()
+        self.sources = Counter()
+        # Size of each file on disk, least recently used first — scanned once here
+        # (mtime order), then kept current as files are written, read and deleted
+        files = []
+        for path in self.directory.glob("*.mp3"):
+            stat = path.stat()
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        self.disk = OrderedDict((key, size) for _, key, size in sorted(files))
+        self.disk_bytes = sum(self.disk.values())
+        self.disk_lock = threading.Lock()
+
+    def path(self, key):
+        return self.directory / f"{key}.mp3"
+
+    async def speak(self, text):
+        key = hashlib.sha256(text.encode()).hexdigest()
+        audio = self.memory.get(key)
+        if audio is None:
+            audio = await self.flights.do(key, lambda: self._load(key, text))
+            self.memory.set(key, audio)
+        else:
+            self.sources["memory"] += 1
+        return audio
+
+    async def speak_sentences(self, sentences):
+        """Audio for each sentence, in order — the next max_workers are synthesized
+        while earlier ones are consumed, so the first arrives after one synthesis"""
+        sentences = iter(sentences)
+        pending = deque(asyncio.ensure_future(self.speak(s)) for s in islice(sentences, self.max_workers))
+        try:
+            while pending:
+                audio = await pending.popleft()
+                sentence = next(sentences, None)
+                if sentence is not None:
+                    pending.append(asyncio.ensure_future(self.speak(sentence)))
+                yield audio
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _load(self, key, text):
+        try:
+            audio = await asyncio.to_thread(self._read, key)
+            self.sources["disk"] += 1
+            return audio
+        except FileNotFoundError:
+            pass
+        audio = await asyncio.get_running_loop().run_in_executor(self.executor, self.synthesize, text)
+        self.sources["synthesized"] += 1
+        await asyncio.to_thread(self._store, key, audio)
+        return audio
+
+    def _read(self, key):
+        audio = self.path(key).read_bytes()
+        self._touch(key, len(audio))
+        return audio
+
+    def _store(self, key, audio):
+        # Write then rename, so a concurrent reader never sees a partial file
+        partial = self.directory / f"{key}.{uuid.uuid4().hex}.part"
+        partial.write_bytes(audio)
+        os.replace(partial, self.path(key))
+        self._touch(key, len(audio))
+        self._prune()
+
+    def _touch(self, key, size):
+        """Mark a file as just used; its mtime keeps that order across restarts"""
+        with self.disk_lock:
+            os.utime(self.path(key))
+            self.disk_bytes += size - self.disk.pop(key, 0)
+            self.disk[key] = size
+
+    def _prune(self):
+        """Delete the least recently used files until the disk cache is within
+        max_files and max_bytes"""
+        with self.disk_lock:
+            while self.disk and (len(self.disk) > self.max_files or self.disk_bytes > self.max_bytes):
+                key, size = self.disk.popitem(last=False)
+                self.disk_bytes -= size
+                self.path(key).unlink(missing_ok=True)
+
+    def stats(self):
+        return {"max_workers": self.max_workers, "memory": self.memory.stats(), "served_from": dict(self.sources)}
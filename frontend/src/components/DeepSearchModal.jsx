@@ -20,6 +20,72 @@ const renderInline = (text) => {
   );
 };
 
+// POST /deep-query/stream and hand each server-sent event to onEvent(event, data)
+// as it arrives — EventSource only does GET, so the stream is read by hand.
+const streamDeepQuery = async (body, onEvent) => {
+  const response = await fetch(`${API}/deep-query/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body)
+  });
+  if (!response.ok) {
+    const error = new Error(`Deep query failed with ${response.status}`);
+    error.status = response.status;
+    throw error;
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const event = raw.match(/^event: (.*)$/m)?.[1];
+      const data = raw.match(/^data: (.*)$/m)?.[1];
+      if (event && data) onEvent(event, JSON.parse(data));
+    }
+  }
+};
+
+// POST /tts/stream into a MediaSource, so playback starts with the first sentence
+// instead of after the whole answer is synthesized. Returns the object URL to play,
+// or null where the browser can't stream MP3 that way. If the stream fails before
+// any audio arrives, onFail is called instead of ending the MediaSource.
+const streamSpeech = (text, signal, onFail) => {
+  if (!window.MediaSource || !MediaSource.isTypeSupported('audio/mpeg')) return null;
+  const mediaSource = new MediaSource();
+  let appended = false;
+  mediaSource.addEventListener('sourceopen', async () => {
+    const sourceBuffer = mediaSource.addSourceBuffer('audio/mpeg');
+    try {
+      const response = await fetch(`${API}/tts/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ text }),
+        signal
+      });
+      if (!response.ok) throw new Error(`TTS failed with ${response.status}`);
+      const reader = response.body.getReader();
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        sourceBuffer.appendBuffer(value);
+        appended = true;
+        await new Promise((resolve) => sourceBuffer.addEventListener('updateend', resolve, { once: true }));
+      }
+      mediaSource.endOfStream();
+    } catch (error) {
+      if (!appended && !signal.aborted) onFail();
+      else if (mediaSource.readyState === 'open') mediaSource.endOfStream('network');
+    }
+  }, { once: true });
+  return URL.createObjectURL(mediaSource);
+};
+
 const MessageContent = ({ text }) => {
   const lines = text.split('\n');
   const blocks = [];
@@ -136,9 +202,11 @@ const DeepSearchModal = ({ open, onClose }) => {
   const [uploadedFile, setUploadedFile] = useState(null);
   const [isAnalyzing, setIsAnalyzing] = useState(false);
   const [isFullscreen, setIsFullscreen] = useState(false);
-  const [conversationHistory, setConversationHistory] = useState([]); // For context memory
+  const [conversationHistory, setConversationHistory] = useState([]); // For context memory without a session
+  const sessionRef = useRef(null); // Server-side DocAssist conversation (history + cached chart)
   const recognitionRef = useRef(null);
   const audioRef = useRef(null);
+  const speechAbortRef = useRef(null); // Cancels the TTS stream feeding audioRef
   const messagesEndRef = useRef(null);
   const fileInputRef = useRef(null);
 
@@ -187,6 +255,7 @@ const DeepSearchModal = ({ open, onClose }) => {
       if (recognitionRef.current) {
         recognitionRef.current.abort();
       }
+      speechAbortRef.current?.abort();
       if (audioRef.current) {
         audioRef.current.pause();
       }
@@ -222,11 +291,16 @@ const DeepSearchModal = ({ open, onClose }) => {
       audioRef.current.pause();
       audioRef.current = null;
     }
+    speechAbortRef.current?.abort();
+    const controller = new AbortController();
+    speechAbortRef.current = controller;
 
-    try {
-      setIsSpeaking(true);
-      const response = await axios.post(`${API}/tts`, { text }, { responseType: 'blob' });
-      const url = URL.createObjectURL(response.data);
+    const fail = (error) => {
+      if (error.name === 'AbortError' || axios.isCancel(error)) return;  // stopped or replaced
+      setIsSpeaking(false);
+      console.error('TTS error:', error);
+    };
+    const play = (url) => {
       const audio = new Audio(url);
       audioRef.current = audio;
 
@@ -239,14 +313,31 @@ const DeepSearchModal = ({ open, onClose }) => {
         URL.revokeObjectURL(url);
       };
 
-      await audio.play();
+      return audio.play();
+    };
+    const playWhole = async () => {
+      const response = await axios.post(`${API}/tts`, { text }, { responseType: 'blob', signal: controller.signal });
+      await play(URL.createObjectURL(response.data));
+    };
+
+    try {
+      setIsSpeaking(true);
+      const url = streamSpeech(text, controller.signal, () => {
+        // Nothing could be streamed: drop the empty stream and fetch the whole MP3
+        const stream = audioRef.current;
+        stream.onerror = null;
+        stream.pause();
+        URL.revokeObjectURL(url);
+        playWhole().catch(fail);
+      });
+      await (url ? play(url) : playWhole());
     } catch (error) {
-      setIsSpeaking(false);
-      console.error('TTS error:', error);
+      fail(error);
     }
   };
 
   const stopSpeaking = () => {
+    speechAbortRef.current?.abort();
     if (audioRef.current) {
       audioRef.current.pause();
       audioRef.current = null;
@@ -287,9 +378,27 @@ const DeepSearchModal = ({ open, onClose }) => {
     }
   };
 
+  // Follow-ups go through a server-side session when the server can cache the
+  // patient's chart; otherwise (session_id null, or the request failed) the recent
+  // history is sent along with each question
+  const startSession = async (patientId) => {
+    const response = await axios.post(`${API}/docassist/sessions`, { patient_id: patientId });
+    sessionRef.current = response.data.session_id;
+    return sessionRef.current;
+  };
+
+  const endSession = () => {
+    if (sessionRef.current) {
+      axios.delete(`${API}/docassist/sessions/${sessionRef.current}`).catch(() => {});
+      sessionRef.current = null;
+    }
+  };
+
   const handleConfirmPatient = () => {
     setStep('chat');
+    endSession();
     setConversationHistory([]); // Reset conversation history for new patient
+    startSession(patientData.profile.patient_id).catch(() => {});
     const welcomeMsg = `Hello! I'm DocAssist, your AI clinical assistant. I have access to all medical records for ${patientData.profile.name} (${patientData.profile.patient_id}). You can ask me anything about their reports, tests, treatments, or medical history. You can also upload medical images or PDFs for AI analysis. How can I help you today?`;
     setMessages([{
       role: 'assistant',
@@ -310,39 +419,69 @@ const DeepSearchModal = ({ open, onClose }) => {
     setLoading(true);
 
     try {
-      // Build context from conversation history for follow-up questions
-      const contextPrompt = conversationHistory.length > 0 
+      // The answer bubble appears with the evidence cards as soon as the context
+      // event lands, then fills in token by token
+      let answer = '';
+      let streamError = null;
+      let finished = false;
+      const updateAnswer = (patch) => setMessages(prev => [...prev.slice(0, -1), { ...prev[prev.length - 1], ...patch }]);
+      const onEvent = (event, data) => {
+        if (event === 'context') {
+          setMessages(prev => [...prev, {
+            role: 'assistant',
+            content: '',
+            evidence: data.evidence,
+            departments: data.matched_departments,
+            streaming: true
+          }]);
+        } else if (event === 'token') {
+          answer += data.text;
+          updateAnswer({ content: answer });
+        } else if (event === 'done') {
+          answer = data.answer;
+          finished = true;
+          updateAnswer({ content: answer, streaming: false });
+        } else if (event === 'error') {
+          streamError = data;
+        }
+      };
+      // Build context from conversation history when there's no session to keep it
+      const contextPrompt = conversationHistory.length > 0
         ? `Previous conversation context:\n${conversationHistory.slice(-6).map(h => `${h.role}: ${h.content}`).join('\n')}\n\nCurrent question: ${currentQuestion}`
         : currentQuestion;
-
-      const response = await axios.post(`${API}/deep-query`, {
+      const ask = (sessionId) => streamDeepQuery({
         patient_id: patientData.profile.patient_id,
-        question: contextPrompt
-      });
-
-      const assistantMessage = {
-        role: 'assistant',
-        content: response.data.answer,
-        evidence: response.data.evidence,
-        departments: response.data.matched_departments
-      };
+        question: sessionId ? currentQuestion : contextPrompt,
+        session_id: sessionId
+      }, onEvent);
+      try {
+        await ask(sessionRef.current);
+      } catch (error) {
+        // The session expired (idle too long, or the server restarted) — start a fresh one
+        if (error.status !== 404 || !sessionRef.current) throw error;
+        await ask(await startSession(patientData.profile.patient_id));
+      }
+      if (streamError) {
+        const error = new Error(streamError.detail);
+        error.status = streamError.status;
+        throw error;
+      }
+      // The connection dropped mid-answer — don't leave the bubble streaming forever
+      if (!finished) throw new Error('The answer stream ended before it was done');
 
-      setMessages(prev => [...prev, assistantMessage]);
-      
-      // Update conversation history for context memory
       setConversationHistory(prev => [
-        ...prev, 
+        ...prev,
         { role: 'user', content: currentQuestion },
-        { role: 'assistant', content: response.data.answer }
+        { role: 'assistant', content: answer }
       ]);
-      
-      speak(response.data.answer);
+
+      speak(answer);
     } catch (error) {
-      const errorMsg = error.response?.status === 503
+      const errorMsg = error.status === 503
         ? "The AI is temporarily overloaded — please try again in a moment."
         : "Sorry, I encountered an error processing your question. Please try again.";
       toast.error(errorMsg);
-      setMessages(prev => [...prev, { role: 'assistant', content: errorMsg }]);
+      setMessages(prev => [...prev.filter(m => !m.streaming), { role: 'assistant', content: errorMsg }]);
     } finally {
       setLoading(false);
     }
@@ -390,6 +529,7 @@ const DeepSearchModal = ({ open, onClose }) => {
       formData.append('file', uploadedFile);
       formData.append('patient_id', patientData.profile.patient_id);
       formData.append('question', analysisQuestion);
+      if (sessionRef.current) formData.append('session_id', sessionRef.current);
 
       const response = await axios.post(`${API}/analyze-document`, formData, {
         headers: {
@@ -406,14 +546,13 @@ const DeepSearchModal = ({ open, onClose }) => {
       };
 
       setMessages(prev => [...prev, analysisMsg]);
-      
-      // Add to conversation history
+
       setConversationHistory(prev => [
         ...prev,
         { role: 'user', content: `Analyzing file: ${uploadedFile.name}. ${analysisQuestion}` },
         { role: 'assistant', content: response.data.analysis }
       ]);
-      
+
       speak(response.data.analysis);
       setUploadedFile(null);
       if (fileInputRef.current) {
@@ -458,7 +597,8 @@ const DeepSearchModal = ({ open, onClose }) => {
     setMessages([]);
     setQuestion('');
     setUploadedFile(null);
-    setConversationHistory([]); // Clear conversation history on close
+    setConversationHistory([]);
+    endSession();
     setIsFullscreen(false);
     onClose();
   };
@@ -674,7 +814,7 @@ const DeepSearchModal = ({ open, onClose }) => {
                     </div>
                   </div>
                 ))}
-                {(loading || isAnalyzing) && (
+                {(loading || isAnalyzing) && !messages[messages.length - 1]?.streaming && (
                   <div className="flex justify-start">
                     <div className="bg-white border border-gray-200 p-4 rounded-lg">
                       <div className="flex items-center space-x-2">
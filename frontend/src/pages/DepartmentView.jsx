@@ -2,6 +2,7 @@ import React, { useEffect, useState } from 'react';
 import { useNavigate, useParams } from 'react-router-dom';
 import { Button } from '../components/ui/button';
 import { Card } from '../components/ui/card';
+import { Input } from '../components/ui/input';
 import {
   Table,
   TableBody,
@@ -20,19 +21,35 @@ const DepartmentView = () => {
   const navigate = useNavigate();
   const { departmentName } = useParams();
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [data, setData] = useState(null);
-  const [sortConfig, setSortConfig] = useState({ key: null, direction: 'asc' });
+  // The server sorts and filters; every page, including the ones loadMore
+  // appends, is requested with the same sort and filters
+  const [sortConfig, setSortConfig] = useState({ key: 'date', direction: 'asc' });
+  const emptyFilters = { date_from: '', date_to: '', doctor: '', test_name: '', result: '' };
+  const [filterInputs, setFilterInputs] = useState(emptyFilters);
+  const [filters, setFilters] = useState(emptyFilters);
+  const hasFilters = Object.values(filters).some(Boolean);
 
   useEffect(() => {
     if (departmentName) {
       fetchDepartmentData();
     }
-  }, [departmentName]);
+  }, [departmentName, sortConfig, filters]);
 
+  const queryParams = () => {
+    const params = { sort: sortConfig.key, order: sortConfig.direction };
+    Object.entries(filters).forEach(([key, value]) => {
+      if (value) params[key] = value;
+    });
+    return params;
+  };
+
+  // A new sort or filter starts again from the first page
   const fetchDepartmentData = async () => {
     setLoading(true);
     try {
-      const response = await axios.get(`${API}/department/${departmentName}`);
+      const response = await axios.get(`${API}/department/${departmentName}`, { params: queryParams() });
       setData(response.data);
     } catch (error) {
       console.error('Error fetching department data:', error);
@@ -42,6 +59,35 @@ const DepartmentView = () => {
     }
   };
 
+  // The API pages records; append the next page to what's already shown
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const response = await axios.get(`${API}/department/${departmentName}`, {
+        params: { ...queryParams(), cursor: data.next_cursor }
+      });
+      setData({
+        ...response.data,
+        records: [...data.records, ...response.data.records]
+      });
+    } catch (error) {
+      console.error('Error fetching department data:', error);
+      toast.error('Error fetching department records');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const applyFilters = (event) => {
+    event.preventDefault();
+    setFilters({ ...filterInputs });
+  };
+
+  const clearFilters = () => {
+    setFilterInputs(emptyFilters);
+    setFilters(emptyFilters);
+  };
+
   const formatDate = (dateString) => {
     if (!dateString) return 'N/A';
     const date = new Date(dateString);
@@ -96,39 +142,6 @@ const DepartmentView = () => {
     setSortConfig({ key, direction });
   };
 
-  const getSortedRecords = () => {
-    if (!data || !data.records) return [];
-    
-    const sortedRecords = [...data.records];
-    
-    if (sortConfig.key) {
-      sortedRecords.sort((a, b) => {
-        let aValue, bValue;
-        
-        if (sortConfig.key === 'date') {
-          aValue = new Date(a.treatment_date || a.test_date);
-          bValue = new Date(b.treatment_date || b.test_date);
-        } else if (sortConfig.key === 'patient_id') {
-          aValue = a.patient_id;
-          bValue = b.patient_id;
-        } else if (sortConfig.key === 'name') {
-          aValue = a.name.toLowerCase();
-          bValue = b.name.toLowerCase();
-        }
-        
-        if (aValue < bValue) {
-          return sortConfig.direction === 'asc' ? -1 : 1;
-        }
-        if (aValue > bValue) {
-          return sortConfig.direction === 'asc' ? 1 : -1;
-        }
-        return 0;
-      });
-    }
-    
-    return sortedRecords;
-  };
-
   const SortIcon = ({ columnKey }) => {
     if (sortConfig.key !== columnKey) {
       return (
@@ -166,7 +179,7 @@ const DepartmentView = () => {
     );
   }
 
-  if (!data || !data.records || data.records.length === 0) {
+  if (!data || !data.records || (data.records.length === 0 && !hasFilters)) {
     return (
       <div className="min-h-screen flex items-center justify-center p-4" style={{
         background: 'linear-gradient(135deg, #e8f4f8 0%, #f0f9fc 100%)'
@@ -192,7 +205,6 @@ const DepartmentView = () => {
 
   const deptInfo = getDepartmentInfo();
   const isTreatment = departmentName === 'treatment';
-  const sortedRecords = getSortedRecords();
 
   return (
     <div className="min-h-screen p-4 py-8" style={{
@@ -292,6 +304,41 @@ const DepartmentView = () => {
         {/* Records Table */}
         <Card className="p-6 bg-white shadow-lg border-0">
           <h2 className="text-2xl font-bold text-gray-800 mb-6">All Patient Records</h2>
+          <form onSubmit={applyFilters} className="grid grid-cols-2 md:grid-cols-6 gap-3 mb-6" data-testid="record-filters">
+            <Input
+              type="date"
+              value={filterInputs.date_from}
+              onChange={(e) => setFilterInputs({ ...filterInputs, date_from: e.target.value })}
+              aria-label="From date"
+            />
+            <Input
+              type="date"
+              value={filterInputs.date_to}
+              onChange={(e) => setFilterInputs({ ...filterInputs, date_to: e.target.value })}
+              aria-label="To date"
+            />
+            <Input
+              placeholder="Doctor"
+              value={filterInputs.doctor}
+              onChange={(e) => setFilterInputs({ ...filterInputs, doctor: e.target.value })}
+            />
+            <Input
+              placeholder={isTreatment ? 'Treatment name' : 'Test name'}
+              value={filterInputs.test_name}
+              onChange={(e) => setFilterInputs({ ...filterInputs, test_name: e.target.value })}
+            />
+            <Input
+              placeholder="Result contains"
+              value={filterInputs.result}
+              onChange={(e) => setFilterInputs({ ...filterInputs, result: e.target.value })}
+            />
+            <div className="flex gap-2">
+              <Button type="submit" className="bg-teal-600 hover:bg-teal-700">Filter</Button>
+              {hasFilters && (
+                <Button type="button" variant="outline" onClick={clearFilters}>Clear</Button>
+              )}
+            </div>
+          </form>
           <div className="overflow-x-auto">
             <Table>
               <TableHeader>
@@ -340,7 +387,7 @@ const DepartmentView = () => {
                 </TableRow>
               </TableHeader>
               <TableBody>
-                {sortedRecords.map((record, index) => (
+                {data.records.map((record, index) => (
                   <TableRow key={index} data-testid={`record-${index}`} className="hover:bg-gray-50">
                     <TableCell className="font-medium">
                       {formatDate(isTreatment ? record.treatment_date : record.test_date)}
@@ -388,9 +435,27 @@ const DepartmentView = () => {
                     )}
                   </TableRow>
                 ))}
+                {data.records.length === 0 && (
+                  <TableRow>
+                    <TableCell colSpan={isTreatment ? 7 : 6} className="text-center text-gray-500 py-8">
+                      No records match these filters
+                    </TableCell>
+                  </TableRow>
+                )}
               </TableBody>
             </Table>
           </div>
+          {data.next_cursor && (
+            <div className="flex justify-center p-4">
+              <Button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="bg-teal-600 hover:bg-teal-700"
+              >
+                {loadingMore ? 'Loading...' : `Load more (${data.records.length} of ${data.total})`}
+              </Button>
+            </div>
+          )}
         </Card>
       </div>
     </div>
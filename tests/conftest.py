@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Unit tests import backend modules (llm, cache, ...) directly, the way server.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
@@ -0,0 +1,37 @@
+"""
+TTLCache tests — LRU eviction, expiry and the on_evict hook. No server needed.
+"""
+
+import time
+
+from cache import TTLCache
+
+class TestTTLCache:
+    """Entries are dropped least recently used first, or once older than the TTL"""
+
+    def test_lru_eviction_calls_on_evict(self):
+        """Test that the least recently used entry is evicted and reported"""
+        evicted = []
+        cache = TTLCache(maxsize=2, ttl=60, on_evict=lambda key, value: evicted.append((key, value)))
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert evicted == [("b", 2)]
+        assert cache.get("a") == 1 and cache.get("b") is None and cache.get("c") == 3
+
+    def test_expired_entries_are_reported_once(self):
+        """Test that an expired entry found by get or pop is reported, and a live pop isn't"""
+        evicted = []
+        cache = TTLCache(maxsize=4, ttl=0.05, on_evict=lambda key, value: evicted.append(key))
+        cache.set("a", 1)
+        cache.set("b", 2)
+        time.sleep(0.1)
+        cache.set("c", 3)
+
+        assert cache.get("a") is None and cache.get("a") is None
+        assert cache.pop("b") is None
+        assert cache.pop("c") == 3
+        assert evicted == ["a", "b"]
+        print(f"✓ Expired entries reported: {evicted}")
@@ -0,0 +1,66 @@
+"""
+Patient context tests — what encode_patient_context puts in a DocAssist prompt and
+what it leaves out to stay within the token budget. No database or API key needed.
+"""
+
+from context import encode_patient_context, estimate_tokens
+
+PROFILE = {"name": "Maria Lopez", "patient_id": "P1001", "age": 58, "gender": "Female",
+           "blood_group": "O+", "address": "12 Elm St", "phone": "555-0100", "registration_date": "2024-11-02"}
+
+def blood_test(day, result="Normal"):
+    return {"_id": f"id{day}", "patient_id": "P1001", "name": "Maria Lopez",
+            "test_name": "Complete Blood Count", "test_date": f"2025-01-{day:02d}", "result": result,
+            "doctor": "Dr. Patel", "report_image": f"https://images.example.com/cbc-{day}.png",
+            "result_category": "normal"}
+
+RECORDS = [blood_test(day, "Neutropenia — WBC 2.1" if day == 3 else "Normal") for day in range(1, 31)]
+
+def context_for(records, question="", budget=None):
+    return encode_patient_context(PROFILE, [("Blood Profile", "test_date", records, len(records))],
+                                  question, budget)
+
+class TestEncodePatientContext:
+    """Compact tables, trimmed to the budget by relevance then recency"""
+
+    def test_everything_fits_without_a_budget(self):
+        """Test that with no budget every row is rendered"""
+        context = context_for(RECORDS)
+        assert "BLOOD PROFILE RECORDS (all 30):" in context
+        assert all(r["test_date"] in context for r in RECORDS)
+
+    def test_budget_is_enforced(self):
+        """Test that the rendered context never exceeds the token budget"""
+        full = estimate_tokens(context_for(RECORDS))
+        for budget in (full // 4, full // 2, full - 1):
+            context = context_for(RECORDS, budget=budget)
+            assert estimate_tokens(context) <= budget
+            assert "the rest not shown" in context
+        print(f"✓ {full}-token context trimmed to fit each budget")
+
+    def test_relevant_then_recent_rows_are_kept(self):
+        """Test that a row mentioning the question survives, and the rest are the newest"""
+        context = context_for(RECORDS, "Any neutropenia?", budget=estimate_tokens(context_for(RECORDS)) // 3)
+        kept = [r["test_date"] for r in RECORDS if r["test_date"] in context]
+
+        assert "2025-01-03" in kept
+        others = [date for date in kept if date != "2025-01-03"]
+        assert others == [r["test_date"] for r in RECORDS][-len(others):]
+        assert len(others) < len(RECORDS) - 1
+        # Kept rows keep their order
+        assert context.index("2025-01-03") < context.index(others[0])
+
+    def test_omitted_fields(self):
+        """Test that image URLs, ids, categories and the repeated name never reach the prompt"""
+        context = context_for(RECORDS)
+        assert "report_image" not in context and "https://" not in context
+        assert "result_category" not in context and "_id" not in context
+        # Name and patient ID appear once, in the profile, not on every row
+        assert context.count("Maria Lopez") == 1
+        assert context.count("P1001") == 1
+        assert "test_date | test_name | result | doctor" in context
+
+    def test_department_with_no_records(self):
+        """Test that an empty department is listed as having none"""
+        context = encode_patient_context(PROFILE, [("MRI", "test_date", [], 0)])
+        assert "MRI RECORDS: none" in context
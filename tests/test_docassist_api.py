@@ -13,9 +13,25 @@ import pytest
 import requests
 import os
 import time
+import json
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
 
+@pytest.fixture
+def add_record():
+    """POST a department record for the test; every record added is deleted again
+    afterwards, so the seeded patients don't drift from run to run"""
+    added = []
+    def add(department, record):
+        response = requests.post(f"{BASE_URL}/api/department/{department}/records", json=record)
+        if response.status_code == 200:
+            added.append((department, response.json()["id"]))
+        return response
+    yield add
+    for department, record_id in added:
+        requests.delete(f"{BASE_URL}/api/department/{department}/records/{record_id}")
+
 class TestHealthAndAuth:
     """Health check and authentication tests"""
     
@@ -151,6 +167,72 @@ class TestPatientSearch:
             print(f"✓ Partial name search for '{partial_name}' returned results")
 
 
+class TestTwoPhaseSearch:
+    """Candidate resolution + single-patient record fetch"""
+
+    def test_name_search_records_belong_to_profile(self):
+        """Test that records only come from the returned profile's patient"""
+        response = requests.get(f"{BASE_URL}/api/search?term=Smith&page_size=5")
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["candidates"]) <= 5
+        assert data["total_candidates"] >= len(data["candidates"])
+        if data["profile"]:
+            assert data["profile"]["patient_id"] == data["candidates"][0]["patient_id"]
+            for key in ["mri_records", "xray_records", "ecg_records", "treatment_records",
+                        "blood_profile_records", "ct_scan_records"]:
+                assert all(r["patient_id"] == data["profile"]["patient_id"] for r in data[key])
+        print(f"✓ 'Smith' matched {data['total_candidates']} patients, records fetched for one")
+
+    def test_search_pagination(self):
+        """Test that candidate pages don't overlap"""
+        first = requests.get(f"{BASE_URL}/api/search?term=Smith&page=1&page_size=2").json()
+        second = requests.get(f"{BASE_URL}/api/search?term=Smith&page=2&page_size=2").json()
+        first_ids = {c["patient_id"] for c in first["candidates"]}
+        second_ids = {c["patient_id"] for c in second["candidates"]}
+        assert not first_ids & second_ids
+
+
+class TestPatientSuggest:
+    """Typeahead endpoint tests"""
+
+    def test_suggest_by_name_prefix(self):
+        """Test that suggestions match a name prefix and respect the limit"""
+        response = requests.get(f"{BASE_URL}/api/patients/suggest?q=jam&limit=5")
+        assert response.status_code == 200
+        suggestions = response.json()["suggestions"]
+        assert len(suggestions) <= 5
+        for s in suggestions:
+            assert any(part.lower().startswith("jam") for part in s["name"].split())
+        print(f"✓ Name prefix 'jam' suggested {len(suggestions)} patients")
+
+    def test_suggest_by_patient_id_prefix(self):
+        """Test that an ID prefix suggests matching patient IDs"""
+        response = requests.get(f"{BASE_URL}/api/patients/suggest?q=P100")
+        assert response.status_code == 200
+        suggestions = response.json()["suggestions"]
+        assert suggestions
+        assert all(s["patient_id"].startswith("P100") for s in suggestions)
+
+    def test_suggest_lone_p_is_a_name_prefix(self):
+        """Test that "p" suggests names starting with P, not every patient ID"""
+        response = requests.get(f"{BASE_URL}/api/patients/suggest?q=p")
+        assert response.status_code == 200
+        for s in response.json()["suggestions"]:
+            assert any(part.lower().startswith("p") for part in s["name"].split())
+
+    def test_suggest_limit_is_bounded(self):
+        """Test that oversized limits are rejected"""
+        response = requests.get(f"{BASE_URL}/api/patients/suggest?q=a&limit=500")
+        assert response.status_code == 422
+
+    def test_search_regex_characters_are_literal(self):
+        """Test that regex metacharacters in the search term don't error"""
+        response = requests.get(f"{BASE_URL}/api/search?term=(.*")
+        assert response.status_code == 200
+        assert response.json()["profile"] is None
+
+
 class TestEvidenceCardsWithDoctorAndReportImage:
     """Test that evidence cards include doctor field and report_image for View Report feature"""
     
@@ -270,7 +352,48 @@ class TestDeepQuery:
             for ev in data["evidence"][:2]:
                 if "medicines" in ev:
                     print(f"  - Evidence includes medicines: {ev.get('medicines', 'N/A')}")
-    
+
+    def test_deep_query_evidence_is_ranked(self):
+        """Records matching the question come first, not whole departments"""
+        response = requests.post(f"{BASE_URL}/api/deep-query", json={
+            "patient_id": "P1001",
+            "question": "How has the CEA trended?"
+        })
+        assert response.status_code == 200
+        data = response.json()
+
+        assert data["matched_departments"] == ["Blood Profile"]
+        assert data["evidence"] and all("CEA" in ev["result"] for ev in data["evidence"])
+        print(f"✓ CEA question sent {len(data['evidence'])} matching records")
+
+    @pytest.mark.parametrize("question", ["What is neutropenia?", "What does CEA measure?"])
+    def test_general_question_sends_no_records(self, question):
+        """General medical questions don't pull in records that share a term"""
+        response = requests.post(f"{BASE_URL}/api/deep-query", json={
+            "patient_id": "P1001",
+            "question": question
+        })
+        assert response.status_code == 200
+        data = response.json()
+
+        assert data["evidence"] == []
+        assert data["matched_departments"] == []
+        print(f"✓ '{question}' answered without patient records")
+
+    def test_deep_query_lookup_answered_locally(self):
+        """Plain lookups are answered from the records, citing the record used"""
+        response = requests.post(f"{BASE_URL}/api/deep-query", json={
+            "patient_id": "P1001",
+            "question": "When was the last CT scan?"
+        })
+        assert response.status_code == 200
+        data = response.json()
+
+        assert data["matched_departments"] == ["CT Scan"]
+        assert len(data["evidence"]) == 1
+        assert data["answer"].startswith(f"Last {data['evidence'][0]['test_name']}: {data['evidence'][0]['test_date']}")
+        print(f"✓ Lookup answered locally: {data['answer'].splitlines()[0]}")
+
     def test_deep_query_nonexistent_patient(self):
         """Test deep query with non-existent patient"""
         response = requests.post(f"{BASE_URL}/api/deep-query", json={
@@ -292,6 +415,149 @@ class TestDeepQuery:
         print(f"✓ Empty question handled with status {response.status_code}")
 
 
+class TestDeepQueryStream:
+    """Server-sent-event variant of deep query"""
+
+    @staticmethod
+    def read_events(response):
+        events = []
+        for block in response.text.strip().split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in block.splitlines())
+            events.append((fields["event"], json.loads(fields["data"])))
+        return events
+
+    def test_stream_event_order(self):
+        """Test context first, then tokens, then done with the full answer"""
+        response = requests.post(f"{BASE_URL}/api/deep-query/stream", json={
+            "patient_id": "P1001", "question": "What are the latest blood results?"
+        }, stream=True)
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/event-stream")
+        events = self.read_events(response)
+        names = [name for name, _ in events]
+        assert names[0] == "context"
+        assert names[-1] == "done"
+        assert set(names[1:-1]) == {"token"}
+        assert "Blood Profile" in events[0][1]["matched_departments"]
+        tokens = "".join(data["text"] for name, data in events if name == "token")
+        assert tokens == events[-1][1]["answer"]
+        print(f"✓ Streamed answer in {len(names) - 2} token events")
+
+    def test_identical_streams_are_coalesced(self):
+        """Test that identical questions streamed at once share one Gemini stream"""
+        question = f"Summarize the blood results (run {time.time_ns()})"
+        before = requests.get(f"{BASE_URL}/api/cache/stats").json()["llm"]["stream_coalescing"]
+
+        def stream(_):
+            response = requests.post(f"{BASE_URL}/api/deep-query/stream", json={
+                "patient_id": "P1001", "question": question
+            })
+            assert response.status_code == 200
+            return self.read_events(response)[-1]
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            finals = list(pool.map(stream, range(4)))
+        assert all(name == "done" for name, _ in finals)
+        assert len({data["answer"] for _, data in finals}) == 1
+        after = requests.get(f"{BASE_URL}/api/cache/stats").json()["llm"]["stream_coalescing"]
+        # The rest joined the stream in flight, or found its answer cached
+        assert after["calls"] - before["calls"] == 1
+        print(f"✓ 4 streams, 1 Gemini stream ({after['coalesced'] - before['coalesced']} joined it)")
+
+    def test_stream_nonexistent_patient(self):
+        """Test that an unknown patient fails before streaming starts"""
+        response = requests.post(f"{BASE_URL}/api/deep-query/stream", json={
+            "patient_id": "INVALID999", "question": "Summarize"
+        })
+        assert response.status_code == 404
+
+
+class TestDocAssistSessions:
+    """Server-side conversations: context prepared once, history kept per session"""
+
+    def test_session_follow_up(self):
+        """Test that a session answers follow-ups and keeps its history"""
+        response = requests.post(f"{BASE_URL}/api/docassist/sessions", json={"patient_id": "P1001"})
+        assert response.status_code == 200
+        session = response.json()
+        if session["session_id"] is None:
+            # Chart below the context-cache minimum: the client keeps the history
+            assert session["context_cache"] is None and session["expires_in"] == 0
+            print("✓ Small chart answered without a session")
+            return
+        assert session["context_cache"] == "gemini"
+
+        for question in ["What are the latest blood results?", "And how did that compare to before?"]:
+            response = requests.post(f"{BASE_URL}/api/deep-query", json={
+                "patient_id": "P1001", "question": question, "session_id": session["session_id"]
+            })
+            assert response.status_code == 200
+            assert len(response.json()["answer"]) > 0
+        stats = requests.get(f"{BASE_URL}/api/cache/stats").json()["sessions"]
+        assert stats["size"] >= 1
+        print(f"✓ Two turns in a session with {session['context_cache']} context cache")
+
+        response = requests.delete(f"{BASE_URL}/api/docassist/sessions/{session['session_id']}")
+        assert response.status_code == 200
+
+    def test_unknown_session(self):
+        """Test that an ended or unknown session is a 404, so clients start a new one"""
+        response = requests.post(f"{BASE_URL}/api/deep-query", json={
+            "patient_id": "P1001", "question": "Summarize", "session_id": "no-such-session"
+        })
+        assert response.status_code == 404
+        assert requests.delete(f"{BASE_URL}/api/docassist/sessions/no-such-session").status_code == 404
+
+    def test_session_nonexistent_patient(self):
+        """Test that a session can't be opened for an unknown patient"""
+        response = requests.post(f"{BASE_URL}/api/docassist/sessions", json={"patient_id": "INVALID999"})
+        assert response.status_code == 404
+
+
+class TestCohortJobs:
+    """One question asked of every patient matching a filter, as a background job"""
+
+    def test_cohort_job_runs_to_completion(self):
+        """Test that a job answers each matching patient and reports progress"""
+        response = requests.post(f"{BASE_URL}/api/cohort/jobs", json={
+            "question": "Any neutropenia during chemotherapy?",
+            "filter": {"patient_ids": ["P1001", "P1002"]}
+        })
+        assert response.status_code == 202
+        job = response.json()
+        assert job["total"] == 2
+
+        for _ in range(60):
+            job = requests.get(f"{BASE_URL}/api/cohort/jobs/{job['job_id']}").json()
+            if job["status"] not in ("queued", "running"):
+                break
+            time.sleep(1)
+        assert job["status"] == "completed"
+        assert job["completed"] + job["failed"] == 2 and job["pending"] == 0
+        assert sorted(r["patient_id"] for r in job["results"]) == ["P1001", "P1002"]
+        print(f"✓ Cohort job answered {job['completed']} patients")
+
+    def test_cancel_cohort_job(self):
+        """Test that a job can be cancelled, and only once"""
+        response = requests.post(f"{BASE_URL}/api/cohort/jobs", json={
+            "question": "Summarize this patient's history", "filter": {"age_band": "60-69"}
+        })
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        response = requests.post(f"{BASE_URL}/api/cohort/jobs/{job_id}/cancel")
+        assert response.status_code == 200
+        assert requests.get(f"{BASE_URL}/api/cohort/jobs/{job_id}").json()["status"] == "cancelled"
+        assert requests.post(f"{BASE_URL}/api/cohort/jobs/{job_id}/cancel").status_code == 409
+
+    def test_cohort_job_bad_filter(self):
+        """Test that an unknown age band is a 400 and a filter matching nobody a 404"""
+        response = requests.post(f"{BASE_URL}/api/cohort/jobs", json={"question": "x", "filter": {"age_band": "90+"}})
+        assert response.status_code == 400
+        response = requests.post(f"{BASE_URL}/api/cohort/jobs", json={"question": "x", "filter": {"scenario": "none"}})
+        assert response.status_code == 404
+        assert requests.get(f"{BASE_URL}/api/cohort/jobs/no-such-job").status_code == 404
+
+
 class TestFileUploadAndAnalysis:
     """Test file upload and Gemini AI analysis - NEW FEATURE"""
     
@@ -422,6 +688,247 @@ class TestPatientAnalytics:
         print(f"  - Health trend: {data['health_trend']}")
         print(f"  - Departments: {data['departments_visited']}")
 
+    def test_analytics_totals_consistent(self):
+        """Test that aggregated counts agree with the timeline"""
+        data = requests.get(f"{BASE_URL}/api/analytics/P1001").json()
+        departments = data["departments_visited"]
+        assert data["total_visits"] == len(data["visit_timeline"]) == sum(departments.values())
+        assert data["total_tests"] == data["total_visits"] - departments["Treatment"]
+        assert data["treatment_summary"]["total"] == departments["Treatment"]
+        dates = [v["date"] for v in data["visit_timeline"]]
+        assert dates == sorted(dates)
+        assert data["recent_results"] == data["visit_timeline"][-5:]
+        print("✓ Analytics totals consistent with timeline")
+
+    def test_analytics_unknown_patient(self):
+        """Test that a patient without records gets empty analytics"""
+        response = requests.get(f"{BASE_URL}/api/analytics/P0000")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_visits"] == 0
+        assert data["visit_timeline"] == []
+        assert data["health_trend"] == "Stable"
+        print("✓ Unknown patient returns empty analytics")
+
+
+class TestBatchAnalytics:
+    """Analytics for many patients in one request"""
+
+    def test_batch_matches_single_endpoint(self):
+        """Test that each batch entry equals the per-patient response"""
+        patient_ids = ["P1001", "P1002", "P1003", "P1001"]
+        response = requests.post(f"{BASE_URL}/api/analytics/batch", json={"patient_ids": patient_ids})
+        assert response.status_code == 200
+        analytics = response.json()["analytics"]
+        assert list(analytics) == ["P1001", "P1002", "P1003"]
+        for pid, summary in analytics.items():
+            assert summary == requests.get(f"{BASE_URL}/api/analytics/{pid}").json()
+        print(f"✓ Batch analytics for {len(analytics)} patients")
+
+    def test_batch_unknown_patient(self):
+        """Test that unknown patients get empty analytics rather than failing the batch"""
+        response = requests.post(f"{BASE_URL}/api/analytics/batch", json={"patient_ids": ["P1001", "P0000"]})
+        assert response.status_code == 200
+        assert response.json()["analytics"]["P0000"]["total_visits"] == 0
+
+    def test_batch_requires_patient_ids(self):
+        """Test that an empty batch is rejected"""
+        response = requests.post(f"{BASE_URL}/api/analytics/batch", json={"patient_ids": []})
+        assert response.status_code == 422
+
+
+class TestTimelineUpdates:
+    """Materialized timeline stays current when records are added"""
+
+    def test_added_record_appears_in_analytics(self, add_record):
+        """Test that a new record is counted and placed in date order"""
+        before = requests.get(f"{BASE_URL}/api/analytics/P1001").json()
+        response = add_record("ecg", {
+            "patient_id": "P1001",
+            "test_name": "Resting ECG",
+            "test_date": "2000-01-01",
+            "result": "Normal sinus rhythm",
+            "doctor": "Dr. Patel",
+            "report_image": ""
+        })
+        assert response.status_code == 200
+        profile = requests.get(f"{BASE_URL}/api/search?term=P1001").json()["profile"]
+        assert response.json()["record"]["name"] == profile["name"]
+
+        after = requests.get(f"{BASE_URL}/api/analytics/P1001").json()
+        assert after["departments_visited"]["ECG"] == before["departments_visited"]["ECG"] + 1
+        assert after["total_visits"] == before["total_visits"] + 1
+        assert after["visit_timeline"][0]["date"] == "2000-01-01"
+        print("✓ New ECG record reflected in timeline analytics")
+
+    def test_deleted_record_leaves_timeline(self):
+        """Test that deleting an added record restores the patient's analytics"""
+        before = requests.get(f"{BASE_URL}/api/analytics/P1001").json()
+        record_id = requests.post(f"{BASE_URL}/api/department/ecg/records", json={
+            "patient_id": "P1001", "test_name": "Resting ECG", "test_date": "2000-01-01",
+            "result": "Normal sinus rhythm", "doctor": "Dr. Patel", "report_image": ""
+        }).json()["id"]
+        response = requests.delete(f"{BASE_URL}/api/department/ecg/records/{record_id}")
+        assert response.status_code == 200
+        assert requests.get(f"{BASE_URL}/api/analytics/P1001").json() == before
+        assert requests.delete(f"{BASE_URL}/api/department/ecg/records/{record_id}").status_code == 404
+
+    def test_add_record_unknown_patient(self):
+        """Test that records can't be added for a patient that doesn't exist"""
+        response = requests.post(f"{BASE_URL}/api/department/ecg/records", json={
+            "patient_id": "INVALID999", "test_name": "Resting ECG", "test_date": "2025-01-01",
+            "result": "Normal", "doctor": "Dr. Patel", "report_image": ""
+        })
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize("test_date", ["2025-13-01", "01/02/2025", ""])
+    def test_add_record_invalid_date(self, add_record, test_date):
+        """Test that a record's date must be a real YYYY-MM-DD date"""
+        response = add_record("ecg", {
+            "patient_id": "P1001", "test_name": "Resting ECG", "test_date": test_date,
+            "result": "Normal", "doctor": "Dr. Patel", "report_image": ""
+        })
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["loc"] == ["body", "test_date"]
+
+    def test_added_records_are_classified(self, add_record):
+        """Test that results are classified once, at ingest"""
+        test = add_record("ecg", {
+            "patient_id": "P1001", "test_name": "Resting ECG", "test_date": "2000-01-02",
+            "result": "ST depression in V4-V6", "doctor": "Dr. Patel", "report_image": ""
+        }).json()["record"]
+        assert test["result_category"] == "abnormal"
+        treatment = add_record("treatment", {
+            "patient_id": "P1001", "treatment_name": "Follow-up", "treatment_date": "2000-01-02",
+            "result": "Scheduled for next month", "doctor": "Dr. Patel", "medicines": "None"
+        }).json()["record"]
+        assert treatment["treatment_status"] == "scheduled"
+        print("✓ New records stored with result_category / treatment_status")
+
+
+class TestResponseCache:
+    """Read-through cache for search and analytics"""
+
+    def test_repeat_analytics_is_a_cache_hit(self):
+        """Test that repeating a request counts as a hit and returns the same body"""
+        first = requests.get(f"{BASE_URL}/api/analytics/P1002").json()
+        hits_before = requests.get(f"{BASE_URL}/api/cache/stats").json()["responses"]["hits"]
+        second = requests.get(f"{BASE_URL}/api/analytics/P1002").json()
+        stats = requests.get(f"{BASE_URL}/api/cache/stats").json()
+        assert second == first
+        assert stats["responses"]["hits"] == hits_before + 1
+        print(f"✓ Cache stats: {stats['responses']}")
+
+    def test_repeat_question_reuses_answer(self):
+        """Test that the same question, differently typed, returns the cached answer"""
+        first = requests.post(f"{BASE_URL}/api/deep-query", json={
+            "patient_id": "P1002", "question": "Any concerns?"
+        }).json()
+        hits_before = requests.get(f"{BASE_URL}/api/cache/stats").json()["answers"]["hits"]
+        second = requests.post(f"{BASE_URL}/api/deep-query", json={
+            "patient_id": "P1002", "question": "  any CONCERNS "
+        }).json()
+        assert second == first
+        assert requests.get(f"{BASE_URL}/api/cache/stats").json()["answers"]["hits"] == hits_before + 1
+        print("✓ Repeated question served from the answer cache")
+
+    def test_new_record_invalidates_answer(self, add_record):
+        """Test that adding a record for the patient bypasses the cached answer"""
+        question = {"patient_id": "P1002", "question": "Summarize the ECG history"}
+        requests.post(f"{BASE_URL}/api/deep-query", json=question)
+        add_record("ecg", {
+            "patient_id": "P1002", "test_name": "Resting ECG", "test_date": "2000-01-03",
+            "result": "Normal sinus rhythm", "doctor": "Dr. Kim", "report_image": ""
+        })
+        hits_before = requests.get(f"{BASE_URL}/api/cache/stats").json()["answers"]["hits"]
+        requests.post(f"{BASE_URL}/api/deep-query", json=question)
+        assert requests.get(f"{BASE_URL}/api/cache/stats").json()["answers"]["hits"] == hits_before
+
+
+class TestPrefetch:
+    """Speculative warm-up after a search resolves to one patient"""
+
+    def test_single_patient_search_prefetches(self, add_record):
+        """Test that an exact-ID search starts a warm-up and analytics then uses it"""
+        # A write bumps the data version, so the search below misses the response cache
+        add_record("blood_profile", {
+            "patient_id": "P1003", "test_name": "Complete Blood Count", "test_date": "2000-01-04",
+            "result": "Normal", "doctor": "Dr. Lee", "report_image": ""
+        })
+        before = requests.get(f"{BASE_URL}/api/cache/stats").json()["prefetch"]
+        response = requests.get(f"{BASE_URL}/api/search", params={"term": "P1003"})
+        assert response.json()["total_candidates"] == 1
+        started = requests.get(f"{BASE_URL}/api/cache/stats").json()["prefetch"]
+        assert started["started"] + started["skipped"] == before["started"] + before["skipped"] + 1
+
+        # Only a finished warm-up counts as used
+        for _ in range(50):
+            if requests.get(f"{BASE_URL}/api/cache/stats").json()["prefetch"]["in_flight"] == 0:
+                break
+            time.sleep(0.1)
+        requests.get(f"{BASE_URL}/api/analytics/P1003")
+        after = requests.get(f"{BASE_URL}/api/cache/stats").json()["prefetch"]
+        if started["started"] > before["started"]:
+            assert after["used"] == before["used"] + 1
+
+        # The same search again is a response-cache hit, and still warms the patient up
+        requests.get(f"{BASE_URL}/api/search", params={"term": "P1003"})
+        again = requests.get(f"{BASE_URL}/api/cache/stats").json()["prefetch"]
+        assert again["started"] + again["skipped"] == after["started"] + after["skipped"] + 1
+        print(f"✓ Prefetch stats: {again}")
+
+
+class TestConditionalGet:
+    """ETag / If-None-Match on read endpoints"""
+
+    @pytest.mark.parametrize("path", [
+        "/api/search?term=P1001",
+        "/api/analytics/P1001",
+        "/api/department/treatment?limit=20",
+        "/api/patients",
+    ])
+    def test_matching_etag_returns_304(self, path):
+        """Test that replaying the ETag gets an empty 304"""
+        response = requests.get(f"{BASE_URL}{path}")
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert etag.startswith('"')
+
+        conditional = requests.get(f"{BASE_URL}{path}", headers={"If-None-Match": etag})
+        assert conditional.status_code == 304
+        assert conditional.content == b""
+        print(f"✓ {path} revalidated with 304")
+
+    def test_write_changes_patient_etag(self, add_record):
+        """Test that adding a record changes that patient's ETag"""
+        etag = requests.get(f"{BASE_URL}/api/analytics/P1003").headers["ETag"]
+        add_record("blood_profile", {
+            "patient_id": "P1003", "test_name": "Complete Blood Count", "test_date": "2000-01-01",
+            "result": "Within Range", "doctor": "Dr. Kim", "report_image": ""
+        })
+        response = requests.get(f"{BASE_URL}/api/analytics/P1003", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+
+class TestResponseEncoding:
+    """Compression and MessagePack negotiation on record endpoints"""
+
+    def test_large_department_page_is_compressed(self):
+        """Test that a large page comes back gzip-encoded when asked for"""
+        response = requests.get(f"{BASE_URL}/api/department/treatment?limit=200",
+                                headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert len(response.json()["records"]) > 0
+
+    def test_msgpack_negotiation(self):
+        """Test that Accept: application/msgpack switches the body format"""
+        response = requests.get(f"{BASE_URL}/api/search?term=P1001",
+                                headers={"Accept": "application/msgpack"})
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == "application/msgpack"
+
 
 class TestDepartmentRecords:
     """Department-specific record tests"""
@@ -456,6 +963,48 @@ class TestDepartmentRecords:
             assert "medicines" in record
             print(f"  - Sample medicines: {record['medicines']}")
     
+    def test_department_pagination(self):
+        """Test that cursor pages are bounded, ordered and don't overlap"""
+        first = requests.get(f"{BASE_URL}/api/department/treatment?limit=10").json()
+        assert len(first["records"]) <= 10
+        assert first["next_cursor"]
+        second = requests.get(
+            f"{BASE_URL}/api/department/treatment", params={"limit": 10, "cursor": first["next_cursor"]}
+        ).json()
+        dates = [r["treatment_date"] for r in first["records"] + second["records"]]
+        assert dates == sorted(dates)
+        assert first["records"][-1] not in second["records"]
+        print(f"✓ Treatment pages: {len(first['records'])} + {len(second['records'])} of {first['total']}")
+
+    def test_department_filters(self):
+        """Test doctor + date range filters with descending order"""
+        response = requests.get(f"{BASE_URL}/api/department/mri", params={
+            "doctor": "Dr. Patel", "date_from": "2025-01-01", "date_to": "2025-12-31", "order": "desc"
+        })
+        assert response.status_code == 200
+        records = response.json()["records"]
+        assert all(r["doctor"] == "Dr. Patel" for r in records)
+        assert all("2025-01-01" <= r["test_date"] <= "2025-12-31" for r in records)
+        dates = [r["test_date"] for r in records]
+        assert dates == sorted(dates, reverse=True)
+
+    @pytest.mark.parametrize("sort", ["patient_id", "name"])
+    def test_department_sorted_by_patient(self, sort):
+        """Test that patient ID / name order holds across cursor pages"""
+        params = {"limit": 25, "sort": sort, "order": "desc"}
+        first = requests.get(f"{BASE_URL}/api/department/treatment", params=params).json()
+        second = requests.get(
+            f"{BASE_URL}/api/department/treatment", params={**params, "cursor": first["next_cursor"]}
+        ).json()
+        values = [r[sort] for r in first["records"] + second["records"]]
+        assert values == sorted(values, reverse=True)
+        print(f"✓ Treatment records by {sort}: {values[0]} .. {values[-1]}")
+
+    def test_department_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        response = requests.get(f"{BASE_URL}/api/department/mri?cursor=not-a-cursor")
+        assert response.status_code == 400
+
     def test_invalid_department(self):
         """Test getting invalid department"""
         response = requests.get(f"{BASE_URL}/api/department/invalid")
@@ -463,5 +1012,57 @@ class TestDepartmentRecords:
         print("✓ Invalid department correctly returns 404")
 
 
+class TestIndexes:
+    """Index bootstrap and query-plan report tests"""
+
+    def test_index_report(self):
+        """Test that declared indexes exist and patient lookups use them"""
+        response = requests.get(f"{BASE_URL}/api/indexes")
+        assert response.status_code == 200
+        data = response.json()
+        assert "patient_id_unique" in data["indexes"]["profiles"]
+        assert "patient_id_test_date" in data["indexes"]["mri_records"]
+        assert "patient_id_treatment_date" in data["indexes"]["treatment_records"]
+
+        plans = {q["query"]: q["indexes"] for q in data["queries"]}
+        assert plans["profile by patient_id"] == ["patient_id_unique"]
+        assert "patient_id_test_date" in plans["mri_records by patient_id"]
+        assert "scenario_age" in plans["cohort filter by scenario and age band"]
+        assert "status_lease_until" in plans["claim lapsed cohort jobs"]
+        print(f"✓ Index report covers {len(data['queries'])} query shapes")
+
+
+class TestCohortAnalytics:
+    """Hospital-wide cohort analytics tests"""
+
+    def test_cohort_default_grouping(self):
+        """Test scenario/age band/blood group breakdown covers every patient"""
+        response = requests.get(f"{BASE_URL}/api/cohort/analytics")
+        assert response.status_code == 200
+        data = response.json()
+        patients = requests.get(f"{BASE_URL}/api/patients").json()["patients"]
+        assert data["patients"] == len(patients)
+        assert data["group_by"] == ["scenario", "age_band", "blood_group"]
+        assert sum(g["patients"] for g in data["groups"]) == data["patients"]
+        assert sum(data["health_trend"].values()) == data["patients"]
+        for group in data["groups"]:
+            assert sum(group["health_trend"].values()) == group["patients"]
+        months = list(data["tests_per_department_per_month"])
+        assert months == sorted(months)
+        print(f"✓ Cohort analytics: {len(data['groups'])} groups over {data['patients']} patients")
+
+    def test_cohort_group_by_gender(self):
+        """Test a custom grouping"""
+        data = requests.get(f"{BASE_URL}/api/cohort/analytics?group_by=gender").json()
+        assert {g["gender"] for g in data["groups"]} <= {"Male", "Female"}
+        assert all(set(g) >= {"patients", "visits", "mean_visits", "tests", "health_trend"} for g in data["groups"])
+
+    def test_cohort_invalid_group_by(self):
+        """Test that unknown grouping fields are rejected"""
+        response = requests.get(f"{BASE_URL}/api/cohort/analytics?group_by=name")
+        assert response.status_code == 400
+        print("✓ Invalid group_by correctly returns 400")
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "--tb=short"])
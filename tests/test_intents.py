@@ -0,0 +1,71 @@
+"""
+Intent matcher tests — which DocAssist questions are answered from the records
+without the LLM, and what those answers say. No database or API key needed.
+"""
+
+import pytest
+
+from intents import Intent, answer_intent, match_intent
+
+CBC = [
+    {"test_name": "Complete Blood Count", "test_date": "2025-01-15", "result": "Normal",
+     "result_category": "normal", "doctor": "Dr. Patel"},
+    {"test_name": "Tumor Marker Panel", "test_date": "2025-02-10", "result": "CEA elevated (12.5 ng/mL)",
+     "result_category": "abnormal", "doctor": "Dr. Patel"},
+    {"test_name": "Complete Blood Count", "test_date": "2025-03-12", "result": "Neutropenia — WBC 2.1",
+     "result_category": "abnormal", "doctor": "Dr. Sullivan"},
+]
+
+class TestMatchIntent:
+    """Plain lookups match; anything needing judgement falls through"""
+
+    @pytest.mark.parametrize("question, intent", [
+        ("When was the last MRI?", Intent("date", "mri_records")),
+        ("latest CBC result?", Intent("latest", "blood_profile_records", "complete blood count")),
+        ("What medications is he on?", Intent("medications", "treatment_records")),
+        ("What did the latest chest CT show?", Intent("latest", "ct_scan_records", "chest")),
+        ("When did she last have a brain MRI", Intent("date", "mri_records", "brain")),
+        ("How many CT scans has he had?", Intent("count", "ct_scan_records")),
+        ("Can you tell me the latest LFT results?", Intent("latest", "blood_profile_records", "liver function")),
+    ])
+    def test_lookup_questions_match(self, question, intent):
+        assert match_intent(question) == intent
+
+    @pytest.mark.parametrize("question", [
+        "How has the tumor marker trended?",
+        "Any neutropenia during chemotherapy?",
+        "What is the latest on his chemo?",
+        "Latest blood results compared to baseline",
+        "Summarize this patient's history",
+        "hi",
+    ])
+    def test_other_questions_fall_through(self, question):
+        assert match_intent(question) is None
+
+class TestAnswerIntent:
+    """Answers cite the records they came from"""
+
+    def test_latest_with_previous(self):
+        """Test the latest result of a test, flagged, with the one before it"""
+        answer, evidence = answer_intent(match_intent("latest CBC"), CBC, "test_date", "test_name", "Blood Profile")
+        assert [r["test_date"] for r in evidence] == ["2025-03-12", "2025-01-15"]
+        assert answer.startswith("Latest: ⚠ Complete Blood Count — 2025-03-12: Neutropenia")
+        assert "Previous: Complete Blood Count — 2025-01-15: Normal" in answer
+
+    def test_no_matching_records(self):
+        """Test that a lookup with nothing on record says so"""
+        answer, evidence = answer_intent(match_intent("latest TSH"), CBC, "test_date", "test_name", "Blood Profile")
+        assert answer == "No Blood Profile records matching 'thyroid'."
+        assert evidence == []
+
+    def test_medications_from_latest_treatment(self):
+        """Test that medications come from the newest treatment that lists any"""
+        treatments = [
+            {"treatment_name": "Chemotherapy — FOLFOX Cycle 1", "treatment_date": "2025-02-01",
+             "medicines": "Oxaliplatin 85mg/m², Leucovorin 400mg/m²"},
+            {"treatment_name": "Follow-up", "treatment_date": "2025-03-01", "medicines": ""},
+        ]
+        answer, evidence = answer_intent(match_intent("current medications"), treatments,
+                                         "treatment_date", "treatment_name", "Treatment")
+        assert evidence == [treatments[0]]
+        assert answer.endswith("\n- Oxaliplatin 85mg/m²\n- Leucovorin 400mg/m²")
@@ -0,0 +1,397 @@
+"""
+LLM layer tests — SingleFlight and StreamFlight against a local stub LLM, AdaptiveLLM against a local
+stub Gemini HTTP server that injects 503s and latency. No API key needed.
+"""
+
+import json
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+from google import genai
+from google.genai import types as genai_types
+from google.genai import errors as genai_errors
+
+from llm import AdaptiveLLM, CircuitOpenError, SingleFlight, StreamFlight, retry_hint
+
+class StubLLM:
+    """Counts calls; each answer takes `delay` seconds, or fails with `error`"""
+
+    def __init__(self, delay=0.05, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def generate(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return f"answer to {prompt}"
+
+class TestSingleFlight:
+    """Identical concurrent requests share one call"""
+
+    def test_identical_requests_share_one_call(self):
+        """Test that concurrent identical requests make one LLM call"""
+        llm, flights = StubLLM(), SingleFlight()
+
+        async def run():
+            return await asyncio.gather(*(flights.do("k", lambda: llm.generate("q")) for _ in range(10)))
+
+        results = asyncio.run(run())
+        assert results == ["answer to q"] * 10
+        assert llm.calls == 1
+        assert flights.stats() == {"calls": 1, "coalesced": 9, "in_flight": 0}
+        print("✓ 10 concurrent requests, 1 LLM call")
+
+    def test_different_requests_are_not_coalesced(self):
+        """Test that different keys each get their own call"""
+        llm, flights = StubLLM(), SingleFlight()
+
+        async def run():
+            return await asyncio.gather(*(flights.do(q, lambda q=q: llm.generate(q)) for q in "abc"))
+
+        assert asyncio.run(run()) == ["answer to a", "answer to b", "answer to c"]
+        assert llm.calls == 3
+
+    def test_finished_calls_are_not_reused(self):
+        """Test that a request after the first one completes calls the LLM again"""
+        llm, flights = StubLLM(), SingleFlight()
+
+        async def run():
+            await flights.do("k", lambda: llm.generate("q"))
+            await flights.do("k", lambda: llm.generate("q"))
+
+        asyncio.run(run())
+        assert llm.calls == 2
+
+    def test_error_reaches_every_waiter(self):
+        """Test that a failed call raises in every waiter and isn't remembered"""
+        llm, flights = StubLLM(error=RuntimeError("overloaded")), SingleFlight()
+
+        async def run():
+            results = await asyncio.gather(*(flights.do("k", lambda: llm.generate("q")) for _ in range(5)),
+                                           return_exceptions=True)
+            llm.error = None
+            return results, await flights.do("k", lambda: llm.generate("q"))
+
+        results, retry = asyncio.run(run())
+        assert all(isinstance(r, RuntimeError) and str(r) == "overloaded" for r in results)
+        assert retry == "answer to q"
+        assert llm.calls == 2
+        print("✓ Error propagated to all 5 waiters; next request retried")
+
+    def test_cancelled_waiter_leaves_others_running(self):
+        """Test that cancelling one waiter doesn't cancel the shared call"""
+        llm, flights = StubLLM(), SingleFlight()
+
+        async def run():
+            first = asyncio.ensure_future(flights.do("k", lambda: llm.generate("q")))
+            second = asyncio.ensure_future(flights.do("k", lambda: llm.generate("q")))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+
+        assert asyncio.run(run()) == "answer to q"
+        assert llm.calls == 1
+
+    def test_last_waiter_cancelling_cancels_the_call(self):
+        """Test that the shared call is cancelled once nobody waits for it"""
+        llm, flights = StubLLM(delay=10), SingleFlight()
+        cancelled = []
+
+        async def generate():
+            try:
+                return await llm.generate("q")
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def run():
+            waiters = [asyncio.ensure_future(flights.do("k", generate)) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+            await asyncio.sleep(0)
+
+        asyncio.run(run())
+        assert cancelled == [True]
+        assert flights.stats()["in_flight"] == 0
+
+
+class TestStreamFlight:
+    """Identical concurrent streams share one upstream stream"""
+
+    @staticmethod
+    async def upstream(counter, parts="abc", delay=0.02, error=None):
+        counter.append(1)
+        for part in parts:
+            await asyncio.sleep(delay)
+            yield part
+        if error:
+            raise error
+
+    @staticmethod
+    async def read(stream):
+        return "".join([chunk async for chunk in stream])
+
+    def test_identical_streams_share_one_upstream(self):
+        """Test that concurrent readers, including a late one, all get every chunk"""
+        opened, flights = [], StreamFlight()
+
+        async def run():
+            readers = [asyncio.ensure_future(self.read(flights.stream("k", lambda: self.upstream(opened))))
+                       for _ in range(5)]
+            await asyncio.sleep(0.03)  # the late reader gets "a" replayed
+            late = await self.read(flights.stream("k", lambda: self.upstream(opened)))
+            return await asyncio.gather(*readers), late
+
+        readers, late = asyncio.run(run())
+        assert readers == ["abc"] * 5 and late == "abc"
+        assert len(opened) == 1
+        assert flights.stats() == {"calls": 1, "coalesced": 5, "in_flight": 0}
+        print("✓ 6 concurrent streams, 1 upstream stream")
+
+    def test_error_reaches_every_reader(self):
+        """Test that chunks before a failure are delivered, then the error is raised"""
+        opened, flights = [], StreamFlight()
+        received = []
+
+        async def read():
+            async for chunk in flights.stream("k", lambda: self.upstream(opened, error=RuntimeError("overloaded"))):
+                received.append(chunk)
+
+        async def run():
+            return await asyncio.gather(read(), read(), return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, RuntimeError) and str(r) == "overloaded" for r in results)
+        assert sorted(received) == sorted("abc" * 2)
+        assert len(opened) == 1
+
+    def test_last_reader_leaving_closes_the_upstream(self):
+        """Test that the upstream is closed once nobody reads it, and not before"""
+        closed, flights = [], StreamFlight()
+
+        async def upstream():
+            try:
+                for part in "abcdef":
+                    await asyncio.sleep(0.02)
+                    yield part
+            finally:
+                closed.append(True)
+
+        async def run():
+            first, second = flights.stream("k", upstream), flights.stream("k", upstream)
+            assert await anext(first) == "a" and await anext(second) == "a"
+            await first.aclose()
+            assert await anext(second) == "b" and not closed
+            await second.aclose()
+            await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+        assert closed == [True]
+        assert flights.stats()["in_flight"] == 0
+
+
+class StubGemini(ThreadingHTTPServer):
+    """Answers generateContent (and the SSE stream variant) like the Gemini API. Each
+    request takes `latency` seconds and pops the next status from `failures` — 503,
+    429 or 400 — answering normally once it's empty. Tracks peak concurrency."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubGeminiHandler)
+        self.latency = 0.0
+        self.failures = []
+        self.retry_delay = None
+        self.requests = 0
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with server.lock:
+            server.requests += 1
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            status = server.failures.pop(0) if server.failures else 200
+        time.sleep(server.latency)
+        with server.lock:
+            server.active -= 1
+
+        if status != 200:
+            error = {"code": status, "message": "injected", "status": "UNAVAILABLE"}
+            if server.retry_delay:
+                error["details"] = [{"@type": "type.googleapis.com/google.rpc.RetryInfo",
+                                     "retryDelay": server.retry_delay}]
+            self.reply(status, "application/json", json.dumps({"error": error}))
+        elif "alt=sse" in self.path:
+            self.reply(200, "text/event-stream", "".join(
+                f"data: {json.dumps({'candidates': [{'content': {'role': 'model', 'parts': [{'text': t}]}}]})}\n\n"
+                for t in ["Hgb ", "stable"]))
+        else:
+            self.reply(200, "application/json",
+                       json.dumps({"candidates": [{"content": {"role": "model", "parts": [{"text": "ok"}]}}]}))
+
+    def reply(self, status, content_type, body):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_gemini():
+    server = StubGemini()
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    client = genai.Client(api_key="test",
+                          http_options=genai_types.HttpOptions(base_url=f"http://127.0.0.1:{server.server_port}"))
+    yield server, client.aio.models
+    server.shutdown()
+    server.server_close()
+
+def generate(models):
+    return lambda: models.generate_content(model="stub", contents="hi")
+
+class TestAdaptiveLLM:
+    """Concurrency cap, backoff, circuit breaker and stats against a stub Gemini"""
+
+    def test_retries_503_then_succeeds(self, stub_gemini):
+        """Test that injected 503s are retried and the call still succeeds"""
+        server, models = stub_gemini
+        server.failures = [503, 503]
+        llm = AdaptiveLLM(base_delay=0.01)
+
+        result = asyncio.run(llm.call(generate(models)))
+        assert result.text == "ok"
+        assert server.requests == 3
+        stats = llm.stats()
+        assert stats["retries"] == 2 and stats["outcomes"] == {"ok": 1} and stats["state"] == "closed"
+        print(f"✓ Two 503s retried: {stats}")
+
+    def test_honors_retry_delay(self, stub_gemini):
+        """Test that a RetryInfo delay from the API is waited out"""
+        server, models = stub_gemini
+        server.failures = [429]
+        server.retry_delay = "0.3s"
+        llm = AdaptiveLLM(base_delay=0.01)
+
+        start = time.monotonic()
+        asyncio.run(llm.call(generate(models)))
+        assert time.monotonic() - start >= 0.3
+        assert server.requests == 2
+
+    def test_long_retry_delay_is_raised_at_once(self, stub_gemini):
+        """Test that an API ask to wait longer than max_delay isn't slept through"""
+        server, models = stub_gemini
+        server.failures = [429]
+        server.retry_delay = "60s"
+        llm = AdaptiveLLM(base_delay=0.01, max_delay=1.0)
+
+        start = time.monotonic()
+        with pytest.raises(genai_errors.ClientError) as raised:
+            asyncio.run(llm.call(generate(models)))
+        assert time.monotonic() - start < 1.0
+        assert server.requests == 1
+        assert retry_hint(raised.value) == 60.0
+
+    def test_concurrency_is_capped(self, stub_gemini):
+        """Test that a burst never has more than max_concurrency calls in flight"""
+        server, models = stub_gemini
+        server.latency = 0.05
+        llm = AdaptiveLLM(max_concurrency=3)
+
+        async def burst():
+            return await asyncio.gather(*(llm.call(generate(models)) for _ in range(12)))
+
+        assert len(asyncio.run(burst())) == 12
+        assert server.peak <= 3
+        print(f"✓ 12 calls, peak concurrency {server.peak}")
+
+    def test_breaker_fails_fast_then_recovers(self, stub_gemini):
+        """Test that repeated 503s open the circuit and a probe after cooldown closes it"""
+        server, models = stub_gemini
+        server.failures = [503] * 4
+        llm = AdaptiveLLM(max_attempts=2, base_delay=0.01, failure_threshold=4, cooldown=0.2)
+
+        async def run():
+            for _ in range(2):
+                with pytest.raises(genai_errors.ServerError):
+                    await llm.call(generate(models))
+            assert llm.state() == "open"
+            with pytest.raises(CircuitOpenError):
+                await llm.call(generate(models))
+            assert server.requests == 4
+            await asyncio.sleep(0.25)
+            assert llm.state() == "half_open"
+            return await llm.call(generate(models))
+
+        assert asyncio.run(run()).text == "ok"
+        stats = llm.stats()
+        assert stats["state"] == "closed"
+        assert stats["outcomes"] == {"overloaded": 2, "rejected": 1, "ok": 1}
+        print(f"✓ Breaker opened after 4 failures and closed after a probe: {stats}")
+
+    def test_client_errors_are_not_retried(self, stub_gemini):
+        """Test that a 400 is raised at once and doesn't count toward the breaker"""
+        server, models = stub_gemini
+        server.failures = [400]
+        llm = AdaptiveLLM(base_delay=0.01, failure_threshold=1)
+
+        with pytest.raises(genai_errors.ClientError):
+            asyncio.run(llm.call(generate(models)))
+        assert server.requests == 1
+        assert llm.state() == "closed"
+
+    def test_stream_retries_before_first_chunk(self, stub_gemini):
+        """Test that a stream opening with a 503 is retried and yields every chunk"""
+        server, models = stub_gemini
+        server.failures = [503]
+        llm = AdaptiveLLM(base_delay=0.01)
+
+        async def run():
+            stream = llm.stream(lambda: models.generate_content_stream(model="stub", contents="hi"))
+            return [chunk.text async for chunk in stream]
+
+        assert asyncio.run(run()) == ["Hgb ", "stable"]
+        assert server.requests == 2
+        assert llm.stats()["in_flight"] == 0
+
+    def test_stream_backoff_frees_its_slot(self, stub_gemini):
+        """Test that a stream waiting to retry doesn't hold the only concurrency slot"""
+        server, models = stub_gemini
+        server.failures = [503]
+        server.retry_delay = "0.3s"
+        llm = AdaptiveLLM(max_concurrency=1, base_delay=0.01)
+        finished = []
+
+        async def stream():
+            chunks = [chunk.text async for chunk in
+                      llm.stream(lambda: models.generate_content_stream(model="stub", contents="hi"))]
+            finished.append("stream")
+            return chunks
+
+        async def call():
+            await asyncio.sleep(0.1)
+            await llm.call(generate(models))
+            finished.append("call")
+
+        async def run():
+            return (await asyncio.gather(stream(), call()))[0]
+
+        assert asyncio.run(run()) == ["Hgb ", "stable"]
+        assert finished == ["call", "stream"]
+        assert llm.stats()["in_flight"] == 0
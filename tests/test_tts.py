@@ -0,0 +1,162 @@
+"""
+Text-to-speech tests — SpeechCache against a local stand-in for gTTS that takes a
+fixed time per call, like its network round trip. No network needed.
+"""
+
+import time
+import asyncio
+import threading
+
+from tts import SpeechCache, split_sentences
+
+class StubTTS:
+    """Blocking synthesize(): sleeps `delay` seconds, records peak concurrency"""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def synthesize(self, text):
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        return f"mp3:{text}".encode()
+
+class TestSpeechCache:
+    """Synthesis runs beside the event loop, and each text is synthesized once"""
+
+    def test_concurrent_requests_are_not_serialized(self, tmp_path):
+        """Test that four texts at once take about one synthesis, not four"""
+        stub = StubTTS()
+        speech = SpeechCache(stub.synthesize, tmp_path, max_workers=4)
+
+        async def main():
+            ticks = 0
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+            ticking = asyncio.create_task(ticker())
+            start = time.perf_counter()
+            audio = await asyncio.gather(*(speech.speak(f"answer {i}") for i in range(4)))
+            elapsed = time.perf_counter() - start
+            ticking.cancel()
+            return audio, elapsed, ticks
+
+        audio, elapsed, ticks = asyncio.run(main())
+        assert audio == [f"mp3:answer {i}".encode() for i in range(4)]
+        assert stub.peak == 4
+        assert elapsed < 2 * stub.delay
+        assert ticks >= 10  # the event loop kept running meanwhile
+        print(f"✓ 4 syntheses in {elapsed:.2f}s, peak {stub.peak} at once")
+
+    def test_pool_is_bounded(self, tmp_path):
+        """Test that no more than max_workers syntheses run at once"""
+        stub = StubTTS(delay=0.05)
+        speech = SpeechCache(stub.synthesize, tmp_path, max_workers=2)
+
+        async def main():
+            await asyncio.gather(*(speech.speak(f"answer {i}") for i in range(6)))
+
+        asyncio.run(main())
+        assert stub.calls == 6
+        assert stub.peak == 2
+
+    def test_replay_is_cached(self, tmp_path):
+        """Test that a repeat is served from memory, and after a restart from disk"""
+        stub = StubTTS(delay=0.05)
+        speech = SpeechCache(stub.synthesize, tmp_path)
+
+        async def main(speech):
+            return await asyncio.gather(*(speech.speak("same answer") for _ in range(3)))
+
+        assert asyncio.run(main(speech)) == [b"mp3:same answer"] * 3
+        assert asyncio.run(main(speech)) == [b"mp3:same answer"] * 3
+        assert stub.calls == 1
+        assert speech.stats()["served_from"] == {"synthesized": 1, "memory": 3}
+
+        restarted = SpeechCache(stub.synthesize, tmp_path)
+        assert asyncio.run(main(restarted)) == [b"mp3:same answer"] * 3
+        assert stub.calls == 1
+        assert restarted.stats()["served_from"] == {"disk": 1}
+        assert [p.suffix for p in tmp_path.iterdir()] == [".mp3"]  # one file, no partials left
+
+    def test_disk_cache_is_bounded(self, tmp_path):
+        """Test that the oldest audio files are deleted past max_files and max_bytes"""
+        stub = StubTTS(delay=0)
+        speech = SpeechCache(stub.synthesize, tmp_path, max_files=2)
+
+        async def main():
+            for i in range(4):
+                await speech.speak(f"answer {i}")
+
+        asyncio.run(main())
+        assert sorted(p.read_bytes() for p in tmp_path.glob("*.mp3")) == [b"mp3:answer 2", b"mp3:answer 3"]
+
+        speech = SpeechCache(stub.synthesize, tmp_path, max_bytes=len(b"mp3:answer 4"))
+        asyncio.run(speech.speak("answer 4"))
+        assert [p.read_bytes() for p in tmp_path.glob("*.mp3")] == [b"mp3:answer 4"]
+
+    def test_disk_cache_evicts_least_recently_used(self, tmp_path):
+        """Test that reading a file from disk keeps it over one written after it"""
+        stub = StubTTS(delay=0)
+
+        async def main(speech, *texts):
+            for text in texts:
+                await speech.speak(text)
+
+        # With one item in memory, the second "answer 0" is read back from disk
+        speech = SpeechCache(stub.synthesize, tmp_path, memory_items=1, max_files=2)
+        asyncio.run(main(speech, "answer 0", "answer 1", "answer 0", "answer 2"))
+        assert sorted(p.read_bytes() for p in tmp_path.glob("*.mp3")) == [b"mp3:answer 0", b"mp3:answer 2"]
+        assert speech.stats()["served_from"] == {"disk": 1, "synthesized": 3}
+
+class TestSentenceStreaming:
+    """Long texts are spoken sentence by sentence, in order, pipelined"""
+
+    def test_split_sentences(self):
+        """Test sentence and line breaks, but not after titles like Dr."""
+        text = "Latest CBC: Neutropenia (Dr. Sullivan). WBC 2.1 — recheck?\n- Hgb normal"
+        assert split_sentences(text) == ["Latest CBC: Neutropenia (Dr. Sullivan).", "WBC 2.1 — recheck?", "- Hgb normal"]
+
+    def test_first_audio_after_one_synthesis(self, tmp_path):
+        """Test that the first sentence arrives after one synthesis and the rest follow in order"""
+        stub = StubTTS(delay=0.1)
+        speech = SpeechCache(stub.synthesize, tmp_path, max_workers=4)
+        sentences = [f"Sentence {i}." for i in range(8)]
+
+        async def main():
+            start = time.perf_counter()
+            arrivals = []
+            async for audio in speech.speak_sentences(sentences):
+                arrivals.append((time.perf_counter() - start, audio))
+            return arrivals
+
+        arrivals = asyncio.run(main())
+        assert [audio for _, audio in arrivals] == [f"mp3:{s}".encode() for s in sentences]
+        assert arrivals[0][0] < 1.5 * stub.delay
+        assert arrivals[-1][0] < 3 * stub.delay  # 8 sentences, 4 at a time
+        assert stub.peak == 4
+        print(f"✓ First audio at {arrivals[0][0]:.2f}s, all {len(sentences)} by {arrivals[-1][0]:.2f}s")
+
+    def test_abandoned_stream_stops_synthesis(self, tmp_path):
+        """Test that a client going away cancels the sentences not yet started"""
+        stub = StubTTS(delay=0.05)
+        speech = SpeechCache(stub.synthesize, tmp_path, max_workers=2)
+
+        async def main():
+            chunks = speech.speak_sentences([f"Sentence {i}." for i in range(20)])
+            await anext(chunks)
+            await chunks.aclose()
+            await asyncio.sleep(0.2)
+
+        asyncio.run(main())
+        assert stub.calls <= 4